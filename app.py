@@ -10,23 +10,30 @@ import random
 import time
 import threading
 import urllib.parse
+from collections.abc import Sequence
+from heapq import heapify, heappop
+from itertools import islice
 
 from app_support import (
     configure_logging, is_price_db_enabled, set_db_available, db_available,
-    rate_limit, api_limiter, cart_event_limiter, _client_ip, search_product_ids,
-    product_matches_query, product_matches_query_fuzzy, search_match_score, logger,
+    rate_limit, api_limiter, cart_event_limiter, _client_ip, search_product_ids, SearchTokenIndex,
+    decode_search_index, ResultCache, SingleFlight, fts_token,
+    ProductSnapshot, local_app_cache_file, read_local_app_cache, snapshot_path_for,
+    write_product_snapshot, search_fts_match,
+    product_matches_query, product_matches_query_fuzzy, search_match_scorer, logger,
     _STORE_CONFIGS,
     normalize_name, fuzzy_score,
     parse_weight_to_grams, weights_compatible,
-    is_non_food_name, is_age_restricted, is_rema_tobacco_id, is_organic, is_lactose_free, _PLACEHOLDER_IMGS,
+    is_organic, is_lactose_free, _PLACEHOLDER_IMGS,
     CAT_MEJERI, CAT_KOED_FISK, CAT_FRUGT_GROENT, CAT_BROED_KAGER,
     CAT_FROST, CAT_KOLONIAL, CAT_DRIKKEVARER, CAT_SLIK,
     _SUBCATEGORY_RULES, _get_subcategory,
     product_content_words, variant_flags, get_meat_types, meats_match,
     parse_sale_end_date, product_to_display_dict,
     products_to_api_list, product_to_api_dict,
-    product_available_at_active_stores,
-    product_for_active_stores,
+    autocomplete_suggestion, AUTOCOMPLETE_PREFIX_MAX_LEN, AUTOCOMPLETE_PREFIX_TOP_N,
+    product_available_at_active_stores, product_visibility_mask,
+    product_for_active_stores, SearchView, StoreView, CategoryListing, store_set_mask,
     STORE_CATALOG_VERSION,
     stores_auto_enable_since,
     STORES_ADDED_IN_VERSION,
@@ -96,12 +103,23 @@ cached_data = {
     'timestamp': None,
     'data': None,
     'search_index': None,
+    # Sorteret token-ordbog over search_index (app_support.SearchTokenIndex) -
+    # bygges sammen med den i _apply_cache_payload.
+    'search_tokens': None,
+    # id -> positioner i data (load_product_raw/load_products_by_ids). Ligger
+    # i samme dict som data, så en baggrundsopfriskning aldrig kan parre nye
+    # positioner med en gammel liste.
+    'id_index': None,
+    # position -> product_visibility_mask (None = ikke regnet endnu), se
+    # _rebuild_visibility.
+    'visibility': None,
 }
-_category_index: dict[str, list] | None = None
+_category_index: dict[str, Sequence[dict]] | None = None
 _cache_refresh_started = False
 _cache_refresh_lock = threading.Lock()
 
 _xml_cache_lock = threading.Lock()
+_snapshot_write_lock = threading.Lock()
 
 _KV_CACHE_KEY = 'app_cache_v1'
 _HOME_KV_KEY = 'home_data_v1'
@@ -774,9 +792,29 @@ def _d1_rows(sql: str, params: tuple = ()):
         return []
 
 
-def _d1_products(sql: str, params: tuple = ()):
+def _d1_try_rows(sql: str, params: tuple = ()):
+    """Som _d1_rows, men None ved fejl - og UDEN _mark_data_degraded.
+
+    Til de valgfrie, forudberegnede tabeller (autocomplete, products_fts),
+    som kan mangle indtil første seed efter de blev indført: kalderen falder
+    tilbage til en live vej, der selv markerer sine egne fejl."""
+    db = _d1()
+    if not db:
+        return None
+    stmt = db.prepare(sql)
+    if params:
+        stmt = stmt.bind(*params)
+    try:
+        return _await_sync_retry(stmt.all)
+    except Exception as e:
+        logger.warning("D1 valgfri forespørgsel fejlede (%s): %s", e, sql[:80])
+        return None
+
+
+def _product_rows(rows) -> list:
+    """Parsede data-blobs fra D1-rækker (ugyldige/tomme springes over)."""
     out = []
-    for row in _d1_rows(sql, params):
+    for row in rows:
         raw = row.get('data') if isinstance(row, dict) else None
         if not raw:
             continue
@@ -787,6 +825,10 @@ def _d1_products(sql: str, params: tuple = ()):
     return out
 
 
+def _d1_products(sql: str, params: tuple = ()):
+    return _product_rows(_d1_rows(sql, params))
+
+
 def _d1_scalar(sql: str, params: tuple = ()):
     db = _d1()
     if not db:
@@ -892,6 +934,38 @@ def _term_like_patterns(term: str) -> list[str]:
     return seen
 
 
+def _fts_search_raw(tokens: list[str], limit: int) -> list | None:
+    """Kandidater fra FTS5-tabellen products_fts (scripts/seed-d1.py).
+
+    Erstatter LIKE-kæderne, der tvang en fuld scanning af de ~19k rækker pr.
+    søgning (og endnu en for typo-udvidelsen): præfiks-MATCH på foldede
+    tokens (words) og baglæns tokens (rwords) - se app_support.
+    search_fts_match - slås op i FTS-indekset, og bm25 afgør hvilke
+    kandidater der kommer med under LIMIT i stedet for tabelrækkefølgen
+    (ORDER BY rank - kolonnevægtene sættes ved seed, se seed-d1.py::FINALIZE).
+    None = FTS kan ikke bruges (tabellen mangler/fejl), brug LIKE-vejen."""
+    match = search_fts_match(tokens)
+    if match is None:
+        return None
+    sql = (
+        "SELECT p.data FROM products_fts JOIN products p ON p.id = products_fts.id "
+        f"WHERE products_fts MATCH ? ORDER BY rank LIMIT {int(limit)}"
+    )
+    rows = _d1_try_rows(sql, (match,))
+    if rows is None:
+        return None
+    if rows:
+        return _product_rows(rows)
+    # Typo-udvidelsen som på LIKE-vejen (se dens kommentar), men som
+    # token-præfiks i indekset i stedet for '%pre%' over hele tabellen -
+    # samme antagelse: tastefejl rammer sjældent de første bogstaver.
+    prefixes = sorted({fts_token(t)[:3] for t in tokens if len(t) >= 5} - {''})
+    if not prefixes:
+        return []
+    rows = _d1_try_rows(sql, (' OR '.join(f'words:"{p}"*' for p in prefixes),))
+    return None if rows is None else _product_rows(rows)
+
+
 def load_search_raw(query: str, limit: int = 800) -> list | None:
     """Rå produkter der matcher en søgning. None = brug in-memory index-vej.
 
@@ -911,7 +985,12 @@ def load_search_raw(query: str, limit: int = 800) -> list | None:
     tokens = [t for t in tokens[:8] if t]
     if not tokens:
         return []
-    # Per term: OR af word-boundary-mønstre; på tværs af termer: AND.
+    rows = _fts_search_raw(tokens, limit)
+    if rows is not None:
+        return rows
+    # Fallback (products_fts mangler - fx før første seed med den - eller
+    # FTS-forespørgslen fejlede): de oprindelige LIKE-kæder, som scanner
+    # hele tabellen. Per term: OR af word-boundary-mønstre; på tværs af termer: AND.
     clauses = []
     params: list[str] = []
     for term in tokens:
@@ -966,17 +1045,14 @@ def load_organic_raw(limit: int = 600) -> list:
     return out
 
 
-def organic_display_products(active_stores) -> list:
-    """Økologiske varer som display-dicts, klar til listevisning."""
-    displayed = []
+def organic_search_views(active_stores) -> list:
+    """Økologiske varer som SearchViews (display() bygger den viste side)."""
+    views = []
     for p in filter_products_by_stores(load_organic_raw(), active_stores):
-        adjusted = product_for_active_stores(p, active_stores)
-        if not adjusted:
-            continue
-        d = product_to_display_dict(adjusted, default_category='Andre varer')
-        if d:
-            displayed.append(d)
-    return displayed
+        v = _search_view(p, active_stores)
+        if v:
+            views.append(v)
+    return views
 
 
 def load_product_raw(product_id: str):
@@ -986,14 +1062,22 @@ def load_product_raw(product_id: str):
             "SELECT data FROM products WHERE id = ? LIMIT 1", (str(product_id),)
         )
         return rows[0] if rows else None
+    products = get_product_data()
+    # Produktsiden, næring, opskrifter og kurvens opslag scannede alle ~19k
+    # varer pr. kald - nu ét dict-opslag (_rebuild_id_index).
+    cache = cached_data
+    index = cache.get('id_index')
+    if index is not None and products is cache.get('data'):
+        positions = index.get(str(product_id).strip())
+        return products[positions[0]] if positions else None
     return next(
-        (p for p in get_product_data() if str(p.get('/product/id')) == str(product_id)),
+        (p for p in products if str(p.get('/product/id')) == str(product_id)),
         None,
     )
 
 
 def load_products_by_ids(ids: list) -> list:
-    """Rå produkter for en liste af id'er (D1 på edge, ellers in-memory scan)."""
+    """Rå produkter for en liste af id'er (D1 på edge, ellers id-indekset)."""
     ids = [str(i) for i in ids if str(i).strip()]
     if not ids:
         return []
@@ -1003,7 +1087,14 @@ def load_products_by_ids(ids: list) -> list:
             f"SELECT data FROM products WHERE id IN ({placeholders})", tuple(ids)
         )
     id_set = set(ids)
-    return [p for p in get_product_data() if str(p.get('/product/id')) in id_set]
+    products = get_product_data()
+    cache = cached_data
+    index = cache.get('id_index')
+    if index is not None and products is cache.get('data'):
+        # Sorteret, så rækkefølgen er katalogets - som ved scanningen.
+        positions = sorted({pos for pid in id_set for pos in index.get(pid.strip(), ())})
+        return [products[pos] for pos in positions]
+    return [p for p in products if str(p.get('/product/id')) in id_set]
 
 
 def _popular_product_ids(limit: int = 60) -> list[str]:
@@ -1127,102 +1218,379 @@ def _d1_subcategories(category: str) -> set:
 
 
 def _apply_cache_payload(products, search_index, ts=None):
-    global cached_data, _category_index
+    global cached_data, _category_index, _cache_generation
     ts = ts or datetime.now()
+    # Wire-formatet (1: id-strenge, 2: delta-kodede positioner) afkodes én
+    # gang her til array('I')-posting-lister over positioner i products.
+    index = decode_search_index(search_index, products)
     cached_data = {
         'timestamp': ts,
         'data': products,
-        'search_index': search_index or {},
+        'search_index': index,
+        'search_tokens': SearchTokenIndex(index) if index else None,
+        'id_index': _rebuild_id_index(products),
+        'visibility': _rebuild_visibility(products),
     }
     _category_index = _rebuild_category_index(products)
+    _cache_generation += 1
+    _search_result_cache.clear()
+    _store_view_cache.clear()
 
 
-def _rebuild_category_index(products: list) -> dict[str, list]:
-    idx: dict[str, list] = {}
+def _rebuild_id_index(products) -> dict[str, list[int]]:
+    """id -> stigende positioner i products (flere ved dublet-id'er).
+
+    Et snapshot (ProductSnapshot) har id'erne i sin meta, så indekset bygges
+    uden at afkode varerne."""
+    if isinstance(products, ProductSnapshot):
+        ids = products.ids
+    else:
+        ids = [str(p.get('/product/id', '')).strip() for p in products]
+    idx: dict[str, list[int]] = {}
+    for pos, pid in enumerate(ids):
+        if pid:
+            idx.setdefault(pid, []).append(pos)
+    return idx
+
+
+def _rebuild_visibility(products) -> list:
+    """Position -> product_visibility_mask, udfyldt ved første opslag.
+
+    filter_products_by_stores kørte billed-/tobak-/non-food-reglerne (regex
+    på billed-URL'er, titel og mærke) for hver vare ved hver request, selvom
+    de kun afhænger af varen - forsiden målte engang 54% af sin CPU dér. Et
+    snapshot har maskerne i sin meta (write_product_snapshot); ellers regnes
+    en vares maske første gang den filtreres og genbruges derefter, så
+    indlæsningen ikke selv skal igennem hele kataloget."""
+    if isinstance(products, ProductSnapshot) and products.visibility is not None:
+        return list(products.visibility)
+    return [None] * len(products)
+
+
+def _rebuild_category_index(products: Sequence[dict]) -> dict[str, Sequence[dict]]:
+    if isinstance(products, ProductSnapshot):
+        # Kategorierne ligger i snapshottets meta - indekset bygges uden at
+        # afkode en eneste vare, og en kategoriside afkoder kun sine egne.
+        positions: dict[str, list[int]] = {}
+        for pos, ptype in enumerate(products.types):
+            if ptype:
+                positions.setdefault(ptype, []).append(pos)
+        return {key: products.take(pos) for key, pos in positions.items()}
+    idx: dict[str, list[dict]] = {}
     for product in products:
         ptype = product.get('/product/product_type')
         if ptype:
             key = str(ptype)
             idx.setdefault(key, []).append(product)
-    return idx
+    return {key: members for key, members in idx.items()}
+
+def _search_display(raw: dict, active_stores: set | None) -> dict | None:
+    adjusted = product_for_active_stores(raw, active_stores)
+    if not adjusted:
+        return None
+    return product_to_display_dict(adjusted, default_category='Andre varer')
+
+
+def _search_view(raw: dict, active_stores: set | None) -> SearchView | None:
+    """Som _search_display, men et SearchView: matching, filtrering og
+    sortering kører på det, og kun den viste side bygges fuldt (display())."""
+    adjusted = product_for_active_stores(raw, active_stores)
+    if not adjusted:
+        return None
+    return SearchView(adjusted, default_category='Andre varer')
+
 
 def _filter_products_for_search(
     products: list, query: str, active_stores: set | None = None,
-) -> list:
-    """Use search index when available, else linear scan. Respects store selection."""
-    def _to_display(raw: dict) -> dict | None:
-        adjusted = product_for_active_stores(raw, active_stores)
-        if not adjusted:
+) -> list[tuple[dict, SearchView]]:
+    """Use search index when available, else linear scan. Respects store selection.
+
+    Returnerer (råprodukt, SearchView)-par i katalogrækkefølge - råproduktet
+    er det søgningens resultat-cache gemmer (se _scored_search_hits).
+
+    products er HELE den cachede produktliste (cached_data['data']):
+    indeksets posting-lister er positioner i netop den liste, så hits slås op
+    direkte, og butiks-/billedfilteret (filter_products_by_stores) køres kun
+    på dem. Tidligere filtreredes hele kataloget først, og bagefter blev
+    ALLE produkter scannet igen for at teste id-strengen mod hit-mængden."""
+    view = _store_view(active_stores, products)
+
+    def _views(candidates):
+        # Med et StoreView er filteret og promoveringen allerede gjort; ellers
+        # pr. kandidat som før.
+        if view is not None:
+            for p in candidates:
+                adjusted = view.adjusted(p)
+                if adjusted and p.get('/product/title') and p.get('/product/id'):
+                    yield p, SearchView(adjusted, default_category='Andre varer')
+            return
+        for p in filter_products_by_stores(candidates, active_stores):
+            if not p.get('/product/title') or not p.get('/product/id'):
+                continue
+            v = _search_view(p, active_stores)
+            if v:
+                yield p, v
+
+    def _displayed(positions: list[int]) -> list:
+        return list(_views(products[i] for i in positions if i < len(products)))
+
+    # Ét opslag i cached_data: en baggrundsopfriskning erstatter hele dict'en,
+    # og positionerne gælder kun for den produktliste de blev bygget sammen med.
+    cache = cached_data
+    index = cache.get('search_index') or {}
+    tokens = cache.get('search_tokens')
+
+    def _index_hits(typos: bool) -> list[int] | None:
+        # Katalogindekset dækker kun råvarens titel/mærke/beskrivelse. Et
+        # promoveret kort (_promote_match_to_product) vises under den
+        # matchende butiks navn - dem retter viewet selv. Uden view og med
+        # Rema 1000 (eller intet filter) i valget promoveres intet, jf.
+        # product_for_active_stores; ellers kan indekset ikke afgøre søgningen.
+        hits = search_product_ids(index, query, tokens, typos=typos)
+        if hits is None:
             return None
-        return product_to_display_dict(adjusted, default_category='Andre varer')
-
-    index = cached_data.get('search_index')
-    if index:
-        ids = search_product_ids(index, query)
-        if ids:
-            results = []
-            for p in products:
-                if str(p.get('/product/id', '')) not in ids:
-                    continue
-                if not p.get('/product/title') or not p.get('/product/id'):
-                    continue
-                d = _to_display(p)
-                if d:
-                    results.append(d)
+        if view is not None:
+            return view.search_hits(hits, query, typos=typos)
+        if active_stores is None or 'Rema 1000' in active_stores:
+            return hits
+        return None
+
+    if index and tokens is not None and products is cache.get('data'):
+        positions = _index_hits(typos=False)
+        if positions:
+            results = _displayed(positions)
             if results:
                 return results
+        if positions is not None:
+            # Intet strengt hit - typisk en tastefejl. Termerne slås op i
+            # ordforrådene med samme fuzzy-kriterie (SearchTokenIndex.
+            # typo_tokens), så product_matches_query_fuzzy kun skal vurdere
+            # produkterne bag de tokens i stedet for hele kataloget.
+            candidates = _index_hits(typos=True)
+            if candidates is not None:
+                return [pd for pd in _displayed(candidates) if product_matches_query_fuzzy(pd[1], query)]
+    # Lineær scanning: intet indeks, eller en søgning det ikke kan afgøre
+    # (korte termer i ældre caches).
     results = []
     scanned = []
-    for product in products:
-        if not product.get('/product/title') or not product.get('/product/id'):
-            continue
-        d = _to_display(product)
-        if not d:
-            continue
-        scanned.append(d)
-        if product_matches_query(d, query):
-            results.append(d)
+    for product, v in _views(view.raw if view is not None else products):
+        scanned.append((product, v))
+        if product_matches_query(v, query):
+            results.append((product, v))
     if results:
         return results
-    # Typo-tolerant fallback - kun når streng søgning ikke gav nogen hits.
-    # Genbruger display-dict'sne fra scanningen ovenfor i stedet for at bygge
-    # dem forfra: det er nøjagtig de samme produkter der skal vurderes igen,
-    # og _to_display er dyr (product_to_display_dict + _get_subcategory pr.
-    # produkt). Uden det blev hele kataloget konverteret to gange for hver
-    # søgning uden hits - altså netop ved en tastefejl.
-    results = [d for d in scanned if product_matches_query_fuzzy(d, query)]
+    results = [pd for pd in scanned if product_matches_query_fuzzy(pd[1], query)]
     return results
 
 
-def search_display_products(query: str, active_stores: set | None,
-                            limit: int = 800) -> list:
-    """Søgeresultater som display-dicts (D1-kandidater på edge, ellers index).
-
-    `limit` begrænser hvor mange rå kandidater der hentes/parses fra D1.
-    Autocomplete bruger en lille pulje for at holde sig under free-planens
-    CPU-grænse; søgeresultatsiden bruger den fulde pulje.
-    """
-    query = (query or '')[:60]  # beskyt mod urimeligt lange søgestrenge
+def _search_pairs(query: str, active_stores: set | None, limit: int) -> list[tuple[dict, SearchView]]:
+    """(råprodukt, SearchView)-par der matcher query (D1-kandidater på edge, ellers index)."""
     raw = load_search_raw(query, limit=limit)
     if raw is None:
-        filtered = filter_products_by_stores(get_product_data(), active_stores)
-        return _filter_products_for_search(filtered, query, active_stores)
+        return _filter_products_for_search(get_product_data(), query, active_stores)
     displayed = []
+    raw_of: dict[int, dict] = {}
     for p in filter_products_by_stores(raw, active_stores):
         if not p.get('/product/title') or not p.get('/product/id'):
             continue
-        adjusted = product_for_active_stores(p, active_stores)
-        if not adjusted:
-            continue
-        d = product_to_display_dict(adjusted, default_category='Andre varer')
-        if d:
-            displayed.append(d)
+        v = _search_view(p, active_stores)
+        if v:
+            displayed.append(v)
+            raw_of[id(v)] = p
 
     results = _safe_match_filter(displayed, query, product_matches_query)
-    if results:
-        return results
-    # Typo-tolerant fallback - kun når streng søgning ikke gav nogen hits (fx "minmælk")
-    return _safe_match_filter(displayed, query, product_matches_query_fuzzy)
+    if not results:
+        # Typo-tolerant fallback - kun når streng søgning ikke gav nogen hits (fx "minmælk")
+        results = _safe_match_filter(displayed, query, product_matches_query_fuzzy)
+    return [(raw_of[id(v)], v) for v in results]
+
+
+# Resultat-cache for søgetræffene (_scored_search_hits). Autocomplete rammes
+# én gang pr. tastetryk, af mange brugere der skriver de samme populære præfikser ("mæ",
+# "mæl", "mælk"), og /search/results + /api/search gentager de samme søgninger -
+# hver gang blev matching, display-konvertering og search_match_score-
+# sortering regnet forfra. Edge/CDN-cachen dækker kun delte svar; personlige
+# (cookie-butikker) og alt lokalt rammer workeren hver gang.
+#
+# Cachen holder råprodukterne (referencer - på index-vejen ligger de i
+# forvejen i cached_data) med deres relevansscore, ikke display-dicts: de
+# bygges friskt pr. request (se _normalized_match_fields), og kun for de
+# varer kalderen faktisk viser (autocomplete stopper efter 8 forslag, en
+# resultatside efter 60).
+#
+# Nøgle: (normalize_name(query), butikssæt, D1-limit, _cache_generation).
+# _apply_cache_payload tæller generationen op og tømmer cachen, så nye data
+# aldrig blandes med gamle resultater; TTL'en begrænser staleness på D1-vejen,
+# hvor nattens reseed ikke går gennem _apply_cache_payload. Degraderede svar
+# (_mark_data_degraded, fx afbrudt matcher eller D1-fejl) gemmes aldrig.
+_SEARCH_CACHE_TTL = 600.0
+_search_result_cache = ResultCache(
+    maxsize=512, ttl_seconds=_SEARCH_CACHE_TTL,
+    # Vægt = antal produkter i de cachede lister. På edge er D1-rækkerne
+    # egne objekter (ikke delte referencer), og isolaten har 128 MB.
+    max_weight=5_000 if _IS_EDGE else 50_000,
+    name='Søgeresultat-cache',
+)
+_cache_generation = 0
+
+# Single-flight foran cachen: en trending søgning der rammer flere Flask-
+# tråde samtidig, ville ellers køre load_search_raw/index-scanningen og
+# scoringen én gang pr. tråd, før den første nåede at fylde cachen. Samme
+# nøgle som _search_result_cache; søgesidens fulde liste (filtre, sortering,
+# side) har sin egen. Slået fra på edge - se SingleFlight.
+_search_flight = SingleFlight(name='Søge-single-flight', enabled=not _IS_EDGE)
+_listing_flight = SingleFlight(name='Søgeside-single-flight', enabled=not _IS_EDGE)
+
+
+# Materialiserede butiksvalg (StoreView): billedfilter + product_for_active_
+# stores for hele kataloget, bygget første gang et butikssæt ses og genbrugt
+# af kategorilister, søgning og forsiden. Cookie'ens butikssæt er en håndfuld
+# forskellige i praksis, så få views dækker næsten al trafik; resten evictes
+# LRU. _apply_cache_payload tømmer cachen. Kun hvor hele kataloget ligger i
+# hukommelsen (ikke D1) og ikke på edge: et view uden Rema 1000 har en
+# dict-kopi pr. promoveret vare, og isolaten har 128 MB.
+# STORE_VIEW_CACHE_SIZE=0 slår det fra.
+_STORE_VIEW_CACHE_SIZE = 0 if _IS_EDGE else int(os.environ.get('STORE_VIEW_CACHE_SIZE', '4') or 0)
+_store_view_cache = ResultCache(
+    maxsize=max(_STORE_VIEW_CACHE_SIZE, 1), ttl_seconds=float('inf'),
+    name='Butiksview-cache',
+)
+_store_view_flight = SingleFlight(name='Butiksview-single-flight', enabled=not _IS_EDGE)
+
+
+def _store_view(active_stores, products) -> StoreView | None:
+    """StoreView for active_stores over products - kun når products er den
+    cachede produktliste; ellers None, og kalderen filtrerer/justerer selv."""
+    if _STORE_VIEW_CACHE_SIZE <= 0 or not products or products is not cached_data.get('data'):
+        return None
+    mask = store_set_mask(active_stores)
+    if mask is None:
+        return None
+    key = (mask, _cache_generation)
+    _store_view_cache.log_stats_if_due()
+    view = _store_view_cache.get(key)
+    if view is None or view.catalogue is not products:
+        view, _ = _store_view_flight.do(
+            key, lambda: StoreView(products, active_stores, _is_displayable))
+        if view.catalogue is not products:
+            return None
+        _store_view_cache.put(key, view)
+    return view
+
+
+def _shared_flight(flight: SingleFlight, key, fn):
+    """flight.do(key, fn), hvor en delt værdi også deler lederens
+    degraderings-flag: _mark_data_degraded sidder på lederens g, og et svar
+    bygget på dens ufuldstændige data må heller ikke caches for de andre."""
+    flight.log_stats_if_due()
+    (value, degraded), shared = flight.do(key, lambda: (fn(), _is_data_degraded()))
+    if shared and degraded:
+        _mark_data_degraded('search_coalesced')
+    return value
+
+
+def _scored_search_hits(query: str, active_stores: set | None,
+                        limit: int) -> tuple[tuple, dict]:
+    """((råprodukt, score)-par i katalogrækkefølge, SearchViews bygget undervejs).
+
+    score er search_match_score(v, query) for varens SearchView - regnet én
+    gang ved cache-miss (search_match_scorer), så rangering ved cache-hit kun
+    sammenligner heltal. Ved cache-hit er den anden værdi tom; ellers slås
+    views op på parrets indeks."""
+    query = (query or '')[:60]  # beskyt mod urimeligt lange søgestrenge
+    key = (
+        normalize_name(query),
+        frozenset(active_stores) if active_stores is not None else None,
+        # limit begrænser kun D1-puljen; index-vejen giver samme resultat
+        # uanset, så autocomplete og søgesiden deler post lokalt.
+        limit if _use_d1() else None,
+        _cache_generation,
+    )
+    _search_result_cache.log_stats_if_due()
+    hits = _search_result_cache.get(key)
+    if hits is not None:
+        return hits, {}
+
+    def compute():
+        pairs = _search_pairs(query, active_stores, limit)
+        score = search_match_scorer(query)
+        hits = tuple((raw, score(v)) for raw, v in pairs)
+        if not _is_data_degraded():
+            _search_result_cache.put(key, hits, weight=len(hits))
+        return hits, {i: v for i, (_, v) in enumerate(pairs)}
+
+    return _shared_flight(_search_flight, key, compute)
+
+
+def _rank_order(hits: tuple):
+    """Indekser i hits efter score faldende, katalogrækkefølge ved lighed.
+
+    Samme rækkefølge som sorted(..., reverse=True) (stabil) på den
+    katalogordnede liste, men dovent via en heap over (-score, indeks): en
+    kalder der kun bruger de første k (autocomplete, én resultatside) betaler
+    O(n + k log n) i stedet for at sortere alle træf."""
+    heap = [(-score, i) for i, (_, score) in enumerate(hits)]
+    heapify(heap)
+    while heap:
+        yield heappop(heap)[1]
+
+
+def iter_search_views(query: str, active_stores: set | None, limit: int = 800):
+    """SearchViews i relevansrækkefølge, rangeret og bygget dovent.
+
+    Autocomplete bruger dem direkte (autocomplete_suggestion læser kun
+    felter viewet har) - der bygges aldrig en fuld display-dict."""
+    hits, built = _scored_search_hits(query, active_stores, limit)
+    for i in _rank_order(hits):
+        v = built.get(i) or _search_view(hits[i][0], active_stores)
+        if v:
+            yield v
+
+
+def search_views(query: str, active_stores: set | None,
+                 limit: int = 800, ranked: bool = False) -> list:
+    """Søgeresultater som SearchViews (D1-kandidater på edge, ellers index).
+
+    `limit` begrænser hvor mange rå kandidater der hentes/parses fra D1.
+    Autocomplete bruger en lille pulje for at holde sig under free-planens
+    CPU-grænse; søgeresultatsiden bruger den fulde pulje.
+
+    ranked=True: sorteret efter search_match_score (se _rank_order);
+    ellers katalogrækkefølge, som apply_product_filters' egne sorteringer
+    bygger videre på. Kalderen bygger display-dicts (SearchView.display())
+    til den side der vises.
+    """
+    if ranked:
+        return list(iter_search_views(query, active_stores, limit))
+    hits, built = _scored_search_hits(query, active_stores, limit)
+    out = []
+    for i, (raw, _) in enumerate(hits):
+        v = built.get(i) or _search_view(raw, active_stores)
+        if v:
+            out.append(v)
+    return out
+
+
+def search_display_page(query: str, active_stores: set | None, page: int,
+                        per_page: int, limit: int = 800):
+    """Én relevanssorteret side: (display-dicts, side, antal sider, total).
+
+    Samme resultat som _paginate(search_views(..., ranked=True)) med
+    display-dicts, men kun de første side * per_page træf rangeres
+    (_rank_order), og kun den viste side bygges. Forudsætter at intet filter fjerner
+    træf efter rangeringen - se _build_search_listing."""
+    hits, built = _scored_search_hits(query, active_stores, limit)
+    total = len(hits)
+    total_pages = (total + per_page - 1) // per_page if total else 0
+    page = min(max(page, 1), total_pages) if total_pages > 0 else 1
+    start = (page - 1) * per_page
+    items = []
+    for i in islice(_rank_order(hits), start, start + per_page):
+        v = built.get(i)
+        d = v.display() if v else _search_display(hits[i][0], active_stores)
+        if d:
+            items.append(d)
+    return items, page, total_pages, total
 
 
 def _safe_match_filter(products: list, query: str, matcher) -> list:
@@ -1352,16 +1720,19 @@ _LOCAL_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'da
 
 
 def _load_local_cache():
-    """Læs lokal cache-fil som fallback når Supabase app_cache ikke er tilgængelig."""
+    """Læs lokal cache-fil som fallback når Supabase app_cache ikke er tilgængelig.
+
+    Snapshot (app_support.ProductSnapshot) hvis det findes - så afkodes
+    varerne først når de bruges - ellers den ældre JSON-fil."""
     try:
-        if not os.path.exists(_LOCAL_CACHE_FILE):
+        path = local_app_cache_file(_LOCAL_CACHE_FILE)
+        if not path:
             return None
-        with open(_LOCAL_CACHE_FILE, 'r', encoding='utf-8') as f:
-            payload = json.load(f)
+        payload = read_local_app_cache(path)
         products = payload.get('products', [])
         search_index = payload.get('search_index', {})
         if products:
-            logger.info(f"Lokal cache indlæst: {len(products)} produkter fra {_LOCAL_CACHE_FILE}")
+            logger.info(f"Lokal cache indlæst: {len(products)} produkter fra {path}")
             return products, search_index
     except Exception as e:
         logger.error(f"Fejl ved læsning af lokal cache: {e}")
@@ -1379,10 +1750,10 @@ def _local_cache_fresh_today():
     5 GB/måned-egress-kvote). Kun relevant lokalt - edge har KV til samme
     formål (se kv_payload-tjekket i _refresh_product_cache)."""
     try:
-        if not os.path.exists(_LOCAL_CACHE_FILE):
+        path = local_app_cache_file(_LOCAL_CACHE_FILE)
+        if not path:
             return None
-        with open(_LOCAL_CACHE_FILE, 'r', encoding='utf-8') as f:
-            payload = json.load(f)
+        payload = read_local_app_cache(path)
         ts_raw = payload.get('timestamp')
         if not ts_raw:
             return None
@@ -1402,17 +1773,20 @@ def _local_cache_fresh_today():
 def _save_local_cache_snapshot(products, search_index, ts) -> None:
     """Gemmer dagens live-hentede app_cache lokalt m. timestamp, så
     efterfølgende lokale genstarter SAMME dag kan genbruge den i stedet for
-    at hente fra Supabase igen (se _local_cache_fresh_today)."""
-    try:
-        os.makedirs(os.path.dirname(_LOCAL_CACHE_FILE), exist_ok=True)
-        payload = json.dumps(
-            {'timestamp': ts.isoformat(), 'products': products, 'search_index': search_index},
-            separators=(',', ':'), ensure_ascii=False,
-        )
-        with open(_LOCAL_CACHE_FILE, 'w', encoding='utf-8') as f:
-            f.write(payload)
-    except Exception as e:
-        logger.warning(f"Kunne ikke gemme lokal same-day cache: {e}")
+    at hente fra Supabase igen (se _local_cache_fresh_today).
+
+    Skrives i en baggrundstråd: write_product_snapshot laver en JSON-rundtur
+    og en synlighedsmaske pr. vare, og den første request efter en swap
+    venter ellers på det. Én skrivning ad gangen (samme .tmp-fil)."""
+    def _write():
+        try:
+            with _snapshot_write_lock:
+                write_product_snapshot(snapshot_path_for(_LOCAL_CACHE_FILE), products,
+                                       search_index, ts.isoformat())
+        except Exception as e:
+            logger.warning(f"Kunne ikke gemme lokal same-day cache: {e}")
+
+    threading.Thread(target=_write, daemon=True, name='cache-snapshot').start()
 
 
 def _refresh_product_cache():
@@ -1581,42 +1955,52 @@ def get_active_stores():
 
     return labels
 
-_TOBACCO_IMG_RE = re.compile(r'rema-product-images\.digital\.rema1000\.dk/(\d+)/')
+def _product_visibility(p) -> int:
+    """product_visibility_mask(p) - for katalogets egne varer memoized pr.
+    position (slået op via id_index), ellers (D1-rækker, forudberegnede
+    forsidevarer) regnet her."""
+    cache = cached_data
+    table = cache.get('visibility')
+    id_index = cache.get('id_index')
+    products = cache.get('data')
+    if table is not None and id_index is not None and products is not None:
+        for pos in id_index.get(str(p.get('/product/id', '')).strip(), ()):
+            if products[pos] is p:
+                mask = table[pos]
+                if mask is None:
+                    mask = table[pos] = product_visibility_mask(p)
+                return mask
+    return product_visibility_mask(p)
+
+
+def _is_displayable(p) -> bool:
+    return bool(_product_visibility(p))
 
-def _is_tobacco_image(url: str) -> bool:
-    m = _TOBACCO_IMG_RE.search(url)
-    if not m:
-        return False
-    return is_rema_tobacco_id(m.group(1))
 
 def filter_products_by_stores(products, active_stores):
-    """Helper to filter products by store names, blocked images, and blocked product names."""
-    def _is_allowed(p):
-        img = str(p.get('/product/imageLink', '')).strip()
-        if img in _PLACEHOLDER_IMGS or _is_tobacco_image(img):
-            return False
-        rema_img = str(p.get('/product/rema_image', '')).strip()
-        if rema_img in _PLACEHOLDER_IMGS or _is_tobacco_image(rema_img):
-            return False
-        title = str(p.get('/product/title', ''))
-        brand = str(p.get('/product/brand', ''))
-        # Tobak/nikotin - tjek titel + brand, så fx Prince/HARDBOX ikke slipper
-        if is_age_restricted(title, brand, product_id=p.get('/product/id', '')):
-            return False
-        # Kun mad: bleer, shampoo, elektronik osv. (titel + brand)
-        if is_non_food_name(title) or is_non_food_name(brand):
-            return False
-        bilka_brand = str((p.get('/product/store_matches') or {}).get('bilka', {}).get('brand', '')).lower().strip()
-        if bilka_brand.startswith('deli'):
-            return False
-        if str(p.get('/product/store', '')).lower() == 'bilka' and str(p.get('/product/brand', '')).lower().strip().startswith('deli'):
-            return False
-        return True
+    """Helper to filter products by store names, blocked images, and blocked product names.
+
+    Billed-/tobak-/non-food-reglerne afhænger kun af varen og regnes én gang
+    pr. vare (_rebuild_visibility, snapshot-meta eller seed); pr. request er
+    der kun et AND af varens butiksbits og butiksvalgets bitmaske tilbage."""
+    active = store_set_mask(active_stores)
+    if active is None:
+        return [
+            p for p in products
+            if _is_displayable(p) and product_available_at_active_stores(p, active_stores)
+        ]
+    return [p for p in products if _product_visibility(p) & active]
+
+def _has_product_filters(args) -> bool:
+    """True hvis apply_product_filters ville kunne fjerne varer (samme
+    parametre og samme parsing - HOLD DE TO I SYNC)."""
+    return (
+        any(args.get(k, type=float) is not None
+            for k in ('min_price', 'max_price', 'min_weight', 'max_weight'))
+        or any(args.get(k, type=str) == 'true' for k in ('sale', 'organic', 'lactose'))
+        or bool(args.get('subcategory', type=str))
+    )
 
-    filtered = [p for p in products if _is_allowed(p)]
-    if active_stores is None:
-        return filtered
-    return [p for p in filtered if product_available_at_active_stores(p, active_stores)]
 
 def apply_product_filters(products, args):
     """Helper to apply price, sale, organic, weight, subcategory filters and sorting to a list of products"""
@@ -2431,7 +2815,7 @@ def _build_home_categories(active_stores, args):
     precomputed = _home_precomputed()
     if precomputed:
         # Tobak/non-food/alders-filtreringen i filter_products_by_stores er
-        # allerede anvendt ved seed-tid (scripts/seed-d1.py::_home_is_allowed,
+        # allerede anvendt ved seed-tid (app_support.product_is_displayable,
         # kørt af build_home_data) - kun butiksfiltrering er tilbage her, da
         # den afhænger af den enkelte besøgendes cookie/query-param. Målt: at
         # køre filter_products_by_stores igen her fandt 0 af 18.781 rækker at
@@ -2441,10 +2825,15 @@ def _build_home_categories(active_stores, args):
         mejeri_raw = _adjust_for_stores(precomputed.get('mejeri_raw') or [])
         recipe_pool = precomputed.get('recipe_pool') or []
     else:
-        sale_raw = _adjust_for_stores(
-            filter_products_by_stores(load_sale_raw(limit=200), active_stores))
-        mejeri_raw = _adjust_for_stores(
-            filter_products_by_stores(load_category_raw(CAT_MEJERI, limit=200), active_stores))
+        view = None if _use_d1() else _store_view(active_stores, get_product_data())
+        if view is not None:
+            sale_raw = [a for a in map(view.adjusted, load_sale_raw(limit=200)) if a]
+            mejeri_raw = [a for a in map(view.adjusted, load_category_raw(CAT_MEJERI, limit=200)) if a]
+        else:
+            sale_raw = _adjust_for_stores(
+                filter_products_by_stores(load_sale_raw(limit=200), active_stores))
+            mejeri_raw = _adjust_for_stores(
+                filter_products_by_stores(load_category_raw(CAT_MEJERI, limit=200), active_stores))
         # "Lækre opskrifter" har ingen forudberegnet pulje her: _home_precomputed()
         # returnerer None uden for edge, så KV-nøglen home_data_v1 findes ikke.
         # Hentes derfor live fra Supabase - kun i denne gren, dvs. aldrig på edge.
@@ -2680,6 +3069,18 @@ def _build_sale_listing(active_stores, args, page: int):
     return page_items, page, total_pages, total
 
 
+def _listing_display_page(listing: CategoryListing, args, page: int, per_page: int):
+    """listing.page() med display-dicts for sidens varer (som _paginate)."""
+    items, page, total_pages, total = listing.page(args, page, per_page)
+    products = []
+    for adjusted in items:
+        try:
+            products.append(product_to_display_dict(adjusted, category=listing.category))
+        except Exception as e:
+            logger.warning("Error processing product in category: %s", e)
+    return products, page, total_pages, total
+
+
 def _build_category_listing(slug: str, active_stores, args, page: int):
     """Kategori-liste til HTML og GET /api/category/<slug>."""
     actual_category = _CATEGORY_SLUG_MAP.get(slug)
@@ -2726,19 +3127,17 @@ def _build_category_listing(slug: str, active_stores, args, page: int):
                     f"SELECT data FROM products WHERE {' AND '.join(where)}",
                     tuple(params),
                 )
-            category_products = []
+            adjusted_all = []
             for product in filter_products_by_stores(raw_all, active_stores):
                 adjusted = product_for_active_stores(product, active_stores)
-                if not adjusted:
-                    continue
-                try:
-                    category_products.append(
-                        product_to_display_dict(adjusted, category=actual_category)
-                    )
-                except Exception as e:
-                    logger.warning("Error processing product in category: %s", e)
-            category_products = apply_product_filters(category_products, args)
-            page_items, page, total_pages, total = _paginate(category_products, page, per_page)
+                if adjusted:
+                    adjusted_all.append(adjusted)
+            # Pr. request her (edge gemmer ingen StoreView), men filtre og
+            # sortering kører stadig på CategoryListing, så kun sidens varer
+            # bygges som display-dicts.
+            page_items, page, total_pages, total = _listing_display_page(
+                CategoryListing(adjusted_all, actual_category), args, page, per_page,
+            )
             return {
                 'category_name': actual_category,
                 'products': page_items,
@@ -2775,6 +3174,27 @@ def _build_category_listing(slug: str, active_stores, args, page: int):
             'current_subcategory': current_subcategory,
         }
 
+    view = _store_view(active_stores, get_product_data())
+    if view is not None:
+        # Butiksvalgets view har filtreret og promoveret kategorien, og dens
+        # CategoryListing har filtre og sorteringer klar - kun sidens varer
+        # bygges som display-dicts.
+        listing = view.listing(actual_category)
+        rules = _SUBCATEGORY_RULES.get(actual_category, [])
+        available_subcategories = [sub for sub, _ in rules if sub in listing.subcategories]
+        if 'Øvrige' in listing.subcategories:
+            available_subcategories.append('Øvrige')
+        page_items, page, total_pages, total = _listing_display_page(listing, args, page, per_page)
+        return {
+            'category_name': actual_category,
+            'products': page_items,
+            'page': page,
+            'total_pages': total_pages,
+            'total': total,
+            'available_subcategories': available_subcategories,
+            'current_subcategory': current_subcategory,
+        }
+
     raw_category = filter_products_by_stores(
         load_category_raw(actual_category), active_stores,
     )
@@ -2810,20 +3230,50 @@ def _build_category_listing(slug: str, active_stores, args, page: int):
 
 
 def _build_search_listing(query: str, active_stores, args, page: int):
-    """Fuld søgeresultatside til HTML og GET /api/search."""
+    """Fuld søgeresultatside til HTML og GET /api/search.
+
+    Samtidige identiske kald (samme søgning, butikker, filtre og side)
+    deles via _listing_flight; siden er en frisk liste pr. kald, men
+    display-dicts deles - kalderne læser dem kun."""
+    items = args.items(multi=True) if hasattr(args, 'getlist') else args.items()
+    key = (
+        # Den rensede forespørgsel, ikke normalize_name: den fjerner "øko",
+        # og så ville "øko æg" og "æg" dele side.
+        query,
+        frozenset(active_stores) if active_stores is not None else None,
+        tuple(sorted((k, v) for k, v in items if k not in ('q', 'page'))),
+        page,
+        _cache_generation,
+    )
+    page_items, page, total_pages, total = _shared_flight(
+        _listing_flight, key,
+        lambda: _compute_search_listing(query, active_stores, args, page),
+    )
+    return list(page_items), page, total_pages, total
+
+
+def _compute_search_listing(query: str, active_stores, args, page: int):
     per_page = _LISTING_PER_PAGE
     text_query, want_organic = _split_organic_intent(query)
     # "øko" alene giver ingen søgetekst tilbage - så er hele forespørgslen
     # filteret, og vi viser de økologiske varer frem for ingenting.
-    all_products = (search_display_products(text_query, active_stores)
-                    if text_query else organic_display_products(active_stores))
+    relevance = args.get('sort', 'relevance') == 'relevance'
+    if text_query and relevance and not want_organic and not _has_product_filters(args):
+        # Intet fjerner træf efter rangeringen - kun den viste side rangeres
+        # og bygges (search_display_page).
+        return search_display_page(text_query, active_stores, page, per_page)
+    # Med tekst kommer relevanssorteringen færdig fra (og cachet i)
+    # search_views; filtrene nedenfor bevarer rækkefølgen. Filtrering og
+    # sortering sker på SearchViews - kun den viste side bygges fuldt.
+    all_products = (search_views(text_query, active_stores, ranked=relevance)
+                    if text_query else organic_search_views(active_stores))
     if want_organic:
         all_products = [p for p in all_products if p.get('is_organic')]
     all_products = apply_product_filters(all_products, args)
-    if args.get('sort', 'relevance') == 'relevance':
-        all_products.sort(key=lambda d: search_match_score(d, text_query or query), reverse=True)
+    if relevance and not text_query:
+        all_products.sort(key=search_match_scorer(query), reverse=True)
     page_items, page, total_pages, total = _paginate(all_products, page, per_page)
-    return page_items, page, total_pages, total
+    return [v.display() for v in page_items], page, total_pages, total
 
 @app.route('/robots.txt')
 def robots_txt():
@@ -3090,6 +3540,59 @@ def ugens_tilbud():
         _mark_data_degraded('sale_page_exception')
         return "Der opstod en fejl. Prøv igen om lidt.", 500
 
+def _autocomplete_from_table(query: str, active_stores: set | None) -> list | None:
+    """Forslag fra den forudberegnede D1-tabel 'autocomplete' (scripts/seed-d1.py).
+
+    Ét indekseret opslag på præfikset i stedet for en LIKE-søgning, op til 60
+    parsede produkt-blobs, display-konvertering og scoring pr. tastetryk - de
+    korte præfikser ("mæ", "mæl") er både de hyppigste og dem med flest
+    kandidater. None = tabellen kan ikke afgøre svaret, brug den live vej:
+
+    - lokalt (ingen D1), flerordede søgninger og præfikser uden for tabellens
+      længdeinterval (normaliseret, så fx "hk" -> "hakket" falder udenfor);
+    - butiksvalg uden Rema 1000: product_for_active_stores viser da varen fra
+      en anden butik (andet navn/pris/billede) end den forudberegnede;
+    - butiksfilteret efterlader færre end 8 forslag fra en fuld række - de
+      næste kandidater ligger ikke i tabellen;
+    - manglende tabel/række eller D1-fejl (fejler åbent, markeres IKKE som
+      degraderet - den live vej tager over og markerer selv sine fejl)."""
+    if not _use_d1():
+        return None
+    key = normalize_name(query).strip()
+    if ' ' in key or not 2 <= len(key) <= AUTOCOMPLETE_PREFIX_MAX_LEN:
+        return None
+    if active_stores is not None and 'Rema 1000' not in active_stores:
+        return None
+    rows = _d1_try_rows("SELECT suggestions FROM autocomplete WHERE prefix = ?", (key,))
+    if not rows or not isinstance(rows[0], dict):
+        return None
+    try:
+        entries = json.loads(rows[0]['suggestions'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not isinstance(entries, list):
+        return None
+    seen_names = set()
+    suggestions = []
+    for entry in entries:
+        if len(suggestions) >= 8:
+            break
+        # stores er seed-d1.py::available_stores ('|Label|...|') - samme
+        # mængde som product_available_at_active_stores tester, når Rema 1000
+        # er valgt (og varen derfor vises uændret).
+        stores = entry.pop('stores', '')
+        if active_stores is not None and not any(f"|{s}|" in stores for s in active_stores):
+            continue
+        name_key = normalize_name(entry['name'])
+        if name_key in seen_names:
+            continue
+        seen_names.add(name_key)
+        suggestions.append(entry)
+    if len(suggestions) < 8 and len(entries) >= AUTOCOMPLETE_PREFIX_TOP_N:
+        return None
+    return suggestions
+
+
 @app.route('/api/autocomplete')
 @rate_limit(api_limiter)
 def autocomplete():
@@ -3104,11 +3607,15 @@ def autocomplete():
 
     try:
         active_stores = get_active_stores()
+        precomputed = _autocomplete_from_table(query, active_stores)
+        if precomputed is not None:
+            return jsonify({'suggestions': precomputed, 'query_suggestion': query})
         # Lille kandidatpulje: autocomplete viser kun 8 forslag, så vi undgår
         # at parse hundredvis af JSON-blobs (holder os under 10 ms CPU).
-        matched = search_display_products(query, active_stores, limit=60)
-        # Exact-token-hits først, så "øl" ikke drukner i irrelevante præfiks-hits
-        matched.sort(key=lambda d: search_match_score(d, query), reverse=True)
+        # Exact-token-hits først (search_match_score), så "øl" ikke drukner i
+        # irrelevante præfiks-hits. Dovent: ved cache-hit bygges kun display-
+        # dicts til de forslag der faktisk vises.
+        matched = iter_search_views(query, active_stores, limit=60)
         seen_names = set()
         suggestions = []
 
@@ -3119,15 +3626,7 @@ def autocomplete():
             if key in seen_names:
                 continue
             seen_names.add(key)
-            price = float(d.get('sale_price') or d.get('price') or 0)
-            suggestions.append({
-                'name': d['name'],
-                'brand': d.get('brand', ''),
-                'price': round(price, 2),
-                'is_sale': bool(d.get('is_sale')),
-                'image': d.get('image_url', ''),
-                'category': d.get('category', ''),
-            })
+            suggestions.append(autocomplete_suggestion(d))
 
         return jsonify({
             'suggestions': suggestions,
@@ -3867,6 +4366,9 @@ def refresh_cache():
     if _IS_EDGE:
         cached_data['data'] = None
         cached_data['search_index'] = None
+        cached_data['search_tokens'] = None
+        cached_data['id_index'] = None
+        cached_data['visibility'] = None
         logger.info("Edge cache invalidated - reload sker ved næste request")
         return jsonify({'ok': True, 'invalidated': True})
 
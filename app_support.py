@@ -3,15 +3,24 @@
 from __future__ import annotations
 
 import hashlib
+import json
 import logging
+import marshal
+import math
 import os
 import re
+import struct
+import sys
 import threading
 import time
 import unicodedata
-from collections import deque
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from collections.abc import Sequence
 from datetime import datetime
 from functools import lru_cache, wraps
+from itertools import accumulate
 from typing import Callable
 
 try:
@@ -27,6 +36,13 @@ except ImportError:
         sb = ' '.join(sorted(b.split()))
         return SequenceMatcher(None, sa, sb).ratio() * 100.0
 
+try:
+    import numpy as _np
+    from rapidfuzz.process import cdist as _rapid_cdist
+except ImportError:
+    _np = None
+    _rapid_cdist = None
+
 logger = logging.getLogger('million')
 
 _db_available: bool | None = None
@@ -141,6 +157,157 @@ api_limiter = RateLimiter(max_calls=60, window_seconds=60,
 cart_event_limiter = RateLimiter(max_calls=20, window_seconds=60)
 
 
+class ResultCache:
+    """Begrænset in-memory LRU/TTL-cache med hit/miss-tællere (ingen database).
+
+    Bounded på to akser: antal nøgler (maxsize) og samlet vægt (max_weight,
+    fx antal produkter i de cachede resultatlister) - en håndfuld brede
+    søgninger med hundredvis af hits må ikke kunne fylde isolatens hukommelse.
+    Udløbne poster fjernes ved opslag; LRU-enden skæres ved indsættelse.
+
+    Tællerne logges aggregeret (log_stats_if_due), aldrig pr. request - samme
+    regel som _note_rate_limited."""
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 600.0,
+                 max_weight: int | None = None, name: str = 'cache'):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.max_weight = max_weight
+        self.name = name
+        self._data: OrderedDict = OrderedDict()  # key -> (udløb, vægt, værdi)
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._last_log = time.time()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._weight -= entry[1]
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, weight: int = 1) -> None:
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[1]
+            self._data[key] = (time.time() + self.ttl_seconds, weight, value)
+            self._weight += weight
+            while self._data and (
+                len(self._data) > self.maxsize
+                or (self.max_weight is not None and self._weight > self.max_weight)
+            ):
+                _, evicted = self._data.popitem(last=False)
+                self._weight -= evicted[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data), 'weight': self._weight,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+            }
+
+    def log_stats_if_due(self, interval: float = 600.0) -> None:
+        """Højst én log-linje pr. interval pr. isolate/proces."""
+        now = time.time()
+        if now - self._last_log < interval:
+            return
+        self._last_log = now
+        logger.info('%s: %s', self.name, self.stats())
+
+
+class SingleFlight:
+    """Samler identiske samtidige beregninger til én (request coalescing).
+
+    Den første kalder for en nøgle (lederen) regner; kaldere der kommer
+    mens den regner, venter på og deler dens resultat i stedet for at køre
+    samme søgning igen. ResultCache dækker gentagelser EFTER et svar er
+    regnet - det her dækker stampeden FØR, når en trending søgning rammer
+    flere tråde på samme tid.
+
+    Kun tråde: enabled=False på edge, hvor isolaten er én kooperativ tråd -
+    en ventende kalder ville blokere den eneste tråd, lederen skal bruge for
+    at blive færdig (src/worker.py har sin egen async single-flight der).
+
+    Fejler lederen, eller venter en kalder længere end timeout_seconds,
+    regner kalderen selv - coalescing må aldrig gøre et svar dårligere end
+    uden. Tællerne logges aggregeret ligesom ResultCache."""
+
+    def __init__(self, name: str = 'single-flight', timeout_seconds: float = 30.0,
+                 enabled: bool = True):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self.enabled = enabled
+        self._flights: dict = {}  # nøgle -> [Event, ok, værdi]
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+        self._last_log = time.time()
+
+    def do(self, key, fn: Callable):
+        """(fn()'s resultat, delt) - delt er sand når en anden kalder regnede."""
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = [threading.Event(), False, None]
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            if flight[0].wait(self.timeout_seconds) and flight[1]:
+                return flight[2], True
+            with self._lock:
+                self.fallbacks += 1
+            return fn(), False
+        try:
+            flight[2] = fn()
+            flight[1] = True
+            return flight[2], False
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight[0].set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                'in_flight': len(self._flights), 'leaders': self.leaders,
+                'coalesced': self.coalesced, 'fallbacks': self.fallbacks,
+                'coalesce_rate': round(self.coalesced / total, 3) if total else None,
+            }
+
+    def log_stats_if_due(self, interval: float = 600.0) -> None:
+        """Højst én log-linje pr. interval pr. isolate/proces."""
+        now = time.time()
+        if now - self._last_log < interval:
+            return
+        self._last_log = now
+        logger.info('%s: %s', self.name, self.stats())
+
+
 def _client_ip() -> str:
     """Bedste bud på klientens rigtige IP - modstandsdygtig over for spoofing.
 
@@ -256,29 +423,28 @@ def _field_matches_term(field: str, term: str) -> bool:
     return any(_token_matches_term(tok, term) for tok in field.split())
 
 
-def search_match_score(product: dict, query: str) -> int:
-    """Højere = bedre relevans. Bruges til at sortere autocomplete/søgeresultater."""
-    terms = [t for t in normalize_name(query).split() if t]
-    if not terms:
-        return 0
-    name = normalize_name(str(product.get('name', '')))
-    brand = normalize_name(str(product.get('brand', '')))
-    # Samme folding som _token_matches_term, så "maelk" ikke bare FINDER de
-    # rigtige varer, men også scorer dem som et rigtigt match.
-    terms = [_fold(t) for t in terms]
-    tokens = [_fold(t) for t in (name + ' ' + brand).split()]
-    score = 0
-    for term in terms:
-        best = 0
-        for tok in tokens:
-            if tok == term:
-                best = max(best, 100)
-            elif tok.startswith(term):
-                best = max(best, 70)
-            elif tok.endswith(term) and len(tok) - len(term) >= 3:
-                best = max(best, 50)
-        score += best
+@lru_cache(maxsize=32768)
+def _score_fields(name: str, brand: str) -> tuple[tuple[str, ...], int]:
+    """(foldede navn+mærke-tokens, navnelængde) til search_match_scorer.
+
+    Memoized pr. (navn, mærke): tidligere normaliserede og foldede
+    search_match_score begge felter forfra for hver vare ved HVER søgning,
+    selvom kun én side (eller 8 forslag) vises. Nøglen er selve strengene,
+    ikke varen - en butiks-promoveret kopi (_promote_match_to_product) har
+    et andet navn og får derfor sine egne tokens. Kataloget har ~19k navne."""
+    norm_name = normalize_name(name)
+    tokens = tuple(_fold(t) for t in (norm_name + ' ' + normalize_name(brand)).split())
+    return tokens, min(len(norm_name), 999)
+
 
+def search_match_scorer(query: str) -> Callable[[dict], int]:
+    """search_match_score(·, query) som funktion af produktet alene.
+
+    Forespørgslens side - normalisering, folding og kategori-prioren - regnes
+    én gang pr. søgning i stedet for én gang pr. vare."""
+    terms = [_fold(t) for t in normalize_name(query).split() if t]
+    if not terms:
+        return lambda product: 0
     # Kategori-prior: et søgeord som "mælk" beskriver en VARETYPE, og den type
     # hører til en bestemt kategori. Uden dette afgjorde tiebreakeren (korteste
     # navn) rækkefølgen, og de syv første træf på "mælk" var chokolade
@@ -293,17 +459,49 @@ def search_match_score(product: dict, query: str) -> int:
     # der i forvejen matcher lige godt på navnet. Et match i den forkerte
     # kategori bliver aldrig sorteret væk, kun placeret efter.
     expected = _search_term_category(tuple(terms))
-    if expected and str(product.get('category', '')) == expected:
-        score += 40
 
-    # Kortere navne først ved lige score (mere specifik titel)
-    return score * 1000 - min(len(name), 999)
+    def score(product: dict) -> int:
+        # Samme folding som _token_matches_term, så "maelk" ikke bare FINDER
+        # de rigtige varer, men også scorer dem som et rigtigt match.
+        tokens, name_len = (product.get('_score_fields')
+                            or _score_fields(str(product.get('name', '')), str(product.get('brand', ''))))
+        total = 0
+        for term in terms:
+            best = 0
+            for tok in tokens:
+                if tok == term:
+                    best = 100
+                    break
+                if tok.startswith(term):
+                    best = max(best, 70)
+                elif best < 50 and tok.endswith(term) and len(tok) - len(term) >= 3:
+                    best = 50
+            total += best
+        if expected and str(product.get('category', '')) == expected:
+            total += 40
+        # Kortere navne først ved lige score (mere specifik titel)
+        return total * 1000 - name_len
+
+    return score
 
 
-def build_search_index(products: list, normalize_fn, flavor_fn=None) -> dict[str, set[str]]:
-    """token -> set of product ids for fast AND-search."""
-    index: dict[str, set[str]] = {}
-    for product in products:
+def search_match_score(product: dict, query: str) -> int:
+    """Højere = bedre relevans. Bruges til at sortere autocomplete/søgeresultater.
+
+    Skal mange varer scores mod samme søgning, brug search_match_scorer."""
+    return search_match_scorer(query)(product)
+
+
+def build_search_index(products: list, normalize_fn, flavor_fn=None) -> dict[str, list[int]]:
+    """token -> stigende positioner i products (doc-id'er) for fast AND-search.
+
+    Positionerne refererer til NØJAGTIG den products-liste der gemmes ved
+    siden af indekset (app_cache-chunks i id-rækkefølge, KV, lokal fil), så
+    søgningen kan slå hits direkte op i listen i stedet for at scanne alle
+    produkter og sammenligne id-strenge. Wire-formatet: encode_search_index.
+    """
+    index: dict[str, list[int]] = {}
+    for pos, product in enumerate(products):
         pid = str(product.get('/product/id', '')).strip()
         if not pid or pid in ('None', ''):
             continue
@@ -326,31 +524,399 @@ def build_search_index(products: list, normalize_fn, flavor_fn=None) -> dict[str
             # >= 2 så korte søgninger som "øl" / "is" selv indekseres
             if len(token) >= 2 and token not in seen_tokens:
                 seen_tokens.add(token)
-                index.setdefault(token, set()).add(pid)
+                index.setdefault(token, []).append(pos)
     return index
 
 
-def search_product_ids(index: dict[str, set[str]], query: str) -> set[str] | None:
+# Wire-format for søgeindekset (app_cache id=0, KV, data/app_cache_local.json).
+# Format 1 (ældre caches) er et bart {token: [produkt-id-streng, ...]}; format 2
+# er {'v': 2, 'n': len(products), 'postings': {token: [delta, ...]}}, hvor
+# posting-listerne er positioner i products, sorteret og delta-kodet (små tal
+# i stedet for 13-cifrede id-strenge - markant mindre JSON).
+_SEARCH_INDEX_FORMAT = 2
+
+
+def encode_search_index(index: dict[str, list[int]], n_docs: int) -> dict:
+    """build_search_index -> wire-format 2 (delta-kodede posting-lister)."""
+    postings: dict[str, list[int]] = {}
+    for token, positions in index.items():
+        prev = 0
+        deltas = []
+        for pos in positions:
+            deltas.append(pos - prev)
+            prev = pos
+        postings[token] = deltas
+    return {'v': _SEARCH_INDEX_FORMAT, 'n': n_docs, 'postings': postings}
+
+
+def decode_search_index(payload, products: list) -> dict[str, array]:
+    """Wire-format (1 eller 2) -> {token: array('I') af stigende positioner i products}.
+
+    Format 2 bruges kun hvis 'n' svarer til den products-liste det ankom
+    med - ellers peger positionerne forkert, og det tomme indeks sender
+    søgningen til den lineære scanning. Format 1 oversættes én gang ved
+    indlæsning via et id -> positioner-opslag, så også ældre caches (KV,
+    lokal fil) søges positionelt."""
+    if not payload or not isinstance(payload, dict):
+        return {}
+    if payload.get('v') == _SEARCH_INDEX_FORMAT and isinstance(payload.get('postings'), dict):
+        if payload.get('n') != len(products):
+            logger.warning(
+                "Søgeindeks passer ikke til produktlisten (n=%s, %d produkter) - bruger lineær søgning",
+                payload.get('n'), len(products),
+            )
+            return {}
+        return {token: array('I', accumulate(deltas)) for token, deltas in payload['postings'].items()}
+    positions_by_pid: dict[str, list[int]] = {}
+    for pos, product in enumerate(products):
+        positions_by_pid.setdefault(str(product.get('/product/id', '')).strip(), []).append(pos)
+    # Tokens hvis id'er ikke (længere) findes beholdes som tomme lister:
+    # search_product_ids' fallback for korte termer kigger på nøglerne.
+    return {
+        token: array('I', sorted({pos for pid in pids for pos in positions_by_pid.get(str(pid), ())}))
+        for token, pids in payload.items()
+    }
+
+
+# Binært produkt-snapshot (data/app_cache_local.snap) - den lokale kopi af
+# app_cache som updater.py skriver, og som app.py, seed-d1.py,
+# recipe_matching.py og build-nutrition.py læser. Før var det ét JSON-dokument
+# på ~30 MB: hver læser betalte fuld json.load og fuld Python-hukommelse for
+# alle ~19k varer, også app.py der ved opstart kun rører få af dem før første
+# request. Formatet:
+#
+#   header   _SNAPSHOT_HEADER: magic, format, marshal.version, antal varer,
+#            længde af meta
+#   meta     marshal: {'timestamp', 'search_index' (wire-format), 'ids',
+#            'types' (/product/product_type pr. vare), 'visibility'
+#            (product_visibility_mask pr. vare), 'store_bits' (butiks-
+#            labels i bit-rækkefølge for visibility)}
+#   offsets  antal+1 uint64 (little-endian), relativt til første record
+#   records  én marshal-record pr. vare
+#
+# ProductSnapshot mmap'er filen og afkoder en vare første gang den bruges.
+# marshal (ikke msgpack - ingen ny afhængighed) er kun stabilt inden for
+# samme marshal.version; en fil fra en anden version afvises, og læseren
+# falder tilbage til JSON/Supabase. KV og Supabase forbliver JSON - de er
+# netværksformater, som edge alligevel ikke kan mmap'e.
+_SNAPSHOT_MAGIC = b'MILLSNAP'
+_SNAPSHOT_FORMAT = 2
+_SNAPSHOT_HEADER = struct.Struct('<8sHHIQ')
+
+
+def _snapshot_json_default(o):
+    # Samme default som updater.py's JSON-skrivning: sæt -> liste, resten str.
+    return list(o) if isinstance(o, (set, frozenset)) else str(o)
+
+
+def snapshot_path_for(json_path: str) -> str:
+    """data/app_cache_local.json -> data/app_cache_local.snap."""
+    return os.path.splitext(json_path)[0] + '.snap'
+
+
+def write_product_snapshot(path: str, products, search_index, timestamp: str | None = None) -> None:
+    """Skriv products + søgeindeks som snapshot (atomisk via .tmp + replace).
+
+    Hver vare sendes gennem en JSON-rundtur først, så en læser får NØJAGTIG
+    det samme som fra JSON-filen/Supabase (sæt bliver lister, tupler lister,
+    ikke-streng-nøgler strenge) - marshal ville ellers bevare typerne."""
+    records = []
+    ids = []
+    types = []
+    visibility = []
+    for product in products:
+        product = json.loads(json.dumps(product, default=_snapshot_json_default, ensure_ascii=False))
+        records.append(marshal.dumps(product))
+        is_dict = isinstance(product, dict)
+        ids.append(str(product.get('/product/id', '')).strip() if is_dict else '')
+        types.append(str(product.get('/product/product_type') or '') if is_dict else '')
+        visibility.append(product_visibility_mask(product) if is_dict else 0)
+    meta = marshal.dumps({
+        'timestamp': timestamp,
+        'search_index': json.loads(json.dumps(search_index or {}, default=_snapshot_json_default)),
+        'ids': ids,
+        'types': types,
+        'visibility': visibility,
+        'store_bits': list(_STORE_BITS),
+    })
+    offsets = array('Q', [0])
+    offsets.extend(accumulate(len(r) for r in records))
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_FORMAT, marshal.version,
+                                      len(records), len(meta)))
+        f.write(meta)
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+    os.replace(tmp, path)
+
+
+class ProductSnapshot(Sequence):
+    """Læse-siden af write_product_snapshot: en dovent, skrivebeskyttet liste.
+
+    Opfører sig som produktlisten fra JSON (len, indeks, iteration, slices).
+    En vare afkodes første gang den slås op og genbruges derefter, så to
+    opslag giver samme dict. ids/types/visibility/search_index ligger i meta
+    og kræver ingen afkodning af varerne."""
+
+    def __init__(self, path: str):
+        import mmap  # kun lokalt - edge læser aldrig filen
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, marshal_version, n, meta_len = _SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+        if magic != _SNAPSHOT_MAGIC or fmt != _SNAPSHOT_FORMAT or marshal_version != marshal.version:
+            raise ValueError(f"{path}: ukendt snapshot-format ({magic!r}, {fmt}, marshal {marshal_version})")
+        start = _SNAPSHOT_HEADER.size
+        meta = marshal.loads(self._mm[start:start + meta_len])
+        self.path = path
+        self.timestamp = meta.get('timestamp')
+        self.search_index = meta.get('search_index') or {}
+        self.ids = meta.get('ids') or []
+        self.types = meta.get('types') or []
+        # Kun brugbar med samme butiks-bits som da filen blev skrevet.
+        self.visibility = (
+            meta.get('visibility') if meta.get('store_bits') == list(_STORE_BITS) else None
+        )
+        start += meta_len
+        self._offsets = array('Q')
+        self._offsets.frombytes(self._mm[start:start + 8 * (n + 1)])
+        if sys.byteorder != 'little':
+            self._offsets.byteswap()
+        self._base = start + 8 * (n + 1)
+        self._decoded: list = [None] * n
+        self._remaining = n
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._decoded)
+
+    def _decode(self, i: int):
+        # Under lås, så samtidige tråde altid får SAMME dict for en vare.
+        with self._lock:
+            product = self._decoded[i]
+            if product is None:
+                start, end = self._offsets[i], self._offsets[i + 1]
+                product = marshal.loads(self._mm[self._base + start:self._base + end])
+                self._decoded[i] = product
+                self._remaining -= 1
+            return product
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._decoded)))]
+        product = self._decoded[i]
+        if product is None:
+            product = self._decode(i % len(self._decoded))
+        return product
+
+    def __iter__(self):
+        if not self._remaining:
+            return iter(self._decoded)
+        return (self[i] for i in range(len(self._decoded)))
+
+    def take(self, positions) -> 'SnapshotSelection':
+        """Dovent udsnit på positioner (fx én kategori) - afkoder ved brug."""
+        return SnapshotSelection(self, positions)
+
+
+class SnapshotSelection(Sequence):
+    """Udsnit af et ProductSnapshot; varerne afkodes først når de læses."""
+
+    def __init__(self, snapshot: ProductSnapshot, positions):
+        self._snapshot = snapshot
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._snapshot[p] for p in self._positions[i]]
+        return self._snapshot[self._positions[i]]
+
+
+def local_app_cache_file(json_path: str) -> str | None:
+    """Den nyeste eksisterende lokale app_cache: snapshot eller ældre JSON."""
+    found = [p for p in (snapshot_path_for(json_path), json_path) if os.path.exists(p)]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def read_local_app_cache(path: str) -> dict:
+    """{'products', 'search_index', 'timestamp'} fra local_app_cache_file.
+
+    Snapshot: products er et dovent ProductSnapshot. JSON: hele dokumentet.
+    Kaster ved ulæselig fil - kalderne har hver deres fallback."""
+    if path.endswith('.snap'):
+        snap = ProductSnapshot(path)
+        return {'products': snap, 'search_index': snap.search_index, 'timestamp': snap.timestamp}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SearchTokenIndex:
+    """Sorteret token-ordbog over et søgeindeks (build_search_index).
+
+    search_product_ids kaldte _token_matches_term - inkl. _fold - på HVER
+    nøgle i indekset for hver søgeterm, altså O(ordforråd x termer) i Python
+    pr. søgning og pr. autocomplete-tastetryk. Her foldes alle tokens én gang,
+    og hver af _token_matches_term's tre regler slås op direkte:
+
+    - token == term / token starter med term: et bisect-interval i de
+      sorterede foldede tokens;
+    - sammensætning (juleøl, flødeost): et bisect-interval i de sorterede
+      BAGLÆNS tokens, filtreret på >= 3 tegns stamme;
+    - omvendt præfiks (hyldebl <-> hyldeblomst): termens præfikser på >= 4
+      tegn slås op som hele tokens.
+
+    Reglerne anvendes på de foldede strenge, præcis som _token_matches_term
+    (der folder begge sider så snart én af dem indeholder æ/ø - og folding af
+    en streng uden æ/ø er identiteten). Samme tokens, blot i logaritmisk tid.
+
+    Bygges én gang pr. indlæst cache (app._apply_cache_payload).
+
+    typo_tokens giver den typo-tolerante fallback samme genvej: ordforrådet
+    grupperes efter længde, så en forkert stavet term kun scores mod de
+    tokens _fuzzy_term_hits overhovedet ville se på (højst 3 tegn længere
+    eller kortere) - i ét rapidfuzz-kald pr. længde i stedet for pr. ord i
+    hvert eneste produkt.
+    """
+
+    _HIGH = chr(0x10FFFF)
+
+    def __init__(self, index: dict):
+        self.index = index
+        by_fold: dict[str, list[str]] = {}
+        for token in index:
+            if token:
+                by_fold.setdefault(_fold(token), []).append(token)
+        self._by_fold = by_fold
+        self._sorted = sorted(by_fold)
+        self._reversed = sorted(f[::-1] for f in by_fold)
+        by_len: dict[int, list[str]] = {}
+        for token in index:
+            by_len.setdefault(len(token), []).append(token)
+        self._by_len = by_len
+
+    def _range(self, arr: list, prefix: str) -> list:
+        lo = bisect_left(arr, prefix)
+        return arr[lo:bisect_left(arr, prefix + self._HIGH, lo)]
+
+    def matching_tokens(self, term: str) -> list[str]:
+        """Indeks-tokens hvor _token_matches_term(token, term) er sand."""
+        if not term:
+            return []
+        t = _fold(term)
+        folded = set(self._range(self._sorted, t))
+        for rev in self._range(self._reversed, t[::-1]):
+            if len(rev) - len(t) >= 3:
+                folded.add(rev[::-1])
+        for k in range(4, len(t)):
+            if t[:k] in self._by_fold:
+                folded.add(t[:k])
+        return [tok for f in folded for tok in self._by_fold[f]]
+
+    def typo_tokens(self, term: str) -> list[str]:
+        """Indeks-tokens w hvor _fuzzy_term_hits(term, [w]) er sand."""
+        if len(term) < 4:
+            return []
+        out: list[str] = []
+        for n in range(len(term) - 3, len(term) + 4):
+            words = self._by_len.get(n)
+            if words:
+                out.extend(_fuzzy_term_matches(term, words))
+        return out
+
+
+def search_product_ids(index: dict, query: str,
+                       tokens: SearchTokenIndex | None = None,
+                       typos: bool = False) -> list[int] | None:
+    """Stigende positioner i produktlisten der matcher ALLE termer.
+
+    index: decode_search_index-output. None = indekset kan ikke afgøre
+    søgningen (brug lineær scanning); [] = ingen hits.
+
+    typos=True: en term matcher også tokens den kun fuzzy-rammer
+    (_fuzzy_term_hits). Resultatet er da KANDIDATER til
+    product_matches_query_fuzzy, der stadig er den endelige dommer - se
+    app._filter_products_for_search."""
     # Samme normalisering som indeksets tokens (bygget med normalize_name i
     # updater.py) - ellers matcher en søgning på "hk" aldrig et indeks-token
     # "hakket" (og omvendt), fordi normaliseringen kun sker i én retning.
+    #
+    # tokens: SearchTokenIndex bygget over SAMME index - giver de samme
+    # tokens som den lineære scanning nedenfor, uden at røre hele ordforrådet.
     terms = [t for t in normalize_name(query).split() if len(t) >= 2]
     if not terms or not index:
         return None
-    result: set[str] | None = None
+    result: set[int] | None = None
     for term in terms:
         # Ældre caches indekserede kun tokens >= 3 tegn. Korte termer uden
         # exact key kan derfor mangle ægte hits - fald tilbage til linear scan.
         if len(term) < 3 and term not in index:
             return None
-        term_ids: set[str] = set()
-        for token, pids in index.items():
-            if _token_matches_term(token, term):
-                term_ids.update(pids)
+        term_ids: set[int] = set()
+        if tokens is not None:
+            for token in tokens.matching_tokens(term):
+                term_ids.update(index[token])
+            if typos:
+                for token in tokens.typo_tokens(term):
+                    term_ids.update(index[token])
+        else:
+            for token, positions in index.items():
+                if _token_matches_term(token, term) or (typos and _fuzzy_term_hits(term, [token])):
+                    term_ids.update(positions)
         if not term_ids:
-            return set()
+            return []
         result = term_ids if result is None else result & term_ids
-    return result or set()
+    return sorted(result) if result else []
+
+
+# D1's FTS5-tabel products_fts (scripts/seed-d1.py) kan ikke få en egen
+# tokenizer - D1 indlæser ikke udvidelser. I stedet skrives indholdet i den
+# form _token_matches_term sammenligner i: foldet (_fold) og uden tegn som
+# FTS5's unicode61 ville splitte på ("4-7", "coca-cola"). Samme transformation
+# på forespørgslens termer, så et præfiks-/suffiks-/lighedsforhold mellem
+# token og term bevares - FTS giver altid et OVERSÆT af hvad
+# product_matches_query accepterer. rwords holder hvert token baglæns, så
+# sammensætnings-reglen ("juleøl" for "øl") også bliver et præfiks-opslag.
+_FTS_STRIP_RE = re.compile(r'[\W_]+')
+
+
+def fts_token(token: str) -> str:
+    """Token/term i products_fts' form: foldet, kun bogstaver og cifre."""
+    return _FTS_STRIP_RE.sub('', _fold(token))
+
+
+def search_fts_columns(search_text: str) -> tuple[str, str]:
+    """(words, rwords)-kolonnerne til products_fts for én vares search_text."""
+    words = [w for w in (fts_token(t) for t in search_text.split()) if w]
+    return ' '.join(words), ' '.join(w[::-1] for w in words)
+
+
+def search_fts_match(terms: list[str]) -> str | None:
+    """FTS5 MATCH-udtryk: AND over termer af _token_matches_term's tre regler.
+
+    Pr. term: token starter med termen (words-præfiks), token ender med
+    termen (rwords-præfiks; stamme-kravet på >= 3 tegn afgøres i Python) og
+    omvendt præfiks (token == termens første 4.. tegn). None hvis en term
+    intet søgbart indhold har - brug da LIKE-vejen."""
+    clauses = []
+    for term in terms:
+        t = fts_token(term)
+        if not t:
+            return None
+        ors = [f'words:"{t}"*', f'rwords:"{t[::-1]}"*']
+        folded = _fold(term)
+        for k in range(4, len(folded)):
+            short = fts_token(folded[:k])
+            if short and f'words:"{short}"' not in ors:
+                ors.append(f'words:"{short}"')
+        clauses.append('(' + ' OR '.join(ors) + ')')
+    return ' AND '.join(clauses) if clauses else None
 
 
 def _normalized_match_fields(product: dict) -> tuple[str, str, str]:
@@ -432,6 +998,21 @@ def _fuzzy_term_hits(term: str, words: list[str], threshold: float = 82.0) -> bo
     return False
 
 
+def _fuzzy_term_matches(term: str, words: list[str], threshold: float = 82.0) -> list[str]:
+    """De ord i `words` _fuzzy_term_hits(term, [ord]) accepterer - samlet.
+
+    Med rapidfuzz+numpy scores hele listen i ét cdist-kald. Kun ratio: for
+    strenge uden mellemrum (søgetermer og indeks-tokens er enkelte ord) er
+    token_sort_ratio identisk med ratio."""
+    if len(term) < 4:
+        return []
+    words = [w for w in words if w and abs(len(w) - len(term)) <= 3]
+    if _np is None or _rapid_cdist is None or len(words) < _FUZZY_BATCH_MIN:
+        return [w for w in words if _fuzzy_term_hits(term, [w], threshold)]
+    row = _rapid_cdist([term], words, scorer=rapid_ratio, score_cutoff=threshold, dtype=_np.float64)[0]
+    return [words[i] for i in _np.flatnonzero(row >= threshold)]
+
+
 def product_matches_query_fuzzy(product: dict, query: str) -> bool:
     """Typo-tolerant fallback - bruges kun når streng token-søgning ikke giver hits
     (fx "minmælk" -> "minimælk"). Kaldes ikke pr. request, kun når resultatet ellers er tomt.
@@ -927,7 +1508,15 @@ def _product_flavor_search_field(product: dict) -> str:
     return _cached_search_flavor_field(raw_text, img)
 
 
+# Tællere for updaterens kørselsrapport (UPDATER_RUN_REPORT=1): antal
+# parvise fuzzy_score-kald, cdist-kald og scorede par i dem. None = slået
+# fra - så koster det ét globalt opslag pr. kald og intet andet.
+fuzzy_call_counts: Counter | None = None
+
+
 def fuzzy_score(a, b):
+    if fuzzy_call_counts is not None:
+        fuzzy_call_counts['pair_calls'] += 1
     if not a or not b: return 0.0
     if a == b: return 1.0
     la, lb = len(a), len(b)
@@ -947,6 +1536,60 @@ def fuzzy_score(a, b):
     return max(rapid_ratio(a, b), rapid_token_sort(a, b)) / 100.0
 
 
+# Under denne størrelse er et cdist-kald (numpy-matrix, argument-konvertering)
+# dyrere end de få parvise fuzzy_score-kald det erstatter.
+_FUZZY_BATCH_MIN = 8
+
+
+def fuzzy_scores(queries, choices, score_cutoff=0.0):
+    """fuzzy_score for én base mod mange kandidater i ét C-niveau-kald.
+
+    Returnerer pr. element i choices max(fuzzy_score(q, c) for q in queries) -
+    bit-for-bit samme tal som de parvise kald, inkl. længde-kortslutningen og
+    dens hele-ord-undtagelse (fund H6). Matchmotorens inderløkker kaldte
+    fuzzy_score par for par fra Python; her scores alle kandidater der har
+    overlevet de billige gates med rapidfuzz.process.cdist (ratio og
+    token_sort_ratio), og kun de par der rammer længde-kortslutningen
+    efterbehandles i Python.
+
+    score_cutoff (0..1) sendes videre til rapidfuzz: scorer UNDER grænsen
+    kan komme tilbage som 0.0. Kald kun med en grænse, som kalderen alligevel
+    afviser under - så er resultatet uændret. Uden numpy/rapidfuzz (eller for
+    få kandidater til at det betaler sig) falder funktionen tilbage til
+    parvise fuzzy_score-kald.
+    """
+    queries = [q for q in queries if q]
+    if not choices:
+        return []
+    if not queries:
+        return [0.0] * len(choices)
+    if _np is None or _rapid_cdist is None or len(choices) < _FUZZY_BATCH_MIN:
+        return [max(fuzzy_score(q, c) for q in queries) for c in choices]
+
+    if fuzzy_call_counts is not None:
+        fuzzy_call_counts['cdist_calls'] += 2
+        fuzzy_call_counts['cdist_pairs'] += len(queries) * len(choices)
+    cutoff = score_cutoff * 100.0
+    best = _np.maximum(
+        _rapid_cdist(queries, choices, scorer=rapid_ratio, score_cutoff=cutoff, dtype=_np.float64),
+        _rapid_cdist(queries, choices, scorer=rapid_token_sort, score_cutoff=cutoff, dtype=_np.float64),
+    )
+    # Længde-kortslutningen fra fuzzy_score, vektoriseret: kun par med meget
+    # forskellig længde OG en score > 0 skal have hele-ord-tjekket.
+    q_len = _np.array([len(q) for q in queries], dtype=_np.float64)[:, None]
+    c_len = _np.array([len(c) for c in choices], dtype=_np.float64)[None, :]
+    with _np.errstate(invalid='ignore', divide='ignore'):
+        short = (2.0 * _np.minimum(q_len, c_len) / (q_len + c_len)) < 0.35
+    for qi, ci in zip(*_np.nonzero(short & (best > 0.0))):
+        a, b = queries[qi], choices[ci]
+        if a == b:
+            continue
+        shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+        if not re.search(r'\b' + re.escape(shorter) + r'\b', longer):
+            best[qi, ci] = 0.0
+    return (best.max(axis=0) / 100.0).tolist()
+
+
 # ---------------------------------------------------------------------------
 # Perceptual image hash (pHash) – bruges til Rema ↔ butik fuzzy matching
 # ---------------------------------------------------------------------------
@@ -969,10 +1612,80 @@ def hash_hamming_distance(hash_a: int, hash_b: int) -> int:
     return (hash_a ^ hash_b).bit_count()
 
 
-def hash_candidate_indices(r_hash_int: int, hash_list: list, max_dist: int = _HASH_CANDIDATE_MAX_DIST) -> set[int]:
-    """Find produkt-indeks med pHash inden for max_dist (til kandidatsøgning)."""
+class PHashIndex:
+    """Multi-index hashing over 64-bit pHashes (Norouzi et al.).
+
+    De 64 bit deles i `bands` bånd. Ligger to hashes inden for afstand r,
+    afviger mindst ét bånd med højst r // bands bit (skuffeprincippet) - så
+    i stedet for at XOR'e hver eneste hash i butikken slås kun båndværdier
+    inden for den radius op i én dict pr. bånd, og de få kandidater
+    verificeres med den rigtige afstand bagefter. Samme kandidatsæt som den
+    lineære scanning, blot sublineært. Med r=12 og 5 bånd à 12-13 bit er det
+    ~460 dict-opslag pr. forespørgsel uanset butikkens størrelse.
+
+    Bygges én gang pr. butik i updater.load_store_comparison_data af samme
+    (index, hash_int)-par som den gamle hash_list.
+    """
+
+    def __init__(self, entries, max_dist: int = _HASH_CANDIDATE_MAX_DIST, bands: int = 5):
+        from itertools import combinations
+        self.entries = list(entries)
+        self.max_dist = max_dist
+        widths = [64 // bands + (1 if b < 64 % bands else 0) for b in range(bands)]
+        self._bands = []  # (shift, mask, flips, table)
+        radius = max_dist // bands
+        shift = 0
+        for width in widths:
+            flips = [
+                sum(1 << bit for bit in combo)
+                for r in range(radius + 1)
+                for combo in combinations(range(width), r)
+            ]
+            self._bands.append((shift, (1 << width) - 1, flips, {}))
+            shift += width
+        for i, h in self.entries:
+            for b_shift, b_mask, _flips, table in self._bands:
+                table.setdefault((h >> b_shift) & b_mask, []).append((i, h))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def candidates(self, r_hash_int: int, max_dist: int) -> set[int]:
+        if max_dist > self.max_dist:
+            # Radius større end indekset er bygget til - skuffeprincippet
+            # holder ikke længere, så scan lineært i stedet for at miste hits.
+            return {
+                i for i, p_hash_int in self.entries
+                if hash_hamming_distance(r_hash_int, p_hash_int) <= max_dist
+            }
+        found: set[int] = set()
+        for b_shift, b_mask, flips, table in self._bands:
+            key = (r_hash_int >> b_shift) & b_mask
+            for flip in flips:
+                bucket = table.get(key ^ flip)
+                if bucket is None:
+                    continue
+                for i, p_hash_int in bucket:
+                    if (r_hash_int ^ p_hash_int).bit_count() <= max_dist:
+                        found.add(i)
+        # Indsæt i stigende indeks-rækkefølge som den lineære scanning, så
+        # sættets iterationsrækkefølge (og dermed uafgjort-vinderen i
+        # _find_generic_match) er uændret.
+        return set(sorted(found))
+
+
+def hash_candidate_indices(r_hash_int: int, hash_list, max_dist: int = _HASH_CANDIDATE_MAX_DIST) -> set[int]:
+    """Find produkt-indeks med pHash inden for max_dist (til kandidatsøgning).
+
+    hash_list er enten en PHashIndex (sublineært opslag) eller en rå liste af
+    (index, hash_int)-par (lineær scanning)."""
     if r_hash_int is None or not hash_list:
         return set()
+    if isinstance(hash_list, PHashIndex):
+        return hash_list.candidates(r_hash_int, max_dist)
     return {
         i for i, p_hash_int in hash_list
         if hash_hamming_distance(r_hash_int, p_hash_int) <= max_dist
@@ -1775,6 +2488,60 @@ def clean_display_text(value) -> str:
     return '' if text.lower() in _JUNK_TEXT_VALUES else text
 
 
+def _display_weight_g(product: dict, unit_measure: str):
+    # Samme fallback som scripts/seed-d1.py::build_row_values - uden den
+    # mistede display-dict'en vægten for produkter hvor kun det rå
+    # /product/weight_g-felt (ikke unit_pricing_measure) findes, mens D1's
+    # egen weight_g-kolonne (brugt til SQL-filtrering) alligevel havde den.
+    weight_g = parse_weight_to_grams(unit_measure)
+    if weight_g is None:
+        try:
+            weight_g = float(product.get('/product/weight_g'))  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            weight_g = None
+    return weight_g
+
+
+def _display_subcategory(product: dict, name_str: str, ptype: str) -> str:
+    # subcategory/is_organic/is_lactose_free er præcomputeret ved nattens
+    # seed (scripts/seed-d1.py, samme kolonner som SQL-filtrene bruger) -
+    # slås op her i stedet for at genberegnes for hvert produkt på hver
+    # side (forside/kategori/tilbud/søgning). _get_subcategory scanner op
+    # til 100+ nøgleord pr. kald, så dette rammer alle sider, ikke kun
+    # søgningens kandidatpulje (samme klasse fund som _flavor_field
+    # nedenfor, 2026-08-05). Manglende felt (ældre cache, eller lokal/
+    # ikke-D1-tilstand) falder blødt tilbage til live-beregning.
+    # Korrekthed: subcategory er kun gyldig hvis den er beregnet ud fra
+    # samme category som `ptype` her - sikret ved at kategori-siden
+    # filtrerer D1-rækker på category = actual_category i SQL'en FØR
+    # product_to_display_dict kaldes (app.py::build_category_listing).
+    sub = product.get('/product/subcategory')
+    if sub:
+        return sub
+    # Lokalt/ikke-D1: featureblokken fra updater.py (build_search_features) -
+    # kun gyldig for den kategori den blev regnet med.
+    features = product.get(SEARCH_FEATURES_KEY)
+    if features and features.get('c') == str(ptype):
+        return features.get('s', '')
+    return _get_subcategory(name_str, str(ptype))
+
+
+def _display_is_organic(product: dict, name_str: str) -> bool:
+    # Forudberegnede filtreringsfelter - bruges af product_card.html som
+    # data-is-organic / data-is-lactose-free. Python-versionen fanger
+    # kanttilfælde som startswith('øko') og lacto-varianter, som den
+    # tidligere Jinja-inline-udgave gik glip af.
+    if '/product/is_organic' in product:
+        return bool(product.get('/product/is_organic'))
+    return is_organic(name_str, str(product.get('/product/description', '')), str(product.get('/product/brand', '')))
+
+
+def _display_is_lactose_free(product: dict, name_str: str) -> bool:
+    if '/product/is_lactose_free' in product:
+        return bool(product.get('/product/is_lactose_free'))
+    return is_lactose_free(name_str, str(product.get('/product/description', '')), str(product.get('/product/brand', '')))
+
+
 def product_to_display_dict(
     product: dict,
     *,
@@ -1788,12 +2555,6 @@ def product_to_display_dict(
     name_str = str(product.get('/product/title', 'Ukendt vare'))
     unit_measure = str(product.get('/product/unit_pricing_measure', '') or '')
     is_sale = force_sale or sale_price is not None
-    weight_g = parse_weight_to_grams(unit_measure)
-    if weight_g is None:
-        try:
-            weight_g = float(product.get('/product/weight_g'))  # type: ignore[arg-type]
-        except (TypeError, ValueError):
-            weight_g = None
     result = {
         'id': str(product.get('/product/id', '')),
         'name': name_str,
@@ -1809,11 +2570,7 @@ def product_to_display_dict(
         'sale_end_date': sale_end_date if sale_end_date is not None else parse_sale_end_date(product),
         'store': str(product.get('/product/store', 'Rema 1000')),
         'unit_measure': unit_measure,
-        # Samme fallback som scripts/seed-d1.py::build_row_values - uden den
-        # mistede display-dict'en vægten for produkter hvor kun det rå
-        # /product/weight_g-felt (ikke unit_pricing_measure) findes, mens D1's
-        # egen weight_g-kolonne (brugt til SQL-filtrering) alligevel havde den.
-        'weight_g': weight_g,
+        'weight_g': _display_weight_g(product, unit_measure),
         'stk_count': product.get('/product/stk_count') or parse_stk_count(unit_measure),
         'price_per_kg': product.get('/product/price_per_kg'),
         'store_matches': product.get('/product/store_matches', {}),
@@ -1823,25 +2580,9 @@ def product_to_display_dict(
         'rema_is_sale': product.get('/product/rema_is_sale'),
         'multi_deal': product.get('/product/multi_deal', ''),
         'lowest_price_30d': product.get('/product/lowest_price_30d'),
-        # subcategory/is_organic/is_lactose_free er præcomputeret ved nattens
-        # seed (scripts/seed-d1.py, samme kolonner som SQL-filtrene bruger) -
-        # slås op her i stedet for at genberegnes for hvert produkt på hver
-        # side (forside/kategori/tilbud/søgning). _get_subcategory scanner op
-        # til 100+ nøgleord pr. kald, så dette rammer alle sider, ikke kun
-        # søgningens kandidatpulje (samme klasse fund som _flavor_field
-        # nedenfor, 2026-08-05). Manglende felt (ældre cache, eller lokal/
-        # ikke-D1-tilstand) falder blødt tilbage til live-beregning.
-        # Korrekthed: subcategory er kun gyldig hvis den er beregnet ud fra
-        # samme category som `ptype` her - sikret ved at kategori-siden
-        # filtrerer D1-rækker på category = actual_category i SQL'en FØR
-        # product_to_display_dict kaldes (app.py::build_category_listing).
-        'subcategory': product.get('/product/subcategory') or _get_subcategory(name_str, str(ptype)),
-        # Forudberegnede filtreringsfelter - bruges af product_card.html som
-        # data-is-organic / data-is-lactose-free. Python-versionen fanger
-        # kanttilfælde som startswith('øko') og lacto-varianter, som den
-        # tidligere Jinja-inline-udgave gik glip af.
-        'is_organic': product.get('/product/is_organic') if '/product/is_organic' in product else is_organic(name_str, str(product.get('/product/description', '')), str(product.get('/product/brand', ''))),
-        'is_lactose_free': product.get('/product/is_lactose_free') if '/product/is_lactose_free' in product else is_lactose_free(name_str, str(product.get('/product/description', '')), str(product.get('/product/brand', ''))),
+        'subcategory': _display_subcategory(product, name_str, ptype),
+        'is_organic': _display_is_organic(product, name_str),
+        'is_lactose_free': _display_is_lactose_free(product, name_str),
     }
     # Præcomputeret smagsfelt fra nattens seed (scripts/seed-d1.py) - se
     # _product_flavor_search_field. Sættes KUN når det rå produkt faktisk bar
@@ -1856,6 +2597,139 @@ def product_to_display_dict(
     return result
 
 
+class SearchView(dict):
+    """Let stand-in for product_to_display_dict under søgning og listevisning.
+
+    Søgningen matchede, filtrerede og sorterede på fulde display-dicts for
+    HVER kandidat - vægt-parsing, tilbudsdato, stk-antal, underkategori og
+    øko/laktose-heuristik for op til 800 varer - selvom pagineringen bagefter
+    smed alle undtagen én side (60) væk. Viewet har kun de felter matcherne
+    (product_matches_query, search_match_scorer), autocomplete og
+    apply_product_filters' sorteringer læser, med NØJAGTIG samme værdier som
+    display-dict'en. Filterfelterne (weight_g, subcategory, is_organic,
+    is_lactose_free) beregnes først når et filter spørger efter dem.
+    display() bygger den fulde dict til de varer der faktisk vises.
+
+    product er den butiksjusterede vare (product_for_active_stores), så
+    display() ikke skal gentage justeringen."""
+
+    _LAZY = frozenset({'weight_g', 'subcategory', 'is_organic', 'is_lactose_free'})
+
+    def __init__(self, product: dict, default_category: str = 'Andre varer'):
+        sale_price = product.get('/product/sale_price')
+        name_str = str(product.get('/product/title', 'Ukendt vare'))
+        super().__init__(
+            id=str(product.get('/product/id', '')),
+            name=name_str,
+            price=float(product.get('/product/price', 0)),
+            sale_price=float(sale_price) if sale_price is not None else None,
+            description=clean_display_text(product.get('/product/description', '')),
+            category=str(product.get('/product/product_type') or default_category),
+            brand=clean_display_text(product.get('/product/brand', '')),
+            image_url=str(product.get('/product/imageLink', '')),
+            is_sale=sale_price is not None,
+            is_any_sale=product.get('/product/is_any_sale', False),
+            price_per_kg=product.get('/product/price_per_kg'),
+        )
+        # Se product_to_display_dict: nøglens tilstedeværelse skelner.
+        if '/product/flavor_kw' in product:
+            self['_flavor_field'] = product['/product/flavor_kw'] or ''
+        features = product.get(SEARCH_FEATURES_KEY)
+        if features:
+            _apply_search_features(self, features)
+        self.product = product
+        self.default_category = default_category
+
+    def _compute(self, key: str):
+        p = self.product
+        if key == 'weight_g':
+            value = _display_weight_g(p, str(p.get('/product/unit_pricing_measure', '') or ''))
+        elif key == 'subcategory':
+            value = _display_subcategory(p, self['name'], self['category'])
+        elif key == 'is_organic':
+            value = _display_is_organic(p, self['name'])
+        else:
+            value = _display_is_lactose_free(p, self['name'])
+        self[key] = value
+        return value
+
+    def __missing__(self, key):
+        if key in self._LAZY:
+            return self._compute(key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return dict.__getitem__(self, key)
+        if key in self._LAZY:
+            return self._compute(key)
+        return default
+
+    def display(self) -> dict:
+        return product_to_display_dict(self.product, default_category=self.default_category)
+
+
+# Præberegnet søge-featureblok pr. vare, skrevet af updater.py ved hvert
+# cache-build (annotate_search_features) og gemt i app_cache ved siden af
+# resten af varen. Uden den regnede søgningen ved HVER request det samme ud
+# for hver kandidat: normalize_name på navn/mærke/beskrivelse
+# (_normalized_match_fields), smagsfeltet (_product_flavor_search_field) når
+# /product/flavor_kw mangler - altså altid lokalt og uden D1 - og foldede
+# tokens til search_match_scorer. Nattens D1-seed gav kun edge en del af
+# den besparelse.
+#
+# Versioneret i selve nøglen: ændres normalize_name, _fold eller
+# smagsopslaget, skal nøglen bumpes, så en cache bygget med den gamle kode
+# ignoreres (live-beregning) i stedet for at matche på forældede tokens.
+# Korte nøgler, tomme felter udeladt - blokken ligger på ~19k varer:
+#   n/b/d  normaliseret navn/mærke/beskrivelse ('' hvis udeladt)
+#   f      normaliseret smagsfelt
+#   t      foldede navn+mærke-tokens; udeladt = n + b uændret
+#   c/s    kategori og underkategorien regnet for den
+SEARCH_FEATURES_KEY = '/product/search_v1'
+
+
+def build_search_features(product: dict) -> dict:
+    """Featureblokken for én rå vare - regnet på NØJAGTIG de felter
+    SearchView giver matcherne, så live-vejen og blokken ikke kan være uenige."""
+    view = SearchView({k: v for k, v in product.items() if k != SEARCH_FEATURES_KEY})
+    name, brand, desc = _normalized_match_fields(view)
+    features = {'n': name}
+    if brand:
+        features['b'] = brand
+    if desc:
+        features['d'] = desc
+    flavor = _product_flavor_search_field(view)
+    if flavor:
+        features['f'] = flavor
+    tokens, _ = _score_fields(view['name'], view['brand'])
+    if tokens != tuple(f'{name} {brand}'.split()):
+        features['t'] = ' '.join(tokens)
+    features['c'] = view['category']
+    features['s'] = _get_subcategory(view['name'], view['category'])
+    return features
+
+
+def annotate_search_features(products: list) -> None:
+    """Stemp SEARCH_FEATURES_KEY på alle varer (in-place, før app_cache gemmes)."""
+    for product in products:
+        if isinstance(product, dict):
+            product[SEARCH_FEATURES_KEY] = build_search_features(product)
+
+
+def _apply_search_features(view: dict, features: dict) -> None:
+    """Læg featureblokken ind som de memo-felter matcherne i forvejen slår op."""
+    name, brand = features.get('n', ''), features.get('b', '')
+    view['_norm_fields'] = (name, brand, features.get('d', ''))
+    if '_flavor_field' not in view:
+        view['_flavor_field'] = features.get('f', '')
+    tokens = features.get('t')
+    view['_score_fields'] = (
+        tuple(tokens.split()) if tokens is not None else tuple(f'{name} {brand}'.split()),
+        min(len(name), 999),
+    )
+
+
 def _serialize_store_match(match: dict) -> dict:
     """Ét store_matches-entry til native JSON (docs/native-app.md §3.2)."""
     if not isinstance(match, dict):
@@ -1973,6 +2847,69 @@ def products_to_api_list(products: list) -> list:
     return [product_to_api_dict(p) for p in products]
 
 
+# Forudberegnet autocomplete-tabel (scripts/seed-d1.py -> D1 'autocomplete'):
+# ét-ords-præfikser på 2..AUTOCOMPLETE_PREFIX_MAX_LEN tegn, hver med op til
+# AUTOCOMPLETE_PREFIX_TOP_N rangerede forslag. Længere eller flerordede
+# søgninger går den live vej (app.autocomplete) - dér er D1-kandidatpuljen
+# alligevel lille. Rækkeantallet er holdt nede af hensyn til D1's konto-brede
+# skrivebudget (se seed-d1.py).
+AUTOCOMPLETE_PREFIX_MAX_LEN = 4
+AUTOCOMPLETE_PREFIX_TOP_N = 16
+
+
+def autocomplete_suggestion(display: dict) -> dict:
+    """Det slanke forslag /api/autocomplete returnerer for én display-dict.
+
+    Delt af den live vej (app.autocomplete) og seed-tidens præfikstabel, så de
+    to aldrig kan give forskellige felter for samme vare."""
+    price = float(display.get('sale_price') or display.get('price') or 0)
+    return {
+        'name': display['name'],
+        'brand': display.get('brand', ''),
+        'price': round(price, 2),
+        'is_sale': bool(display.get('is_sale')),
+        'image': display.get('image_url', ''),
+        'category': display.get('category', ''),
+    }
+
+
+_TOBACCO_IMG_RE = re.compile(r'rema-product-images\.digital\.rema1000\.dk/(\d+)/')
+
+
+def _is_tobacco_image(url: str) -> bool:
+    m = _TOBACCO_IMG_RE.search(url)
+    if not m:
+        return False
+    return is_rema_tobacco_id(m.group(1))
+
+
+def product_is_displayable(p: dict) -> bool:
+    """Billed-/tobak-/non-food-reglerne for om en vare overhovedet må vises
+    (uafhængigt af butiksvalget). Bruges af app.py ved cache-indlæsning og af
+    scripts/seed-d1.py ved seed-tid - ét sted, så de ikke kan glide fra
+    hinanden."""
+    img = str(p.get('/product/imageLink', '')).strip()
+    if img in _PLACEHOLDER_IMGS or _is_tobacco_image(img):
+        return False
+    rema_img = str(p.get('/product/rema_image', '')).strip()
+    if rema_img in _PLACEHOLDER_IMGS or _is_tobacco_image(rema_img):
+        return False
+    title = str(p.get('/product/title', ''))
+    brand = str(p.get('/product/brand', ''))
+    # Tobak/nikotin - tjek titel + brand, så fx Prince/HARDBOX ikke slipper
+    if is_age_restricted(title, brand, product_id=p.get('/product/id', '')):
+        return False
+    # Kun mad: bleer, shampoo, elektronik osv. (titel + brand)
+    if is_non_food_name(title) or is_non_food_name(brand):
+        return False
+    bilka_brand = str((p.get('/product/store_matches') or {}).get('bilka', {}).get('brand', '')).lower().strip()
+    if bilka_brand.startswith('deli'):
+        return False
+    if str(p.get('/product/store', '')).lower() == 'bilka' and str(p.get('/product/brand', '')).lower().strip().startswith('deli'):
+        return False
+    return True
+
+
 def product_available_at_active_stores(product: dict, active_stores: set | None) -> bool:
     if active_stores is None:
         return True
@@ -1992,6 +2929,8 @@ def product_available_at_active_stores(product: dict, active_stores: set | None)
 
 def _promote_match_to_product(product: dict, store_key: str, match: dict) -> dict:
     out = dict(product)
+    # Featureblokken er regnet på Rema-kortets navn/mærke/beskrivelse.
+    out.pop(SEARCH_FEATURES_KEY, None)
     out['/product/title'] = match['name']
     out['/product/store'] = _STORE_CONFIGS[store_key]['label']
     if match.get('is_sale'):
@@ -2041,3 +2980,299 @@ def product_for_active_stores(product: dict, active_stores: set | None) -> dict
     if best_key:
         return _promote_match_to_product(product, best_key, matches[best_key])
     return None
+
+
+# Bit pr. butik i _STORE_CONFIGS-rækkefølge - nøglen for et butiksvalg i
+# app.py's cache af StoreView'er. Cookie'ens butikssæt er kun en håndfuld
+# forskellige i praksis, og en heltalsnøgle er billigere at hashe end et
+# frozenset af labels.
+_STORE_BITS = {cfg['label']: 1 << i for i, cfg in enumerate(_STORE_CONFIGS.values())}
+
+
+def store_set_mask(active_stores: set | None) -> int | None:
+    """Bitmaske for active_stores; -1 for None (intet butiksfilter).
+
+    None hvis sættet har et label uden bit - så bygges der ikke noget view,
+    og kalderen går den almindelige vej."""
+    if active_stores is None:
+        return -1
+    mask = 0
+    for label in active_stores:
+        bit = _STORE_BITS.get(label)
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+
+# Bit over butiksbittene i product_visibility_mask: varen må vises.
+_DISPLAYABLE_BIT = 1 << len(_STORE_BITS)
+
+# Sat på D1-rækkernes data af scripts/seed-d1.py, der kun seeder varer som
+# består product_is_displayable - så slipper requesten for reglerne.
+DISPLAYABLE_KEY = '/product/displayable'
+
+
+def product_visibility_mask(product: dict) -> int:
+    """0 hvis varen aldrig må vises, ellers _DISPLAYABLE_BIT plus en bit for
+    hver butik den kan vises under (product_available_at_active_stores'
+    regler). Synlig under et butiksvalg hvis mask & store_set_mask(valg)."""
+    if not product.get(DISPLAYABLE_KEY) and not product_is_displayable(product):
+        return 0
+    mask = _DISPLAYABLE_BIT | _STORE_BITS.get(product.get('/product/store', 'Rema 1000'), 0)
+    if product.get('/product/rema_price'):
+        mask |= _STORE_BITS['Rema 1000']
+    for key in (product.get('/product/store_matches') or {}):
+        label = _STORE_CONFIGS.get(key, {}).get('label')
+        mask |= _STORE_BITS.get(label, 0)
+    return mask
+
+
+def _bitmap(positions, n: int) -> int:
+    """Heltal med bit i sat for hver position i positions (0 <= i < n)."""
+    buf = bytearray((n + 7) >> 3)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _nan_to_none(value):
+    # apply_product_filters med NaN som grænse: alle sammenligninger er
+    # falske, så intet frasorteres - samme som intet filter. ±inf er en
+    # gyldig grænse og bevares.
+    return None if value is None or math.isnan(value) else value
+
+
+# CategoryListing's sort-værdier -> (nøgle over (pris, kg-pris, navn, vægt), reverse)
+_LISTING_SORTS = {
+    'price-asc': (lambda e: e[0], False),
+    'price-desc': (lambda e: e[0], True),
+    'kg-price-asc': (lambda e: e[1], False),
+    'name-asc': (lambda e: e[2], False),
+}
+
+
+class CategoryListing:
+    """Én kategori som apply_product_filters + _paginate ser den, forberedt.
+
+    Kategorisiden byggede display-dicts for HELE kategorien, kørte de
+    regex-baserede is_organic/is_lactose_free for hver vare og sorterede
+    hele listen igen - for hver request, før alt undtagen én side blev
+    smidt væk. Her beregnes filterfelterne én gang pr. vare:
+
+      bitmaps      tilbud, øko, laktosefri og hver underkategori (int-bitsæt,
+                   bit i = products[i])
+      pris/vægt    positionerne sorteret på effektiv pris og på vægt, så et
+                   min/max-interval er to bisect'er
+      _orders      stabile sorteringspermutationer for hver sort-værdi
+
+    page() er så et AND af bitsættene plus et udsnit i den valgte orden;
+    kun den viste sides varer skal bygges som display-dicts. Værdierne er
+    nøjagtig dem apply_product_filters læser af product_to_display_dict(
+    product, category=category), så resultatet er det samme."""
+
+    def __init__(self, products, category: str):
+        self.category = category
+        self.products: list = []
+        entries = []  # (effektiv pris, kg-pris-nøgle, navne-nøgle, vægt)
+        sale, organic, lactose, unweighted = [], [], [], []
+        subs: dict[str, list[int]] = {}
+        for product in products:
+            try:
+                v = SearchView(product, default_category=category)
+                # product_to_display_dict(category=...) bruger kategorien
+                # fra listen, også hvis promoveringen gav varen en anden.
+                v['category'] = category
+                sub = str(v.get('subcategory') or '')
+                name = str(v.get('name') or '')
+                desc = str(v.get('description') or '')
+                brand = str(v.get('brand') or '')
+                is_org = is_organic(name, desc, brand)
+                is_lf = is_lactose_free(name, desc, brand)
+                weight = v.get('weight_g')
+            except Exception as e:
+                logger.warning("Error processing product in category: %s", e)
+                continue
+            i = len(self.products)
+            self.products.append(product)
+            price = v.get('sale_price') if v.get('is_sale') else v.get('price')
+            entries.append((
+                price or 0, v.get('price_per_kg') or 999999, name.lower(), weight,
+            ))
+            if v.get('is_sale') or v.get('is_any_sale'):
+                sale.append(i)
+            if is_org:
+                organic.append(i)
+            if is_lf:
+                lactose.append(i)
+            if weight is None:
+                unweighted.append(i)
+            subs.setdefault(sub, []).append(i)
+        n = len(self.products)
+        self.all = (1 << n) - 1
+        self.sale = _bitmap(sale, n)
+        self.organic = _bitmap(organic, n)
+        self.lactose = _bitmap(lactose, n)
+        self.unweighted = _bitmap(unweighted, n)
+        self.subcategories = {sub: _bitmap(pos, n) for sub, pos in subs.items()}
+        self._orders = {
+            sort: sorted(range(n), key=lambda i, k=key: k(entries[i]), reverse=reverse)
+            for sort, (key, reverse) in _LISTING_SORTS.items()
+        }
+        by_price = self._orders['price-asc']
+        self._prices = [entries[i][0] for i in by_price]
+        self._by_weight = sorted(
+            (i for i in range(n) if entries[i][3] is not None), key=lambda i: entries[i][3])
+        self._weights = [entries[i][3] for i in self._by_weight]
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _range(self, order: list, keys: list, lo, hi) -> int:
+        start = 0 if lo is None else bisect_left(keys, lo)
+        end = len(keys) if hi is None else bisect_right(keys, hi)
+        return _bitmap(order[start:end], len(self.products))
+
+    def select(self, args) -> int:
+        """Bitsættet af varer der består apply_product_filters' filtre."""
+        mask = self.all
+        min_price = _nan_to_none(args.get('min_price', type=float))
+        max_price = _nan_to_none(args.get('max_price', type=float))
+        if min_price is not None or max_price is not None:
+            mask &= self._range(self._orders['price-asc'], self._prices, min_price, max_price)
+        if args.get('sale', type=str) == 'true':
+            mask &= self.sale
+        subcategory = args.get('subcategory', type=str) or ''
+        if subcategory:
+            mask &= self.subcategories.get(subcategory, 0)
+        if args.get('organic', type=str) == 'true':
+            mask &= self.organic
+        if args.get('lactose', type=str) == 'true':
+            mask &= self.lactose
+        min_weight = _nan_to_none(args.get('min_weight', type=float))
+        max_weight = _nan_to_none(args.get('max_weight', type=float))
+        if min_weight is not None or max_weight is not None:
+            weighted = self._range(self._by_weight, self._weights, min_weight, max_weight)
+            if min_weight is None or min_weight <= 0:
+                weighted |= self.unweighted
+            mask &= weighted
+        return mask
+
+    def page(self, args, page: int, per_page: int):
+        """(varer, page, total_pages, total) - som _paginate(apply_product_
+        filters(...)), men varerne er de justerede produkter for siden."""
+        mask = self.select(args)
+        order = self._orders.get(args.get('sort', 'relevance'))
+        total = mask.bit_count()
+        total_pages = (total + per_page - 1) // per_page if total else 0
+        page = min(max(page, 1), total_pages) if total_pages > 0 else 1
+        start = (page - 1) * per_page
+        if mask == self.all:
+            positions = (order or range(total))[start:start + per_page]
+        else:
+            bits = mask.to_bytes((len(self.products) + 7) >> 3, 'little')
+            positions = []
+            seen = 0
+            for i in order or range(len(self.products)):
+                if bits[i >> 3] >> (i & 7) & 1:
+                    if seen >= start:
+                        positions.append(i)
+                        if len(positions) == per_page:
+                            break
+                    seen += 1
+        return [self.products[i] for i in positions], page, total_pages, total
+
+
+class StoreView:
+    """Kataloget som ét butiksvalg ser det - bygget én gang pr. butikssæt.
+
+    Listerne, søgningen og forsiden kørte butiks-/billedfilteret og
+    product_for_active_stores pr. vare pr. request; uden Rema 1000 i valget
+    betyder det en løkke over store_matches, unify_category og en dict-kopi
+    (_promote_match_to_product) for hver vare. Viewet gemmer resultatet:
+
+      raw / products   de synlige varer i katalogrækkefølge, rå og justeret
+      by_category      rå /product/product_type -> justerede varer (samme
+                       nøgler og rækkefølge som app.py's _category_index)
+      listing()        kategoriens CategoryListing, bygget dovent første
+                       gang kategorien vises; prisordenen og de øvrige
+                       sorteringer bor dér (CategoryListing._orders), ikke
+                       i viewet - der er ingen by_price på StoreView
+      search_hits()    katalogindeksets søgetræf rettet til de viste kort:
+                       de promoverede (vist under en anden butiks navn end
+                       råvarens) søges i deres egen, viste tekst
+
+    allowed er app.py's filter for billeder/tobak/non-food. Råvarernes
+    identitet (id()) er opslagsnøglen, så viewet gælder kun for netop det
+    katalog det blev bygget på (catalogue)."""
+
+    def __init__(self, products, active_stores: set | None, allowed):
+        self.catalogue = products
+        self.raw: list = []
+        self.products: list = []
+        self.by_category: dict[str, list] = {}
+        self._adjusted: dict[int, dict] = {}
+        self._listings: dict[str, CategoryListing] = {}
+        self._promoted: list[int] = []  # katalogpositioner
+        self._promoted_docs: list = []  # de justerede kort, samme rækkefølge
+        self._promoted_index: tuple[dict, SearchTokenIndex] | None = None
+        self._promoted_set: frozenset[int] = frozenset()
+        for pos, product in enumerate(products):
+            if not allowed(product):
+                continue
+            adjusted = product_for_active_stores(product, active_stores)
+            if not adjusted:
+                continue
+            if adjusted is not product:
+                self._promoted.append(pos)
+                self._promoted_docs.append(adjusted)
+            self.raw.append(product)
+            self.products.append(adjusted)
+            self._adjusted[id(product)] = adjusted
+            ptype = product.get('/product/product_type')
+            if ptype:
+                self.by_category.setdefault(str(ptype), []).append(adjusted)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def adjusted(self, product: dict) -> dict | None:
+        """Den justerede vare for en råvare fra kataloget; None hvis butiks-
+        valget (eller filteret) skjuler den."""
+        return self._adjusted.get(id(product))
+
+    def search_hits(self, hits: list[int], query: str, typos: bool = False) -> list[int]:
+        """hits er search_product_ids' positioner i kataloget for query; svaret
+        er de positioner hvis VISTE kort matcher efter samme kriterie
+        (typos=True giver kandidater til product_matches_query_fuzzy).
+
+        Katalogets søgeindeks er bygget over råvarens titel/mærke/beskrivelse,
+        men _promote_match_to_product viser kortet under den matchende butiks
+        navn. For de kort erstattes indeksets svar af et lille indeks over
+        netop deres viste tekst, bygget første gang viewet søges i. Kan det
+        ikke afgøre søgningen (en kort term), scannes de promoverede kort."""
+        if not self._promoted:
+            return hits
+        docs = self._promoted_docs
+        if self._promoted_index is None:
+            index = build_search_index(docs, normalize_name, flavor_fn=get_search_flavor_keywords)
+            self._promoted_index = (index, SearchTokenIndex(index))
+            self._promoted_set = frozenset(self._promoted)
+        index, tokens = self._promoted_index
+        promoted_hits = search_product_ids(index, query, tokens, typos=typos)
+        if promoted_hits is None:
+            match = product_matches_query_fuzzy if typos else product_matches_query
+            promoted_hits = [i for i, doc in enumerate(docs)
+                             if match(SearchView(doc, default_category='Andre varer'), query)]
+        merged = {pos for pos in hits if pos not in self._promoted_set}
+        merged.update(self._promoted[i] for i in promoted_hits)
+        return sorted(merged)
+
+    def listing(self, category: str) -> CategoryListing:
+        """CategoryListing for by_category[category], bygget første gang
+        kategorien vises i dette butiksvalg."""
+        listing = self._listings.get(category)
+        if listing is None:
+            listing = CategoryListing(self.by_category.get(category, ()), category)
+            self._listings[category] = listing
+        return listing
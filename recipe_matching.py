@@ -13,19 +13,20 @@ foer-matching data).
 
 from __future__ import annotations
 
-import json
 import os
 import re
 import time
 
 from app_support import (
-    fuzzy_score, get_meat_types, get_product_flavors, logger, meats_match, normalize_name,
+    fuzzy_score, get_meat_types, get_product_flavors, local_app_cache_file, logger, meats_match,
+    normalize_name, read_local_app_cache,
 )
 
 # Samme fil og friskheds-grænse som scripts/seed-d1.py::fetch_products().
 # cache-updater.yml kører "python recipe_pricing.py" som næste step i SAMME
-# job, lige efter "python updater.py" har skrevet denne fil FØR den uploader
-# til Supabase (updater.py::_save_local_cache) - at hente de samme ~30 MB
+# job, lige efter "python updater.py" har skrevet filen (nu som snapshot,
+# data/app_cache_local.snap) FØR den uploader til Supabase
+# (updater.py::_save_local_cache) - at hente de samme ~30 MB
 # igen over netværket dér var ren Supabase-egress der aldrig gav noget nyt
 # (samme fund som seed-d1.py's tilsvarende genbrug). recipe_importer.py kører
 # i et andet workflow/runner uden filen til stede og falder derfor uændret
@@ -39,16 +40,15 @@ def load_current_products(client) -> list[dict]:
     kopieret i stedet for importeret for at undgå at trække hele updater.py's
     tunge scraper-afhængigheder ind i scripts der kun skal læse cachen
     (recipe_importer.py, recipe_pricing.py)."""
-    if os.path.exists(_LOCAL_APP_CACHE):
-        age_s = time.time() - os.path.getmtime(_LOCAL_APP_CACHE)
+    local = local_app_cache_file(_LOCAL_APP_CACHE)
+    if local:
+        age_s = time.time() - os.path.getmtime(local)
         if age_s < _LOCAL_APP_CACHE_MAX_AGE_S:
             try:
-                with open(_LOCAL_APP_CACHE, 'r', encoding='utf-8') as f:
-                    payload = json.load(f)
-                products = payload.get('products') or []
+                products = list(read_local_app_cache(local).get('products') or [])
                 if products:
                     logger.info(
-                        f"Genbruger frisk data/app_cache_local.json ({len(products)} "
+                        f"Genbruger frisk {os.path.basename(local)} ({len(products)} "
                         f"produkter, {age_s:.0f}s gammel) til opskrift-matching - "
                         f"springer Supabase-hentning over"
                     )
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmark: FTS5-tabellen products_fts mod LIKE-kæderne i load_search_raw.
+
+Kør: python3 scripts/bench-d1-fts.py [antal-produkter] [antal-søgninger]
+
+app.py::load_search_raw byggede et AND-af-OR'er af "search_text LIKE ?"-
+mønstre (_term_like_patterns), hvilket tvinger en fuld scanning af hele
+products-tabellen pr. søgning. Med products_fts (scripts/seed-d1.py) slås
+termerne i stedet op som token-præfikser i et FTS5-indeks.
+
+Scriptet opretter en lokal SQLite-database med NØJAGTIG seed-d1.py's SCHEMA/
+FINALIZE, fylder den med syntetiske varer og kører begge forespørgsler. Det
+fejler hvis FTS-kandidaterne ikke indeholder alle varer som
+_token_matches_term (den endelige Python-dommer) accepterer - FTS må gerne
+give flere kandidater, aldrig færre. Ingen netværk, ingen D1.
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import _term_like_patterns  # noqa: E402
+from app_support import _token_matches_term, normalize_name, search_fts_match  # noqa: E402
+
+_spec = importlib.util.spec_from_file_location('seed_d1', ROOT / 'scripts' / 'seed-d1.py')
+seed_d1 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(seed_d1)
+
+_STEMS = [
+    'mælk', 'øl', 'ost', 'fløde', 'smør', 'ris', 'gris', 'pølser', 'jule', 'hylde',
+    'blomst', 'kaffe', 'te', 'is', 'brød', 'rug', 'hvede', 'æble', 'pære', 'bær',
+    'kylling', 'okse', 'laks', 'rejer', 'chokolade', 'saft', 'juice', 'yoghurt',
+    'skyr', 'havre', 'gryn', 'mel', 'sukker', 'salt', 'peber', 'løg', 'gulerod',
+    'kartoffel', 'tomat', 'agurk', 'æg', 'sød', 'syrnet', 'let', 'skummet', 'kakao',
+]
+_BRANDS = ['arla', 'lurpak', 'thise', 'coca-cola', 'rema 1000', 'kelda', 'änglamark', '']
+_SYLLABLES = ['ka', 'lo', 'ri', 'sne', 'bu', 'da', 'fal', 'gen', 'hol', 'mi', 'pe', 'strø', 'tæ', 'vi']
+
+
+def _pool(rng: random.Random, n: int) -> list[str]:
+    """Kunstige ord, så hvert stamme-ord kun rammer en realistisk andel."""
+    return [''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(n)]
+
+
+def _title(rng: random.Random, pool: list[str]) -> str:
+    word = ''.join(rng.sample(_STEMS, rng.choice([1, 1, 2])))
+    if rng.random() < 0.1:
+        word = word[:rng.randint(4, max(4, len(word)))]  # trunkeret ("hyldebl")
+    words = [word] + rng.sample(pool, rng.choice([1, 2, 3]))
+    rng.shuffle(words)
+    if rng.random() < 0.3:
+        words.append(f"{rng.randint(1, 9)}-{rng.randint(10, 20)}%")
+    return ' '.join(words)
+
+
+def _db(n: int, rng: random.Random) -> tuple[sqlite3.Connection, dict[str, str]]:
+    con = sqlite3.connect(':memory:')
+    con.executescript(seed_d1.SCHEMA)
+    texts: dict[str, str] = {}
+    pool = _pool(rng, 5000)
+    rows, fts = [], []
+    for i in range(n):
+        pid = str(5700000000000 + i)
+        search_text = normalize_name(f"{_title(rng, pool)} {rng.choice(_BRANDS)}")
+        texts[pid] = search_text
+        data = json.dumps({'/product/id': pid, '/product/title': search_text, 'pad': 'x' * 600})
+        rows.append((pid, search_text, data))
+        fts.append(seed_d1.build_fts_values(pid, search_text))
+    con.executemany("INSERT INTO products_new (id, search_text, data) VALUES (?, ?, ?)", rows)
+    for start in range(0, len(fts), 500):
+        con.execute("INSERT INTO products_fts_new (id,words,rwords) VALUES " + ",".join(fts[start:start + 500]))
+    con.executescript(seed_d1.FINALIZE)
+    return con, texts
+
+
+def _like_sql(terms: list[str]) -> tuple[str, list[str]]:
+    clauses, params = [], []
+    for term in terms:
+        pats = _term_like_patterns(term)
+        clauses.append("(" + " OR ".join(["search_text LIKE ? ESCAPE '\\'"] * len(pats)) + ")")
+        params.extend(pats)
+    return "SELECT id, data FROM products WHERE " + " AND ".join(clauses), params
+
+
+_FTS_SQL = ("SELECT p.id, p.data FROM products_fts JOIN products p ON p.id = products_fts.id "
+            "WHERE products_fts MATCH ?")
+
+
+def main() -> int:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 19_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(20260816)
+    con, texts = _db(n, rng)
+    probes = []
+    for _ in range(queries):
+        words = [w[:rng.randint(2, len(w))] if len(w) > 2 and rng.random() < 0.5 else w
+                 for w in rng.sample(_STEMS, rng.choice([1, 1, 2]))]
+        if rng.random() < 0.3:
+            words = [w.replace('æ', 'ae').replace('ø', 'oe') for w in words]
+        probes.append([t for t in normalize_name(' '.join(words)).split() if t])
+
+    like_s = fts_s = 0.0
+    missing = []
+    for terms in probes:
+        sql, params = _like_sql(terms)
+        t0 = time.perf_counter()
+        con.execute(sql + " LIMIT 800", params).fetchall()
+        like_s += time.perf_counter() - t0
+        match = search_fts_match(terms)
+        t0 = time.perf_counter()
+        con.execute(f"{_FTS_SQL} ORDER BY rank LIMIT 800", (match,)).fetchall()
+        fts_s += time.perf_counter() - t0
+        fts_ids = {r[0] for r in con.execute(_FTS_SQL, (match,))}
+        truth = {pid for pid, text in texts.items()
+                 if all(any(_token_matches_term(tok, t) for tok in text.split()) for t in terms)}
+        if truth - fts_ids:
+            missing.append(' '.join(terms))
+
+    print(f"{n} varer, {len(probes)} søgninger (LIMIT 800)")
+    print(f"  LIKE-kæder (scanning): {like_s * 1e3 / len(probes):8.2f} ms/søgning")
+    print(f"  products_fts (MATCH) : {fts_s * 1e3 / len(probes):8.2f} ms/søgning "
+          f"({like_s / fts_s if fts_s else float('inf'):.1f}x)")
+    if missing:
+        print(f"FEJL: FTS mangler træf for {len(missing)} søgninger, fx {missing[:3]}")
+        return 1
+    print("OK: FTS-kandidaterne dækker alle træf")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
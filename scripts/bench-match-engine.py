@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""Benchmark af matchmotoren (updater.fetch_and_parse_xml) på en frossen fixture.
+
+Kør:
+  python3 scripts/bench-match-engine.py snapshot            # kræver Supabase + netværk
+  python3 scripts/bench-match-engine.py synthetic           # deterministisk, offline
+  python3 scripts/bench-match-engine.py run [--fixture F] [--repeat N] [--record]
+
+Kommentarerne i updater.py henviser til målte µs/par-tal, men uden en
+fælles fixture kunne ingen andre eftergøre dem. 'snapshot' fryser de rå
+Rema XML-elementer (med pHash fra rema_hashes.json) og alle butikkers
+produkter-rækker til én gzip-JSON, anonymiseret: kun de felter
+load_store_comparison_data læser, fortløbende række-id'er og billed-URL'er
+erstattet af en stabil digest (lighed bevares, så billede-dedup opfører sig
+som i produktion; placeholder-logoer beholdes). 30-dages normalpriser
+fryses med, da de indgår i kortenes viste pris.
+
+'run' afspiller fixturen helt offline - ingen Supabase, intet XML-kald -
+og tider load_store_comparison_data, Rema-parsingen, Rema-annoteringen,
+fase 1, fase 2, fase 2b, solokort og dedup hver for sig (bedste af
+--repeat kørsler, fra updater._last_phase_timings). Outputtets sha256
+sammenlignes med <fixture>.sha256; afviger det, fejler scriptet, så en
+optimering der ændrer et eneste match ikke kan passere som "hurtigere".
+--record skriver hashen (efter en bevidst adfærdsændring).
+
+'synthetic' bygger en realistisk stor fixture ud fra en fast seed (delte
+EAN'er på tværs af kæder, PL-varer uden EAN, vægtløse Dagrofa-rækker,
+Salling-kæderne med fælles billeder, klyngede pHashes), så benchmarken kan
+køres og reproduceres bit for bit uden adgang til produktionsdata.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import updater as U  # noqa: E402
+from app_support import _PLACEHOLDER_IMGS  # noqa: E402
+
+FIXTURE_VERSION = 1
+DEFAULT_FIXTURE = ROOT / 'data' / 'bench' / 'match_fixture.json.gz'
+SYNTHETIC_FIXTURE = ROOT / 'data' / 'bench' / 'match_fixture_synthetic.json.gz'
+
+# Felter load_store_comparison_data læser - alt andet smides ved snapshot.
+_ROW_FIELDS = ('pris', 'producent', 'netto_vaegt', 'kg_price', 'tilbud', 'varenummer',
+               'billede_hash', 'normalpris', 'multikob', 'navn', 'kategori', 'billede_url')
+# Felter _parse_rema_items læser fra et rå XML-element.
+_REMA_FIELDS = ('id', 'ean', 'title', 'price', 'sale_price', 'description', 'brand',
+                'imageLink', 'product_type', 'sale_price_effective_date', 'unit_pricing_measure')
+
+PHASES = ('load', 'parse_rema', 'rema', 'phase1', 'phase2', 'phase2b', 'solokort', 'dedup')
+
+
+def _anon_url(url) -> str:
+    url = str(url or '')
+    if not url or url in ('nan', 'None') or url in _PLACEHOLDER_IMGS:
+        return url
+    return 'img:' + hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def _write_fixture(path: Path, fixture: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(fixture, f, ensure_ascii=False, separators=(',', ':'))
+    n_rows = sum(len(v) for v in fixture['stores'].values())
+    print(f"Skrev {path} ({len(fixture['rema_items'])} Rema-elementer, {n_rows} butiksrækker, "
+          f"{path.stat().st_size / 1e6:.1f} MB)")
+
+
+def snapshot(path: Path) -> int:
+    if not U.db_available() or U.supabase is None:
+        print("Supabase ikke tilgængelig - snapshot kræver SUPABASE_URL/SUPABASE_KEY")
+        return 1
+    items = U._fetch_rema_xml_items()
+    hashes = U._fill_missing_rema_hashes(items, U._load_rema_hashes())
+    rema_items = []
+    for item in items:
+        slim = {k: item.get(k) for k in _REMA_FIELDS if item.get(k) is not None}
+        slim['imageLink'] = _anon_url(item.get('imageLink'))
+        slim['image_hash'] = hashes.get(str(item.get('id', '')), '')
+        rema_items.append(slim)
+    stores, next_id = {}, 1
+    for key in U.DB_STORE_KEYS:
+        db_key = U._STORE_CONFIGS[key]['db_key']
+        rows = []
+        for row in U._fetch_store_rows(db_key):
+            slim = {k: row.get(k) for k in _ROW_FIELDS}
+            slim['id'] = next_id
+            slim['billede_url'] = _anon_url(row.get('billede_url'))
+            next_id += 1
+            rows.append(slim)
+        stores[key] = rows
+    normal = [[pid, store, price] for (pid, store), price in sorted(U._fetch_normal_prices_30d().items())]
+    _write_fixture(path, {'version': FIXTURE_VERSION, 'created': time.strftime('%Y-%m-%d'),
+                          'rema_items': rema_items, 'stores': stores, 'normal_prices': normal})
+    return 0
+
+
+# -- Syntetisk fixture --------------------------------------------------------
+
+_NOUNS = ("mælk letmælk skummetmælk piskefløde yoghurt skyr smør ost skiveost mozzarella "
+          "feta hytteost æg rugbrød toastbrød pitabrød boller kaffe te juice cola sodavand "
+          "pilsner øl vin chips nødder müsli havregryn pasta spaghetti ris mel sukker "
+          "hakket oksekød kyllingebryst frikadeller leverpostej pålæg bacon laks rejer tun "
+          "makrel pizza lasagne bananer æbler tomater agurk kartofler løg gulerødder "
+          "peberfrugt broccoli marmelade honning ketchup mayonnaise remoulade "
+          "opvaskemiddel").split()
+_ADJ = ("økologisk laktosefri sukkerfri glutenfri alkoholfri let mini klassisk grov fin "
+        "røget frisk frost hel skiver revet").split()
+_FLAVORS = ("jordbær vanilje chokolade karamel hindbær citron naturel blåbær mango "
+            "pære").split()
+_BRANDS = ("Arla Thise Lurpak Kærgården Riberhus Castello Schulstad Kohberg Tulip Steff "
+           "Stryhns Gestus Kims Haribo Coca-Cola Tuborg Carlsberg Rynkeby Barilla Santa "
+           "Änglamark Øllingegaard Skare Gammeldags Naturli").split()
+_PL = {'bilka': 'Salling', 'netto': 'Salling', 'foetex': 'Salling', 'sb': 'Coop',
+       'brugsen': 'Coop', 'kvickly': 'Coop', 'discount365': 'Coop', 'meny': 'Meny',
+       'spar': 'Spar', 'mk': 'Min Købmand', 'lidl': 'Milbona', 'loevbjerg': 'Løvbjerg',
+       'abclavpris': 'First Price'}
+_CATS = ("Mejeri", "Kolonial", "Frost", "Kød", "Frugt & grønt", "Drikkevarer", "Brød",
+         "Pålæg", "Fisk")
+_WEIGHTS = ('250 g', '500 g', '1 kg', '1 l', '0,5 l', '6 x 0,33 l', '400 g', '200 g',
+            '150 g', '1,5 l', '10 stk', '6 stk', '75 cl')
+_SALLING = ('bilka', 'netto', 'foetex')
+_DAGROFA = ('meny', 'spar', 'mk')
+
+
+def _jitter(rng: random.Random, h: int, max_bits: int) -> str:
+    for _ in range(rng.randint(0, max_bits)):
+        h ^= 1 << rng.randrange(64)
+    return f"{h:016x}"
+
+
+def synthetic(path: Path, seed: int, n_protos: int, rema_n: int, store_share: float) -> int:
+    rng = random.Random(seed)
+    protos = []
+    for i in range(n_protos):
+        words = [rng.choice(_NOUNS)]
+        if rng.random() < 0.5:
+            words.insert(0, rng.choice(_ADJ))
+        if rng.random() < 0.3:
+            words.append(rng.choice(_FLAVORS))
+        if rng.random() < 0.15:
+            words.append(f"{rng.choice(['1,5', '3,5', '10', '38', '4,6', '0,0', '70'])}%")
+        protos.append({
+            'name': ' '.join(words), 'pl': rng.random() < 0.3, 'brand': rng.choice(_BRANDS),
+            'weight': rng.choice(_WEIGHTS), 'price': round(rng.uniform(6, 120), 2),
+            'cat': rng.choice(_CATS), 'hash': rng.getrandbits(64), 'ean': str(5700000000000 + i),
+        })
+
+    stores, rid = {}, 0
+    for key in U.DB_STORE_KEYS:
+        rows = []
+        for proto in rng.sample(protos, int(n_protos * store_share)):
+            rid += 1
+            name = proto['name']
+            if rng.random() < 0.35:
+                name = f"{name} {rng.choice(_ADJ)}"
+            brand = _PL.get(key, 'Eget mærke') if proto['pl'] else proto['brand']
+            shared_img = key in _SALLING and rng.random() < 0.6
+            on_sale = rng.random() < 0.15
+            rows.append({
+                'id': rid, 'navn': name.capitalize() if rng.random() < 0.5 else name.title(),
+                'producent': brand,
+                'netto_vaegt': '' if key in _DAGROFA and rng.random() < 0.5 else proto['weight'],
+                'pris': round(proto['price'] * rng.uniform(0.85, 1.2), 2), 'kg_price': '',
+                'tilbud': 'ja' if on_sale else 'nej',
+                'varenummer': '' if proto['pl'] or key == 'lidl' or rng.random() < 0.25 else proto['ean'],
+                'billede_hash': '' if rng.random() < 0.2 else _jitter(rng, proto['hash'], 8),
+                'normalpris': str(round(proto['price'] * 1.25, 2)) if on_sale and rng.random() < 0.5 else '',
+                'multikob': '2 for 30' if rng.random() < 0.03 else '',
+                'kategori': proto['cat'],
+                'billede_url': (f"img:salling-{proto['ean']}" if shared_img
+                                else f"img:{key}-{rid}"),
+            })
+        stores[key] = rows
+
+    rema_items = []
+    for i, proto in enumerate(rng.sample(protos, min(rema_n, n_protos))):
+        desc = '' if rng.random() < 0.4 else f"{proto['brand']} {proto['name']} {rng.choice(_ADJ)}"
+        sale = rng.random() < 0.1
+        rema_items.append({
+            'id': str(100000 + i), 'ean': '', 'title': proto['name'].upper(),
+            'price': f"{proto['price']:.2f} DKK",
+            'sale_price': f"{proto['price'] * 0.8:.2f} DKK" if sale else '',
+            'description': desc,
+            'brand': 'REMA 1000' if proto['pl'] else proto['brand'].upper(),
+            'imageLink': f"img:rema-{i}", 'product_type': proto['cat'],
+            'sale_price_effective_date': '', 'unit_pricing_measure': proto['weight'],
+            'image_hash': '' if rng.random() < 0.1 else _jitter(rng, proto['hash'], 8),
+        })
+
+    _write_fixture(path, {'version': FIXTURE_VERSION, 'created': f"synthetic seed={seed}",
+                          'rema_items': rema_items, 'stores': stores, 'normal_prices': []})
+    return 0
+
+
+# -- Afspilning ---------------------------------------------------------------
+
+def _load_fixture(path: Path) -> dict:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        fixture = json.load(f)
+    if fixture.get('version') != FIXTURE_VERSION:
+        raise SystemExit(f"{path}: fixture-version {fixture.get('version')} != {FIXTURE_VERSION}")
+    return fixture
+
+
+def _run_once(fixture: dict) -> tuple[dict, list]:
+    U._store_caches.clear()
+    U._store_gate_columns.clear()
+    U._normal_price_history_cache = {(pid, store): float(price)
+                                     for pid, store, price in fixture['normal_prices']}
+
+    t0 = time.perf_counter()
+    for key in U.DB_STORE_KEYS:
+        U.load_store_comparison_data(key, rows=fixture['stores'].get(key, []))
+    load_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hashes = {str(item.get('id', '')): item.get('image_hash', '') for item in fixture['rema_items']}
+    rema_products = U._parse_rema_items(fixture['rema_items'], hashes)
+    parse_s = time.perf_counter() - t0
+
+    out = U.fetch_and_parse_xml(incremental=False, rema_products=rema_products)
+    timings = dict(U._last_phase_timings)
+    # 'load' i fetch_and_parse_xml er kun cache-opslaget - de rigtige
+    # indlæsningstider er målt ovenfor.
+    timings['load'] = load_s
+    timings['parse_rema'] = parse_s
+    return timings, out
+
+
+def _output_hash(products: list) -> str:
+    blob = json.dumps(products, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def run(path: Path, repeat: int, record: bool) -> int:
+    if not path.exists():
+        print(f"{path} findes ikke - kør 'snapshot' eller 'synthetic' først")
+        return 1
+    fixture = _load_fixture(path)
+    n_rows = sum(len(v) for v in fixture['stores'].values())
+    print(f"Fixture {path.name} ({fixture.get('created')}): {len(fixture['rema_items'])} Rema-elementer, "
+          f"{n_rows} butiksrækker, {U._match_worker_count()} worker(s)")
+
+    runs, digest, n_out = [], None, 0
+    for _ in range(repeat):
+        timings, out = _run_once(fixture)
+        h = _output_hash(out)
+        if digest is not None and h != digest:
+            print("FEJL: outputtet er ikke deterministisk mellem kørsler")
+            return 1
+        digest, n_out = h, len(out)
+        runs.append(timings)
+
+    print(f"  {'fase':<12}{'bedst':>10}{'median':>10}")
+    for phase in PHASES:
+        vals = [r.get(phase, 0.0) for r in runs]
+        print(f"  {phase:<12}{min(vals) * 1000:>8.0f}ms{statistics.median(vals) * 1000:>8.0f}ms")
+    total = [sum(r.values()) for r in runs]
+    print(f"  {'i alt':<12}{min(total) * 1000:>8.0f}ms{statistics.median(total) * 1000:>8.0f}ms")
+    print(f"  {n_out} produkter, sha256 {digest}")
+
+    hash_file = path.with_suffix('').with_suffix('.sha256')
+    if record:
+        hash_file.write_text(digest + '\n')
+        print(f"Hash gemt i {hash_file}")
+        return 0
+    if not hash_file.exists():
+        print(f"Ingen {hash_file.name} - kør med --record for at fastfryse den forventede hash")
+        return 1
+    expected = hash_file.read_text().strip()
+    if digest != expected:
+        print(f"FEJL: match-outputtet har ændret sig (forventet {expected})")
+        return 1
+    print("OK: match-output uændret")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    p_snap = sub.add_parser('snapshot', help='frys Rema XML + produkter-rækker fra produktion')
+    p_snap.add_argument('--out', type=Path, default=DEFAULT_FIXTURE)
+    p_syn = sub.add_parser('synthetic', help='byg en deterministisk syntetisk fixture')
+    p_syn.add_argument('--out', type=Path, default=SYNTHETIC_FIXTURE)
+    p_syn.add_argument('--seed', type=int, default=20260816)
+    p_syn.add_argument('--protos', type=int, default=6000, help='antal unikke varer')
+    p_syn.add_argument('--rema', type=int, default=2500)
+    p_syn.add_argument('--store-share', type=float, default=0.35,
+                       help='andel af varerne hver butik fører')
+    p_run = sub.add_parser('run', help='afspil fixturen offline og tid faserne')
+    p_run.add_argument('--fixture', type=Path,
+                       default=DEFAULT_FIXTURE if DEFAULT_FIXTURE.exists() else SYNTHETIC_FIXTURE)
+    p_run.add_argument('--repeat', type=int, default=3)
+    p_run.add_argument('--record', action='store_true', help='gem output-hashen som forventet')
+    p_run.add_argument('--verbose', action='store_true', help='vis updaterens INFO-log')
+    args = ap.parse_args()
+
+    if args.cmd == 'snapshot':
+        return snapshot(args.out)
+    if args.cmd == 'synthetic':
+        return synthetic(args.out, args.seed, args.protos, args.rema, args.store_share)
+    if not args.verbose:
+        logging.getLogger('million').setLevel(logging.WARNING)
+    # Afspilningen må aldrig nå Supabase - heller ikke via en glemt .env.
+    U.supabase = None
+    os.environ.pop('UPDATER_INCREMENTAL', None)
+    return run(args.fixture, max(1, args.repeat), args.record)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
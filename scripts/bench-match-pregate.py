@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark: vektoriserede for-gates (_pregate_candidates) mod Python-gates.
+
+Kør: python3 scripts/bench-match-pregate.py [antal-produkter] [kandidater-pr-opslag]
+
+_find_generic_match kører kød-, alkoholfri-, vægt-, stk- og pris-gaten på
+hver kandidat enkeltvis i Python, før navnescoren beregnes. Med
+gate_columns afvises hele kandidatmængden i stedet med NumPy-vektoroperationer
+(updater._pregate_candidates), så løkken kun ser overleverne.
+
+Scriptet bygger syntetiske butiksvarer med realistisk fordeling af
+manglende vægt/stk (Dagrofa-agtige rækker), kører begge veje på samme
+kandidatmængder og fejler hvis overleverne (inkl. rækkefølge) afviger.
+Ingen netværk, ingen Supabase.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import updater as U  # noqa: E402
+from app_support import weights_compatible  # noqa: E402
+
+
+def _python_survivors(candidates, products, rema_meats, rema_variants,
+                      rema_weight_g, rema_stk_count, rema_price) -> list:
+    """Samme gates som i _find_generic_match's løkke, én kandidat ad gangen."""
+    out = []
+    for i in candidates:
+        p = products[i]
+        if not U._meats_match(rema_meats, p['_meats']):
+            continue
+        if (rema_variants ^ p['_variants']) & U._VARIANT_ALCOHOL_FREE:
+            continue
+        if not weights_compatible(rema_weight_g, p.get('_weight_g')):
+            continue
+        if rema_stk_count is not None and p.get('_stk_count') is not None and rema_stk_count != p.get('_stk_count'):
+            continue
+        if rema_price and rema_price > 0:
+            p_price = float(p.get('price', 0))
+            if p_price > 5.0 * float(rema_price):
+                continue
+            if p_price > 0 and p_price * 5.0 < float(rema_price):
+                continue
+        out.append(i)
+    return out
+
+
+def _product(rng: random.Random) -> dict:
+    meats = U._flag_mask(rng.sample(['okse', 'gris', 'kylling', 'laks'], rng.choice([0, 0, 0, 1, 1, 2])),
+                         U._MEAT_BITS)
+    return {
+        '_weight_g': None if rng.random() < 0.3 else rng.choice([100.0, 250.0, 400.0, 500.0, 1000.0, 1980.0]),
+        '_stk_count': rng.choice([None] * 8 + [1, 4, 6, 10]),
+        'price': round(rng.uniform(3, 150), 2),
+        '_meats': meats,
+        '_variants': rng.choice([0] * 10 + [U._VARIANT_ORGANIC, U._VARIANT_ALCOHOL_FREE]),
+    }
+
+
+def main() -> int:
+    if U._np is None:
+        print("numpy ikke installeret - intet at sammenligne")
+        return 1
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8_000
+    per_query = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    rng = random.Random(20260816)
+    products = [_product(rng) for _ in range(n)]
+    cols = U._build_gate_columns(products)
+    queries = []
+    for _ in range(500):
+        ref = _product(rng)
+        cand = set(rng.sample(range(n), per_query))
+        queries.append((cand, ref['_meats'], ref['_variants'], ref['_weight_g'],
+                        ref['_stk_count'], ref['price']))
+
+    t0 = time.perf_counter()
+    py = [_python_survivors(q[0], products, *q[1:]) for q in queries]
+    py_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vec = [U._pregate_candidates(q[0], cols, *q[1:]) for q in queries]
+    vec_s = time.perf_counter() - t0
+
+    total = len(queries) * per_query
+    kept = sum(len(s) for s in py)
+    print(f"{n} produkter, {len(queries)} opslag à {per_query} kandidater, "
+          f"{kept / total:.1%} overlever for-gates")
+    print(f"  Python-gates  : {py_s * 1e9 / total:8.1f} ns/kandidat")
+    print(f"  NumPy-forgates: {vec_s * 1e9 / total:8.1f} ns/kandidat "
+          f"({py_s / vec_s if vec_s else float('inf'):.1f}x)")
+    if py != vec:
+        print("FEJL: overleverne afviger")
+        return 1
+    print("OK: identiske overlevere i samme rækkefølge")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark: PHashIndex (multi-index hashing) mod lineær pHash-scanning.
+
+Kør: python3 scripts/bench-phash-index.py [antal-hashes] [antal-opslag]
+
+updater._find_generic_match slår hver Rema-vares pHash op i hver butiks
+hash-liste for at finde naboer inden for _HASH_CANDIDATE_MAX_DIST. Den gamle
+hash_candidate_indices XOR'ede og popcountede HELE listen pr. opslag; nu
+bygges et PHashIndex én gang pr. butik i load_store_comparison_data.
+
+Scriptet genererer klyngede hashes (som rigtige produktfotos: samme
+emballage i flere butikker/størrelser giver nabo-hashes med få bit forskel),
+kører begge veje og fejler hvis kandidatsættene ikke er identiske.
+Ingen netværk, ingen Supabase.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app_support import (  # noqa: E402
+    PHashIndex, hash_candidate_indices, _HASH_CANDIDATE_MAX_DIST,
+)
+
+
+def _jitter(rng: random.Random, h: int, max_bits: int) -> int:
+    for _ in range(rng.randint(0, max_bits)):
+        h ^= 1 << rng.randrange(64)
+    return h
+
+
+def main() -> int:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(20260816)
+
+    centers = [rng.getrandbits(64) for _ in range(max(1, n // 4))]
+    hash_list = [(i, _jitter(rng, rng.choice(centers), 10)) for i in range(n)]
+    probes = [_jitter(rng, rng.choice(centers), 14) if rng.random() < 0.7
+              else rng.getrandbits(64) for _ in range(queries)]
+
+    t0 = time.perf_counter()
+    index = PHashIndex(hash_list, _HASH_CANDIDATE_MAX_DIST)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    linear = [hash_candidate_indices(q, hash_list) for q in probes]
+    linear_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [hash_candidate_indices(q, index) for q in probes]
+    indexed_s = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(linear, indexed) if a != b)
+    hits = sum(len(a) for a in linear)
+    print(f"{n} hashes, {queries} opslag, max_dist={_HASH_CANDIDATE_MAX_DIST}, {hits} hits i alt")
+    print(f"  byg PHashIndex : {build_s * 1000:8.1f} ms")
+    print(f"  lineær         : {linear_s * 1e6 / queries:8.1f} µs/opslag")
+    print(f"  PHashIndex     : {indexed_s * 1e6 / queries:8.1f} µs/opslag "
+          f"({linear_s / indexed_s if indexed_s else float('inf'):.1f}x)")
+    if mismatches:
+        print(f"FEJL: {mismatches} opslag gav forskelligt kandidatsæt")
+        return 1
+    print("OK: identiske kandidatsæt")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
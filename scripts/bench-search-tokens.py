@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark: SearchTokenIndex (sorteret token-ordbog) mod lineær indeks-scanning.
+
+Kør: python3 scripts/bench-search-tokens.py [antal-tokens] [antal-søgninger]
+
+app_support.search_product_ids kaldte _token_matches_term på HVER nøgle i
+søgeindekset for hver søgeterm. Med et SearchTokenIndex (bygget én gang pr.
+cache i app._apply_cache_payload) slås præfiks-, sammensætnings- og
+omvendt-præfiks-reglen i stedet op med bisect.
+
+Scriptet bygger et syntetisk dansk ordforråd (sammensætninger, æ/ø/å,
+trunkerede tokens som "hyldebl"), kører begge veje på samme søgninger -
+inkl. ASCII-foldede stavemåder som "maelk" - og fejler hvis id-mængderne
+afviger. Tilsvarende for den typo-tolerante vej: SearchTokenIndex.typo_tokens
+mod _fuzzy_term_hits på hvert ord i ordforrådet, for termer med én tastefejl.
+Ingen netværk, ingen Supabase.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app_support import SearchTokenIndex, _fold, _fuzzy_term_hits, search_product_ids  # noqa: E402
+
+_STEMS = [
+    'mælk', 'øl', 'ost', 'fløde', 'smør', 'ris', 'gris', 'pølser', 'jule', 'hylde',
+    'blomst', 'kaffe', 'te', 'is', 'brød', 'rug', 'hvede', 'æble', 'pære', 'bær',
+    'kylling', 'okse', 'laks', 'rejer', 'chokolade', 'saft', 'juice', 'yoghurt',
+    'skyr', 'havre', 'gryn', 'mel', 'sukker', 'salt', 'peber', 'løg', 'gulerod',
+    'kartoffel', 'tomat', 'agurk', 'æg', 'sød', 'syrnet', 'let', 'skummet', 'kakao',
+]
+
+
+def _vocabulary(rng: random.Random, n: int) -> list[str]:
+    vocab: set[str] = set(_STEMS)
+    while len(vocab) < n:
+        parts = rng.sample(_STEMS, rng.choice([1, 2, 2, 3]))
+        word = ''.join(parts)
+        if rng.random() < 0.15:
+            word = word[:rng.randint(4, max(4, len(word)))]  # trunkeret ("hyldebl")
+        if rng.random() < 0.1:
+            word = _fold(word)  # nogle kilder staver allerede "ae"/"oe"
+        if len(word) >= 2:
+            vocab.add(word + (str(rng.randint(0, 99)) if rng.random() < 0.3 else ''))
+    return sorted(vocab)
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word))
+    op = rng.choice('sdi')
+    if op == 's':
+        return word[:i] + rng.choice('abdeiklmnorst') + word[i + 1:]
+    if op == 'd':
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice('abdeiklmnorst') + word[i:]
+
+
+def main() -> int:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rng = random.Random(20260816)
+    vocab = _vocabulary(rng, n)
+    index = {tok: sorted(rng.sample(range(n), rng.randint(1, 4))) for tok in vocab}
+
+    probes = []
+    for _ in range(queries):
+        words = rng.sample(_STEMS, rng.choice([1, 1, 2]))
+        if rng.random() < 0.3:
+            words = [_fold(w) for w in words]
+        if rng.random() < 0.2:
+            words.append(rng.choice(vocab)[:rng.randint(3, 12)])
+        probes.append(' '.join(words))
+
+    t0 = time.perf_counter()
+    tokens = SearchTokenIndex(index)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    linear = [search_product_ids(index, q) for q in probes]
+    linear_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [search_product_ids(index, q, tokens) for q in probes]
+    indexed_s = time.perf_counter() - t0
+
+    typos = [_typo(rng, rng.choice(vocab)) for _ in range(queries // 10)]
+    t0 = time.perf_counter()
+    typo_linear = [sorted(w for w in index if _fuzzy_term_hits(t, [w])) for t in typos]
+    typo_linear_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    typo_indexed = [sorted(tokens.typo_tokens(t)) for t in typos]
+    typo_indexed_s = time.perf_counter() - t0
+
+    mismatches = [q for q, a, b in zip(probes, linear, indexed) if a != b]
+    mismatches += [t for t, a, b in zip(typos, typo_linear, typo_indexed) if a != b]
+    print(f"{len(index)} tokens, {queries} søgninger, {len(typos)} tastefejl")
+    print(f"  byg SearchTokenIndex: {build_s * 1000:8.1f} ms")
+    print(f"  lineær scanning     : {linear_s * 1e3 / queries:8.2f} ms/søgning")
+    print(f"  SearchTokenIndex    : {indexed_s * 1e3 / queries:8.2f} ms/søgning "
+          f"({linear_s / indexed_s if indexed_s else float('inf'):.0f}x)")
+    print(f"  tastefejl, lineær   : {typo_linear_s * 1e3 / len(typos):8.2f} ms/term")
+    print(f"  tastefejl, typo_tokens: {typo_indexed_s * 1e3 / len(typos):6.2f} ms/term "
+          f"({typo_linear_s / typo_indexed_s if typo_indexed_s else float('inf'):.0f}x)")
+    if mismatches:
+        print(f"FEJL: {len(mismatches)} søgninger/termer gav forskellige resultater, fx {mismatches[:3]}")
+        return 1
+    print("OK: identiske id-mængder og typo-tokens")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
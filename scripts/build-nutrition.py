@@ -32,7 +32,9 @@ from dotenv import load_dotenv
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(ROOT, '.env'))
 sys.path.insert(0, ROOT)
-from app_support import salling_sname_key, sname_key  # noqa: E402  (delt nøglelogik med runtime)
+from app_support import (  # noqa: E402  (delt nøglelogik med runtime)
+    local_app_cache_file, read_local_app_cache, salling_sname_key, sname_key,
+)
 
 OUT_FILE = os.path.join(ROOT, 'data', 'nutrition_data.json')
 
@@ -165,15 +167,14 @@ _LOCAL_APP_CACHE_MAX_AGE_S = 1800  # 30 min
 
 
 def load_app_cache():
-    if os.path.exists(_LOCAL_APP_CACHE):
-        age_s = time.time() - os.path.getmtime(_LOCAL_APP_CACHE)
+    local = local_app_cache_file(_LOCAL_APP_CACHE)
+    if local:
+        age_s = time.time() - os.path.getmtime(local)
         if age_s < _LOCAL_APP_CACHE_MAX_AGE_S:
             try:
-                with open(_LOCAL_APP_CACHE, 'r', encoding='utf-8') as f:
-                    payload = json.load(f)
-                products = payload.get('products') or []
+                products = list(read_local_app_cache(local).get('products') or [])
                 if products:
-                    log(f"Genbruger frisk data/app_cache_local.json ({len(products)} produkter, {age_s:.0f}s gammel)")
+                    log(f"Genbruger frisk {os.path.basename(local)} ({len(products)} produkter, {age_s:.0f}s gammel)")
                     return products
             except Exception as e:
                 log(f"Kunne ikke læse lokal cache ({e}) - henter fra Supabase i stedet")
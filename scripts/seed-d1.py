@@ -8,7 +8,6 @@ from __future__ import annotations
 
 import json
 import os
-import re
 import subprocess
 import sys
 import tempfile
@@ -40,47 +39,14 @@ from app_support import (  # noqa: E402
     _get_subcategory, _STORE_CONFIGS, CAT_MEJERI,
     is_organic, is_lactose_free, parse_weight_to_grams,
     normalize_name, _PLACEHOLDER_IMGS,
-    is_non_food_name, is_age_restricted, is_rema_tobacco_id,
+    product_is_displayable, DISPLAYABLE_KEY,
+    build_search_index, SearchTokenIndex, search_product_ids, search_match_score,
+    search_fts_columns, local_app_cache_file, read_local_app_cache,
+    product_to_display_dict, autocomplete_suggestion, _fold,
+    AUTOCOMPLETE_PREFIX_MAX_LEN, AUTOCOMPLETE_PREFIX_TOP_N,
 )
 from updater import get_search_flavor_keywords  # noqa: E402
 
-_TOBACCO_IMG_RE = re.compile(r'rema-product-images\.digital\.rema1000\.dk/(\d+)/')
-
-
-def _is_tobacco_image(url: str) -> bool:
-    m = _TOBACCO_IMG_RE.search(url)
-    if not m:
-        return False
-    return is_rema_tobacco_id(m.group(1))
-
-
-def _home_is_allowed(p: dict) -> bool:
-    """Samme regler som app.py::filter_products_by_stores' _is_allowed (minus
-    butiksfiltrering, som forbliver pr.-request i app.py). Anvendes her ved
-    seed-tid i stedet for ved hver forsidevisning - målt: kontrollen fjernede
-    0 af 18.781 rækker (upstream matching/scraping udelukker allerede disse
-    kategorier), men kørte alligevel igen på de samme ~400 forudberegnede
-    varer ved HVER request og stod for 54% af forsidens CPU. HOLD DE TO
-    FUNKTIONER I SYNC, hvis reglerne nogensinde ændres."""
-    img = str(p.get('/product/imageLink', '')).strip()
-    if img in _PLACEHOLDER_IMGS or _is_tobacco_image(img):
-        return False
-    rema_img = str(p.get('/product/rema_image', '')).strip()
-    if rema_img in _PLACEHOLDER_IMGS or _is_tobacco_image(rema_img):
-        return False
-    title = str(p.get('/product/title', ''))
-    brand = str(p.get('/product/brand', ''))
-    if is_age_restricted(title, brand, product_id=p.get('/product/id', '')):
-        return False
-    if is_non_food_name(title) or is_non_food_name(brand):
-        return False
-    bilka_brand = str((p.get('/product/store_matches') or {}).get('bilka', {}).get('brand', '')).lower().strip()
-    if bilka_brand.startswith('deli'):
-        return False
-    if str(p.get('/product/store', '')).lower() == 'bilka' and str(p.get('/product/brand', '')).lower().strip().startswith('deli'):
-        return False
-    return True
-
 # Skrive-tabellen cart_popularity er miljø-adskilt ligesom i app.py::_table_suffix.
 TABLE_SUFFIX = "_dev" if os.environ.get("DEPLOY_ENV") == "staging" else ""
 
@@ -118,8 +84,33 @@ CREATE TABLE products_new (
   search_text TEXT,
   data TEXT
 );
+DROP TABLE IF EXISTS products_fts_new;
+CREATE VIRTUAL TABLE products_fts_new USING fts5(
+  id UNINDEXED,
+  words,
+  rwords,
+  tokenize = 'unicode61 remove_diacritics 0',
+  detail = column
+);
+DROP TABLE IF EXISTS autocomplete_new;
+CREATE TABLE autocomplete_new (
+  prefix TEXT PRIMARY KEY,
+  suggestions TEXT
+);
 """
 
+# products_fts: FTS5-indeks over search_text til app.py::load_search_raw
+# (præfiks-MATCH + bm25 i stedet for LIKE-kæder, der scanner hele tabellen).
+# D1 kan ikke indlæse en egen tokenizer, så indholdet skrives i forvejen i
+# _token_matches_term's form - foldet og baglæns, se
+# app_support.search_fts_columns. detail=column: der søges kun enkelt-token-
+# præfikser pr. kolonne, aldrig fraser, så positionslisterne (detail=full)
+# ville kun koste plads. rank-konfigurationen (gemt i tabellen, så app.py
+# blot skriver ORDER BY rank) vægter bm25 pr. kolonne: et token der STARTER
+# med søgeordet (words) tæller dobbelt så meget som en sammensætning der
+# ender på det (rwords); id er kun join-nøgle. Rangeringen afgør kun hvilke
+# kandidater der kommer med under LIMIT - den endelige er search_match_score.
+#
 # Indekser oprettes EFTER indsættelse (hurtigere) på den færdige tabel.
 # idx_products_category_price dækker "ORDER BY eff_price" inden for en
 # kategori (_d1_listing i app.py, sort=price-asc/-desc) - uden den bruger
@@ -133,6 +124,11 @@ CREATE INDEX idx_products_category_price ON products(category, eff_price);
 CREATE INDEX idx_products_subcat ON products(category, subcategory);
 CREATE INDEX idx_products_sale ON products(is_sale);
 CREATE INDEX idx_products_store ON products(store);
+DROP TABLE IF EXISTS products_fts;
+ALTER TABLE products_fts_new RENAME TO products_fts;
+INSERT INTO products_fts(products_fts, rank) VALUES('rank', 'bm25(0.0, 1.0, 0.5)');
+DROP TABLE IF EXISTS autocomplete;
+ALTER TABLE autocomplete_new RENAME TO autocomplete;
 """
 
 
@@ -154,7 +150,7 @@ _LOCAL_APP_CACHE_MAX_AGE_S = 1800  # 30 min
 
 def fetch_products() -> list[dict]:
     # updater.py's _save_app_cache() skriver ALTID præcis samme produktliste
-    # til data/app_cache_local.json FØR den uploader til Supabase (se
+    # til data/app_cache_local.snap FØR den uploader til Supabase (se
     # updater.py:1354-1363) - i cache-updater.yml kører seed-d1.py som næste
     # trin i SAMME job/runner lige efter, så filen er på det tidspunkt
     # identisk med det der netop blev skrevet til app_cache. At hente den
@@ -164,16 +160,17 @@ def fetch_products() -> list[dict]:
     # af dette script uden en updater.py-kørsel lige før falder automatisk
     # tilbage til den gamle Supabase-hentning, så en gammel liggende fil
     # aldrig kan seede D1 med forældede data.
-    if os.path.exists(_LOCAL_APP_CACHE):
-        age_s = time.time() - os.path.getmtime(_LOCAL_APP_CACHE)
+    # Snapshottet (app_support.write_product_snapshot) foretrækkes; den
+    # ældre JSON-fil læses stadig hvis den er nyest.
+    local = local_app_cache_file(_LOCAL_APP_CACHE)
+    if local:
+        age_s = time.time() - os.path.getmtime(local)
         if age_s < _LOCAL_APP_CACHE_MAX_AGE_S:
             try:
-                with open(_LOCAL_APP_CACHE, "r", encoding="utf-8") as f:
-                    payload = json.load(f)
-                products = payload.get("products") or []
+                products = list(read_local_app_cache(local).get("products") or [])
                 if products:
                     print(
-                        f"Genbruger frisk data/app_cache_local.json ({len(products)} "
+                        f"Genbruger frisk {os.path.relpath(local, ROOT)} ({len(products)} "
                         f"produkter, {age_s:.0f}s gammel) - springer Supabase-hentning over"
                     )
                     return products
@@ -232,7 +229,8 @@ def sql_str(value: str) -> str:
     return "'" + str(value).replace("'", "''") + "'"
 
 
-def build_row_values(p: dict) -> str | None:
+def build_row_values(p: dict) -> tuple[str, str] | None:
+    """(VALUES-tuple til products_new, search_text) for én vare."""
     pid = str(p.get("/product/id", "")).strip()
     if not pid or pid in ("None", "nan"):
         return None
@@ -292,6 +290,9 @@ def build_row_values(p: dict) -> str | None:
     p["/product/subcategory"] = subcategory
     p["/product/is_organic"] = bool(organic)
     p["/product/is_lactose_free"] = bool(lactose)
+    # Kun varer der består product_is_displayable seedes (se main);
+    # flaget lader app.py's filter_products_by_stores springe reglerne over.
+    p[DISPLAYABLE_KEY] = True
     data = json.dumps(slim_product(p), separators=(",", ":"), ensure_ascii=False)
     return (
         "("
@@ -310,7 +311,12 @@ def build_row_values(p: dict) -> str | None:
         + sql_str(search_text) + ","
         + sql_str(data)
         + ")"
-    )
+    ), search_text
+
+
+def build_fts_values(pid: str, search_text: str) -> str:
+    words, rwords = search_fts_columns(search_text)
+    return "(" + sql_str(pid) + "," + sql_str(words) + "," + sql_str(rwords) + ")"
 
 
 # Kør wrangler fra dist/ lokalt (har genereret wrangler.toml), ellers fra roden
@@ -447,7 +453,7 @@ def build_home_data(products: list[dict]) -> dict:
         pid = str(p.get("/product/id", "")).strip()
         if pid and pid not in by_id:
             by_id[pid] = p
-        if not _home_is_allowed(p):
+        if not product_is_displayable(p):
             continue
         if len(sale_raw) < _HOME_SALE_LIMIT and (
             p.get("/product/sale_price") or p.get("/product/is_any_sale")
@@ -461,7 +467,7 @@ def build_home_data(products: list[dict]) -> dict:
     pop_ids = fetch_popular_product_ids()
     fav_pool = [
         slim_product(by_id[pid]) for pid in pop_ids
-        if pid in by_id and _home_is_allowed(by_id[pid])
+        if pid in by_id and product_is_displayable(by_id[pid])
     ]
 
     return {
@@ -492,6 +498,118 @@ def write_home_data(data: dict) -> None:
         os.unlink(path)
 
 
+_AUTOCOMPLETE_POP_LIMIT = 500
+
+
+def build_autocomplete_table(products: list[dict], popular_ids: list[str]) -> dict[str, list[dict]]:
+    """præfiks -> rangerede autocomplete-forslag til D1-tabellen 'autocomplete'.
+
+    /api/autocomplete rammes pr. tastetryk, og de korte præfikser ("mæ",
+    "mæl") har flest kandidater - live betød det en LIKE-søgning, op til 60
+    parsede data-blobs, display-konvertering og scoring pr. request. Her
+    regnes svaret én gang pr. seed, så app.py::_autocomplete_from_table kan
+    svare med ét opslag på tabellens primærnøgle.
+
+    Præfikserne er 2..AUTOCOMPLETE_PREFIX_MAX_LEN tegn af hvert søge-token
+    (også ASCII-foldet: "mae" for "mæ..."), og kandidaterne er PRÆCIS dem
+    den lokale index-vej finder (build_search_index + search_product_ids,
+    inkl. sammensætninger som "juleøl" for "øl"). Rangering: samme
+    search_match_score som den live vej, men inden for samme relevansniveau
+    går de mest kurv-tilføjede varer (cart_popularity) forud for korteste
+    navn - et signal den live vej ikke har råd til at hente pr. tastetryk.
+
+    Hvert forslag bærer varens butiks-labels (available_stores), så
+    butiksfilteret kan anvendes pr. request uden at parse produktet. Kun
+    rækker med Rema 1000 valgt (eller intet valg) kan besvares herfra - se
+    _autocomplete_from_table."""
+    allowed: list[dict] = []
+    seen: set[str] = set()
+    for p in products:
+        pid = str(p.get("/product/id", "")).strip()
+        if not pid or pid in ("None", "nan") or pid in seen:
+            continue
+        if not p.get("/product/title") or not product_is_displayable(p):
+            continue
+        seen.add(pid)
+        allowed.append(p)
+
+    index = build_search_index(allowed, normalize_name, flavor_fn=get_search_flavor_keywords)
+    tokens = SearchTokenIndex(index)
+    pop_rank = {pid: i for i, pid in enumerate(popular_ids)}
+    displays: dict[int, dict | None] = {}
+
+    prefixes: set[str] = set()
+    for token in index:
+        for word in {token, _fold(token)}:
+            for n in range(2, min(len(word), AUTOCOMPLETE_PREFIX_MAX_LEN) + 1):
+                prefixes.add(word[:n])
+
+    table: dict[str, list[dict]] = {}
+    for prefix in sorted(prefixes):
+        # app.py slår normalize_name(query) op - et præfiks der normaliseres
+        # til noget andet (forkortelser som "hk") kan aldrig blive ramt.
+        if normalize_name(prefix).strip() != prefix:
+            continue
+        positions = search_product_ids(index, prefix, tokens)
+        if not positions:
+            continue
+        ranked = []
+        for pos in positions:
+            if pos not in displays:
+                displays[pos] = product_to_display_dict(allowed[pos], default_category="Andre varer")
+            d = displays[pos]
+            if not d:
+                continue
+            score = search_match_score(d, prefix)
+            pid = str(allowed[pos].get("/product/id", "")).strip()
+            # score = niveau * 1000 - navnelængde; -(-score // 1000) er niveauet.
+            # -pos er entydig, så sorteringen når aldrig til d.
+            ranked.append((-(-score // 1000), -pop_rank.get(pid, len(pop_rank)), score, -pos, pos, d))
+        ranked.sort(reverse=True)
+        table[prefix] = [
+            dict(autocomplete_suggestion(d), stores=available_stores(allowed[pos]))
+            for *_, pos, d in ranked[:AUTOCOMPLETE_PREFIX_TOP_N]
+        ]
+    return table
+
+
+def insert_values(insert_prefix: str, rows) -> int:
+    """Skriv færdige VALUES-tupler i batches (samme grænser som produkterne)."""
+    file_sql: list[str] = []
+    file_bytes = 0
+    batch: list[str] = []
+    batch_bytes = 0
+    count = 0
+    for values in rows:
+        if batch and batch_bytes + len(values) >= MAX_STMT_BYTES:
+            file_sql.append(insert_prefix + ",".join(batch) + ";")
+            file_bytes += batch_bytes
+            batch, batch_bytes = [], 0
+            if file_bytes >= BYTES_PER_FILE:
+                run_wrangler_sql("\n".join(file_sql))
+                file_sql, file_bytes = [], 0
+        batch.append(values)
+        batch_bytes += len(values) + 1
+        count += 1
+    if batch:
+        file_sql.append(insert_prefix + ",".join(batch) + ";")
+    if file_sql:
+        run_wrangler_sql("\n".join(file_sql))
+    return count
+
+
+def insert_autocomplete_table(table: dict[str, list[dict]]) -> int:
+    """Skriv præfikstabellen til autocomplete_new (byttes ind i FINALIZE)."""
+    return insert_values(
+        "INSERT INTO autocomplete_new (prefix,suggestions) VALUES ",
+        (
+            "(" + sql_str(prefix) + ","
+            + sql_str(json.dumps(suggestions, separators=(",", ":"), ensure_ascii=False)) + ")"
+            for prefix, suggestions in table.items()
+        ),
+    )
+
+
 def set_cache_version() -> None:
     """Skriv en ny cache_version til KV. Worker'en bruger den i cache-nøglen,
     så den daglige opdatering automatisk nulstiller edge-cachen (friske priser
@@ -654,8 +772,10 @@ def main() -> int:
         batch_bytes = 0
 
     seen_ids: set[str] = set()
+    fts_rows: list[str] = []
     dupes = 0
     placeholders = 0
+    hidden = 0
 
     for p in products:
         pid = str(p.get("/product/id", "")).strip()
@@ -672,10 +792,23 @@ def main() -> int:
         if str(p.get("/product/imageLink", "")).strip() in _PLACEHOLDER_IMGS:
             placeholders += 1
             continue
+        # Samme for resten af reglerne (tobak, non-food, Bilka-deli): de
+        # afhænger kun af varen, så de afgøres her én gang i stedet for ved
+        # hver visning. Bevidst konsekvens: varen findes slet ikke i D1, så på
+        # edge giver /product/<id> 404, og kurv/opskrifter finder den ikke -
+        # præcis som for placeholder-kortene ovenfor. Lokalt (Supabase-cachen)
+        # kan den stadig slås op, men vises aldrig i lister. Målt før flytningen
+        # fjernede reglerne 0 af 18.781 rækker (upstream udelukker dem allerede),
+        # så i praksis rammer det kun varer der slipper igennem ved en fejl.
+        if not product_is_displayable(p):
+            hidden += 1
+            continue
         seen_ids.add(pid)
-        values = build_row_values(p)
-        if not values:
+        built = build_row_values(p)
+        if not built:
             continue
+        values, search_text = built
+        fts_rows.append(build_fts_values(pid, search_text))
         # Én meget stor vare kan alene overstige grænsen - send den solo.
         if batch and batch_bytes + len(values) >= MAX_STMT_BYTES:
             flush_batch()
@@ -690,10 +823,19 @@ def main() -> int:
 
     if placeholders:
         print(f"  {placeholders} kort med placeholder-billede udeladt (kan alligevel ikke vises)")
+    if hidden:
+        print(f"  {hidden} kort udeladt af product_is_displayable (tobak/non-food m.m.)")
     if dupes:
         print(f"  advarsel: sprang {dupes} duplikerede produkt-id'er over")
 
-    print("Skifter til ny tabel (swap) ...")
+    print("Fylder søgeindeks (products_fts) ...")
+    insert_values("INSERT INTO products_fts_new (id,words,rwords) VALUES ", fts_rows)
+
+    print("Forudberegner autocomplete-præfikstabel ...")
+    table = build_autocomplete_table(products, fetch_popular_product_ids(_AUTOCOMPLETE_POP_LIMIT))
+    print(f"  {insert_autocomplete_table(table)} præfikser")
+
+    print("Skifter til nye tabeller (swap) ...")
     run_wrangler_sql(FINALIZE)
 
     print("Forudberegner forside-data (sale/køl/favoritter) ...")
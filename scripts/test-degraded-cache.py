@@ -73,22 +73,22 @@ def main() -> int:
     finally:
         A._supabase_rest = orig_rest
 
-    # search_display_products er fælles bund for alle tre søgeveje (både
+    # _scored_search_hits er fælles bund for alle tre søgeveje (både
     # _build_search_listing og autocomplete går igennem den), så et kast her
     # svarer til at D1-opslaget eller Pyodide-broen svigter.
     print("\nProduktopslaget kaster (simuleret D1-/bro-kollision):")
-    orig_search = A.search_display_products
+    orig_search = A._scored_search_hits
 
     def boom(*a, **k):
         raise RuntimeError("simuleret bro-kollision")
 
-    A.search_display_products = boom
+    A._scored_search_hits = boom
     try:
         check("søgeside", client.get('/search/results?q=maelk'), cacheable=False)
         check("søgepanel", client.get('/search?q=maelk'), cacheable=False)
         check("autocomplete", client.get('/api/autocomplete?q=mae'), cacheable=False)
     finally:
-        A.search_display_products = orig_search
+        A._scored_search_hits = orig_search
 
     print("\nEfter genoprettelse skal caching virke igen:")
     check("kategoriside", client.get('/Mejeri'), cacheable=True)
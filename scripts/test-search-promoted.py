@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Håndhæver at søgning finder et promoveret kort på dets viste navn.
+
+Baggrunden: søgeindekset (build_search_index) dækker kun råvarens titel,
+mærke og beskrivelse. Er Rema 1000 ikke i butiksvalget, viser
+product_for_active_stores kortet under den matchende butiks navn
+(_promote_match_to_product) - et navn indekset aldrig har set. Det findes
+kun via StoreView.search_promoted. Da tastefejls-opslaget i ordforrådet kom
+til, returnerede det sine fuzzy-naboer FØR de promoverede kort var vurderet,
+så en søgning på præcis det viste navn gav en anden vare - og en stavefejl i
+det viste navn mistede kortet helt.
+
+Kør: .venv/bin/python scripts/test-search-promoted.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as A  # noqa: E402
+from app_support import build_search_index, encode_search_index, normalize_name  # noqa: E402
+
+IMG = 'https://example.invalid/vare.jpg'
+
+PRODUCTS = [
+    # Rema-kortet hedder noget andet end Netto-varen det er matchet med.
+    {
+        '/product/id': 'promoveret',
+        '/product/title': 'Skyr vanilje',
+        '/product/price': 20.0,
+        '/product/store': 'Rema 1000',
+        '/product/imageLink': IMG,
+        '/product/product_type': 'Mejeri',
+        '/product/store_matches': {
+            'netto': {'name': 'Mozzarella kugle', 'price': 12.0, 'brand': '', 'image': IMG},
+        },
+    },
+    # Tastefejls-nabo til "mozzarella" i indeksets ordforråd, også hos Netto.
+    {
+        '/product/id': 'nabo',
+        '/product/title': 'Mozarella kugle',
+        '/product/price': 15.0,
+        '/product/store': 'Netto',
+        '/product/imageLink': IMG,
+        '/product/product_type': 'Mejeri',
+    },
+]
+
+
+CASES = [
+    # (søgning, forventede id'er i katalogrækkefølge, beskrivelse)
+    ('mozzarella', ['promoveret'], 'søgning på promoveret navn finder det promoverede kort'),
+    ('mozzarela', ['promoveret', 'nabo'], 'stavefejl i promoveret navn finder kortet og naboen'),
+]
+
+
+def main() -> int:
+    index = encode_search_index(build_search_index(PRODUCTS, normalize_name), len(PRODUCTS))
+    A._apply_cache_payload(PRODUCTS, index)
+    products = A.cached_data['data']
+    failed = 0
+    for query, expected, label in CASES:
+        hits = A._filter_products_for_search(products, query, {'Netto'})
+        ids = [v.get('id') for _, v in hits]
+        if ids != expected:
+            print(f"  FEJL  {label}: {query!r} gav {ids}, forventede {expected}")
+            failed += 1
+        else:
+            print(f"  ok    {label}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,24 +11,37 @@ import hashlib
 import html as _html
 import traceback
 import threading
+import time
+import bisect
+from collections import Counter
 
 from supabase import create_client
+import app_support as _app_support
+
+try:
+    # Kommer med imagehash (requirements.txt). Uden den springes de
+    # vektoriserede for-gates over, og gates'ene kører rent i Python.
+    import numpy as _np
+except ImportError:  # pragma: no cover
+    _np = None
 
 from app_support import (
     configure_logging, db_available,
-    build_search_index, logger,
+    build_search_index, encode_search_index, annotate_search_features, logger,
+    local_app_cache_file, read_local_app_cache, snapshot_path_for, write_product_snapshot,
     DEFAULT_HTTP_HEADERS, _STORE_CONFIGS, format_price,
-    normalize_name, fuzzy_score,
+    normalize_name, fuzzy_score, fuzzy_scores,
     parse_weight_to_grams, parse_stk_count, weights_compatible,
     _PLACEHOLDER_IMGS,
     CAT_ANDET, CAT_FRUGT_GROENT, unify_category, is_age_restricted,
     compute_image_hash, phash_hex_to_int, hash_candidate_indices,
-    _HASH_CANDIDATE_MAX_DIST,
+    _HASH_CANDIDATE_MAX_DIST, PHashIndex,
     is_organic, is_lactose_free, is_sugar_free, is_gluten_free, is_alcohol_free,
     get_meat_types, meats_match as _meats_match,
     _compile_keyword_patterns, _extract_keywords,
     get_product_flavors, get_search_flavor_keywords,
     clean_display_text as _clean_field,
+    _WEIGHT_TOLERANCE_G, _WEIGHT_TOLERANCE_REL,
 )
 
 
@@ -83,6 +96,11 @@ def _cheapest_tie_break_key(store_key: str) -> int:
 # strengere end selve scoregrænsen det skal genskabe billigt).
 _CROSS_STORE_NAME_FLOOR = 0.65
 
+# Laveste navnescore _find_generic_match overhovedet kan acceptere (minimum-
+# gaten afviser alt herunder, også ved godt billedmatch). Sendes som
+# score_cutoff til fuzzy_scores, så rapidfuzz kan opgive håbløse par tidligt.
+_MIN_NAME_SCORE = 0.30
+
 
 def _cross_store_length_prefilter(len_a: int, len_b: int) -> bool:
     """True hvis parret kan afvises billigt FØR fuzzy_score beregnes.
@@ -104,6 +122,44 @@ def _cross_store_length_prefilter(len_a: int, len_b: int) -> bool:
     return upper_bound < _CROSS_STORE_NAME_FLOOR
 
 
+def _build_cross_token_index(members: list) -> tuple[dict, list]:
+    """Inverteret token-indeks over én butiks stage-1-medlemmer (fase 2b).
+
+    members er stage1_components[key] - en liste af (product, display_item).
+    Returnerer (postings, lengths): postings mapper hvert _cross_match_tokens-
+    token (≥3 tegn) til de stigende positioner i members der indeholder det,
+    og lengths[i] er længden af members[i]'s _norm_name (længde-spanden til
+    _cross_store_length_prefilter). Bygges én gang efter fase 1; fase 2b
+    tilføjer aldrig medlemmer til listerne, så positionerne forbliver gyldige.
+    """
+    postings: dict[str, list[int]] = {}
+    lengths: list[int] = []
+    for i, (p, _display_item) in enumerate(members):
+        lengths.append(len(p.get('_norm_name', '')))
+        for t in p['_cross_match_tokens']:
+            postings.setdefault(t, []).append(i)
+    return postings, lengths
+
+
+def _cross_token_candidates(index: tuple[dict, list], base_tokens, base_len: int) -> list[int]:
+    """Positioner i en butiks stage-1-liste der kan overleve de to billige
+    forfiltre i fase 2b: mindst ét fælles token OG længde-grænsen.
+
+    Returneres sorteret, så inderloopet besøger targets i præcis samme
+    rækkefølge som den gamle fulde gennemløbning - vigtigt, fordi bedste
+    kandidat vælges med strengt '>' (første forekomst vinder ved lighed).
+    Et par der ikke deler et token eller falder for længde-forfilteret blev
+    alligevel afvist før enhver anden gate, så resultatet er identisk.
+    """
+    postings, lengths = index
+    hits: set[int] = set()
+    for t in base_tokens:
+        posting = postings.get(t)
+        if posting:
+            hits.update(posting)
+    return sorted(i for i in hits if not _cross_store_length_prefilter(base_len, lengths[i]))
+
+
 # Butiks-label -> butiks-key (omvendt af _STORE_CONFIGS). Bruges i billede-dedup
 # til at folde en dublets forside-butik ind i det beholdte korts store_matches.
 _LABEL_TO_KEY = {v['label']: k for k, v in _STORE_CONFIGS.items()}
@@ -111,31 +167,48 @@ _LABEL_TO_KEY = {v['label']: k for k, v in _STORE_CONFIGS.items()}
 # Single unified cache: store_key -> (products_list, token_index_dict)
 _store_caches: dict = {}
 _store_cache_lock = threading.Lock()
+# NumPy-kolonner pr. butik til de vektoriserede for-gates i
+# _find_generic_match (se _build_gate_columns). Samme nøgler som _store_caches.
+_store_gate_columns: dict = {}
+
+
+def _fetch_store_rows(db_key: str) -> list:
+    """Alle produkter-rækker for én butik fra Supabase (paginering forbi 1000-rækkers-loftet).
+
+    Kræver Supabase-klienten - kalderne tjekker den først (jf.
+    load_store_comparison_data)."""
+    assert supabase is not None
+    all_data = []
+    last_id = -1
+    while True:
+        res = supabase.table("produkter").select("*").eq("butik", db_key).gt("id", last_id).order("id").limit(1000).execute()
+        if not res.data:
+            break
+        all_data.extend(res.data)
+        last_id = res.data[-1]['id']
+    return all_data
+
 
+def load_store_comparison_data(store_key: str, rows: list | None = None) -> tuple:
+    """Generic loader: reads from Supabase and builds token + EAN indexes.
 
-def load_store_comparison_data(store_key: str) -> tuple:
-    """Generic loader: reads from Supabase and builds token + EAN indexes."""
+    rows: allerede hentede produkter-rækker (fx en frossen fixture i
+    scripts/bench-match-engine.py) - så spørges Supabase ikke.
+    """
     if store_key in _store_caches:
         return _store_caches[store_key]
     with _store_cache_lock:
         if store_key in _store_caches:
             return _store_caches[store_key]
         
+        t_wall, t_cpu = time.perf_counter(), time.thread_time()
         cfg = _STORE_CONFIGS[store_key]
         products = []
         
-        if db_available() and supabase is not None:
+        if rows is not None or (db_available() and supabase is not None):
             try:
-                # Fetch all products for the store using pagination to bypass 1000-row limit
-                all_data = []
-                last_id = -1
-                while True:
-                    res = supabase.table("produkter").select("*").eq("butik", cfg['db_key']).gt("id", last_id).order("id").limit(1000).execute()
-                    if not res.data:
-                        break
-                    all_data.extend(res.data)
-                    last_id = res.data[-1]['id']
-                    
+                all_data = rows if rows is not None else _fetch_store_rows(cfg['db_key'])
+
                 for row in all_data:
                     raw_price = row.get('pris')
                     if raw_price is None or float(raw_price) <= 0:
@@ -203,6 +276,7 @@ def load_store_comparison_data(store_key: str) -> tuple:
                         'is_sale':     is_sale,
                         'multi_deal':  multi_deal,
                         '_norm_name':  normalize_name(name_str),
+                        '_norm_brand': normalize_name(brand_str),
                         '_weight_g':   weight_g,
                         '_stk_count':  _stk_count_of(weight_str, name_str),
                         'image':       str(row.get('billede_url') or ''),
@@ -220,13 +294,13 @@ def load_store_comparison_data(store_key: str) -> tuple:
                         # cand<=base-gate trivielt sand i stedet for neutral -
                         # en aktiv falsk-positiv-kanal, ikke kun et dækningshul.
                         # Se matchmotor-revisionen 2026-08-16, fund C4.
-                        '_flavors':    get_product_flavors(f"{name_str} {brand_str}"),
-                        '_meats':      get_meat_types(name_str),
-                        '_forms':      get_product_form(f"{name_str} {brand_str}"),
+                        '_flavors':    _flag_mask(get_product_flavors(f"{name_str} {brand_str}"), _FLAVOR_BITS),
+                        '_meats':      _flag_mask(get_meat_types(name_str), _MEAT_BITS),
+                        '_forms':      _flag_mask(get_product_form(f"{name_str} {brand_str}"), _FORM_BITS),
                         # Brand-feltet medregnes i procenter: Lidl-scrapen
                         # lægger fedt-% dér ("MADVÆRKET Hakket oksekød" /
                         # producent "14-18 % fedt."), som gaten ellers ikke ser.
-                        '_pcts':       get_product_percents(f"{name_str} {brand_str}"),
+                        '_pcts':       _intern_pcts(get_product_percents(f"{name_str} {brand_str}")),
                         '_variants':   _variant_flags(name_str, '', brand_str),
                         '_is_pl':      is_private_label(brand_str, name_str),
                     })
@@ -276,8 +350,18 @@ def load_store_comparison_data(store_key: str) -> tuple:
                 "varer i samme butik og er udelukket fra ean_index: %s",
                 cfg['label'], len(_poisoned_eans), sorted(_poisoned_eans)[:20])
 
+        # pHash-naboopslaget sker for hver Rema-vare mod hver butik - et
+        # multi-index i stedet for at popcounte hele listen hver gang.
+        hash_list = PHashIndex(hash_list, _HASH_CANDIDATE_MAX_DIST)
+
         result = (products, token_idx, hash_list, ean_index)
+        _store_gate_columns[store_key] = _build_gate_columns(products)
         _store_caches[store_key] = result
+        report = _run_report
+        if report is not None:
+            report.add_store_time(store_key, 'load', time.perf_counter() - t_wall,
+                                  time.thread_time() - t_cpu)
+            report.stores[store_key]['products'] = len(products)
         logger.info("Loaded %s products from Supabase for %s", len(products), cfg['label'])
         return result
 
@@ -298,17 +382,61 @@ def load_all_comparison_data() -> dict:
                 results[key] = ([], {}, [], {})
     return results
 
-def _variant_flags(name: str, desc: str = '', brand: str = '') -> tuple:
-    """Variant-flags (øko, laktosefri, sukkerfri, glutenfri) som tuple.
+# Kompakt repræsentation af matchingens flag-felter. _store_caches holder
+# 13 butikkers produkter i hele kørslen, og hvert produkt bar tidligere et
+# set/frozenset pr. smag, form og kød plus en 5-tuple for varianter (~200
+# bytes pr. tomt sæt). Nu er de heltal-bitmasker: tomme masker er det delte
+# lille-int 0, og gates'ene bliver bit-operationer i stedet for set-
+# sammenligninger. Ét bit-navnerum pr. felt, så maskerne holdes små; nye
+# navne tildeles lazily (kandidatsiden indlæses i tråde, derfor låsen).
+_FLAVOR_BITS: dict = {}
+_FORM_BITS: dict = {}
+_MEAT_BITS: dict = {}
+_flag_bits_lock = threading.Lock()
+
+
+def _flag_mask(names, bits: dict) -> int:
+    """Bitmaske for en mængde kanoniske navne (smag/form/kødtype)."""
+    mask = 0
+    for name in names:
+        bit = bits.get(name)
+        if bit is None:
+            with _flag_bits_lock:
+                bit = bits.setdefault(name, 1 << len(bits))
+        mask |= bit
+    return mask
+
+
+# Procent-sæt er små frozensets af få hyppige værdier (langt de fleste
+# tomme) - interneres, så ens sæt deles i stedet for ét objekt pr. produkt.
+_PCTS_INTERN: dict = {}
+
+
+def _intern_pcts(pcts: frozenset) -> frozenset:
+    return _PCTS_INTERN.setdefault(pcts, pcts)
+
+
+# Bits i _variant_flags-masken
+_VARIANT_ORGANIC = 1 << 0
+_VARIANT_LACTOSE_FREE = 1 << 1
+_VARIANT_SUGAR_FREE = 1 << 2
+_VARIANT_GLUTEN_FREE = 1 << 3
+_VARIANT_ALCOHOL_FREE = 1 << 4
+_VARIANT_DIMS = 5
+
+
+def _variant_flags(name: str, desc: str = '', brand: str = '') -> int:
+    """Variant-flags (øko, laktosefri, sukkerfri, glutenfri, alkoholfri) som bitmaske.
 
     Precomputes én gang pr. produkt - to produkter er variant-kompatible
-    præcis når deres tupler er ens (samme semantik som det gamle
-    variants_compatible, men uden at genscanne teksterne pr. kandidat-par)."""
+    præcis når deres masker er ens (samme semantik som det gamle
+    variants_compatible, men uden at genscanne teksterne pr. kandidat-par).
+    Bit d svarer til position d i den tidligere tuple."""
     return (
-        is_organic(name, desc, brand),
-        is_lactose_free(name, desc, brand),
-        is_sugar_free(name, desc, brand),
-        is_gluten_free(name, desc, brand),
+        (_VARIANT_ORGANIC if is_organic(name, desc, brand) else 0)
+        | (_VARIANT_LACTOSE_FREE if is_lactose_free(name, desc, brand) else 0)
+        | (_VARIANT_SUGAR_FREE if is_sugar_free(name, desc, brand) else 0)
+        | (_VARIANT_GLUTEN_FREE if is_gluten_free(name, desc, brand) else 0)
         # Alkoholfri er en SELVSTÆNDIG variant, ikke bare en procentangivelse.
         # Procent-gaten alene var utilstrækkelig: den kunne kun se 0,0% hvis
         # tallet stod i den tekst gaten kiggede i - og Rema skriver det ofte
@@ -317,7 +445,7 @@ def _variant_flags(name: str, desc: str = '', brand: str = '') -> tuple:
         # sammen med almindelig pilsner og med Harboe Apollinaris (dansk
         # vand). Flaget her gør forskellen eksplicit, uanset hvor i teksten
         # den står.
-        is_alcohol_free(name, desc, brand),
+        | (_VARIANT_ALCOHOL_FREE if is_alcohol_free(name, desc, brand) else 0)
     )
 
 
@@ -528,11 +656,90 @@ def _group_compatible(base_weight, base_stk, base_pcts: frozenset, members, base
         # svinekød" og "Kyllingefrikadeller" i samme kort, fordi gaten i fase 2
         # kun ser basen og _meats_match er tavs-lempelig når den ene side
         # mangler kødtype.
-        if base_meats is not None and not _meats_match(base_meats, m.get('_meats', frozenset())):
+        if base_meats is not None and not _meats_match(base_meats, m.get('_meats', 0)):
             return False
     return True
 
 
+def _cross_pair_gate(base_p, base_weight, base_stk, base_variants, base_pcts,
+                     base_flavors, base_forms, target_p) -> str | None:
+    """Navne-uafhængige par-gates i fase 2 og fase 2b.
+
+    Returnerer navnet på den første gate der afviser parret (nøglen i
+    rapportens gate-tæller), ellers None. Rækkefølgen er den gamle inline-
+    rækkefølge i begge faser.
+    """
+    # Fuzzy gates: weight (unit), quantity (stk), name score, type.
+    if not weights_compatible(base_weight, target_p.get('_weight_g')):
+        return 'weight'
+    if base_stk is not None and target_p.get('_stk_count') is not None and base_stk != target_p.get('_stk_count'):
+        return 'stk'
+    if base_variants != target_p['_variants']:
+        return 'variant'
+    # Procent-gate (fedt-/alkohol-%): kun aktiv når begge
+    # sider angiver procenter, jf. _percents_match
+    if not _percents_match(base_pcts, target_p['_pcts']):
+        return 'percent'
+    # Symmetrisk smags-gate: begge sider er korte butiksnavne
+    # (ingen rig beskrivelse som hos Rema), så en smag nævnt
+    # af kun én side er en reel forskel ("Cherry blommetomater"
+    # ≠ "Blommetomater") uanset hvem der initierer.
+    if base_flavors != target_p['_flavors']:
+        return 'flavor'
+    # Symmetrisk form-gate, samme begrundelse som smag lige
+    # ovenfor. Brugte tidligere den asymmetriske
+    # cand<=base-_forms_match (samme retningsbestemte helper
+    # som Rema-sporet), hvilket lod resultatet afhænge af
+    # hvilken side der blev behandlet som "base" - fx et
+    # formløst "Alpro Dessert Hindbær" kunne absorbere en
+    # "Cultura Drikkeyogh Hindbær" (drik ≠ dessert) hvis
+    # rækkefølgen faldt den vej. Se matchmotor-revisionen
+    # 2026-08-16, fund H3.
+    if base_forms != target_p['_forms']:
+        return 'form'
+    # Kødtype-gate (jf. _find_generic_match)
+    if not _meats_match(base_p['_meats'], target_p['_meats']):
+        return 'meat'
+    return None
+
+
+def _cross_scored_gate(base_p, base_weight, base_stk, base_type, base_is_pl,
+                       target_p, target_is_pl, name_score) -> str | None:
+    """Navne-afhængige gates i fase 2 og fase 2b (efter den samlede
+    navnescore). Returnerer den afvisende gates navn, ellers None."""
+    # Type-gate med eskalering: butikskategorier er støjede,
+    # så mismatch kræver blot næsten-identisk navn (jf.
+    # _find_generic_match).
+    if not types_compatible(base_type, target_p['_type']) and name_score < 0.80:
+        return 'type'
+    if base_is_pl != target_is_pl and name_score < 0.70:
+        return 'brand_pairing'
+    if name_score < _CROSS_STORE_NAME_FLOOR:
+        return 'name_floor'
+
+    # Vægtløst par (typisk Dagrofa): mangler bare én side
+    # vægt, kan vægt-gaten intet validere, og navnet bærer
+    # matchet alene - kræv markant højere navnescore,
+    # medmindre stk-antal findes på begge sider (så har
+    # stk-gaten valideret pakkestørrelsen). Frugt & grønt
+    # er undtaget: løsvarer er vægtløse overalt, og korte
+    # navne scorer lavt uden at være tvivlsomme.
+    if (name_score < 0.75
+            and (not base_weight or not target_p.get('_weight_g'))
+            and (base_stk is None or target_p.get('_stk_count') is None)
+            and not (base_type == CAT_FRUGT_GROENT and target_p['_type'] == CAT_FRUGT_GROENT)):
+        return 'weightless'
+
+    # Pris-sanity: samme vare koster ikke 5× mere i en anden butik
+    try:
+        if float(target_p['price']) > 5.0 * float(base_p['price']) or \
+           float(target_p['price']) * 5.0 < float(base_p['price']):
+            return 'price'
+    except (TypeError, ValueError, KeyError):
+        pass
+    return None
+
+
 def _drop_cross_conflicting_matches(matches: dict, rema_w, rema_pcts: frozenset) -> dict:
     """Fjern butiks-matches der modsiger HINANDEN på vægt eller procent.
 
@@ -563,10 +770,10 @@ def _drop_cross_conflicting_matches(matches: dict, rema_w, rema_pcts: frozenset)
     return {k: m for k, m in matches.items() if k not in conflicted}
 
 
-_NO_VARIANT_FLAGS = (False, False, False, False)
+_NO_VARIANT_FLAGS = 0
 
 
-def _drop_variant_conflicting_matches(matches: dict, rema_variants: tuple) -> dict:
+def _drop_variant_conflicting_matches(matches: dict, rema_variants: int) -> dict:
     """Kryds-medlems-arbitrage på variant-flag (øko/laktosefri/sukkerfri/glutenfri).
 
     _variants_compatible er bevidst ensidig: en kandidat der UDELADER et flag,
@@ -584,10 +791,11 @@ def _drop_variant_conflicting_matches(matches: dict, rema_variants: tuple) -> di
     if len(matches) < 2:
         return matches
     drop = set()
-    for dim, base_flag in enumerate(rema_variants):
-        if not base_flag:
+    for dim in range(_VARIANT_DIMS):
+        bit = 1 << dim
+        if not rema_variants & bit:
             continue
-        claimers = {k for k, m in matches.items() if m.get('_variants', _NO_VARIANT_FLAGS)[dim]}
+        claimers = {k for k, m in matches.items() if m.get('_variants', _NO_VARIANT_FLAGS) & bit}
         silent = set(matches) - claimers
         if not claimers or not silent:
             continue
@@ -614,32 +822,32 @@ def get_product_form(text: str) -> set:
     return _extract_keywords(text.lower(), _FORM_PATTERNS)
 
 
-def _flavors_match(base_flavors: set, cand_flavors: set) -> bool:
+def _flavors_match(base_flavors: int, cand_flavors: int) -> bool:
     """Smags-gate: kun hård afvisning hvis KANDIDATEN nævner en smag, basen ikke har.
 
     Basen (Rema, eller den initierende butiksvare i cross-store-matching)
     nævner ofte en smag (fx "chokolade") som en kandidats kortfattede navn
     ikke gentager ("Choko") - det er ikke en modsigelse. Men hvis kandidaten
-    eksplicit nævner en anden/ekstra smag end basen, er det en reel forskel."""
-    return cand_flavors <= base_flavors
+    eksplicit nævner en anden/ekstra smag end basen, er det en reel forskel.
+    Begge sider er _flag_mask-bitmasker: delmængde = ingen kandidat-bit uden for basen."""
+    return not (cand_flavors & ~base_flavors)
 
 
-def _forms_match(base_forms: set, cand_forms: set) -> bool:
+def _forms_match(base_forms: int, cand_forms: int) -> bool:
     """Form-gate (drik/budding/mousse osv.): samme asymmetri som _flavors_match.
 
     Forhindrer at fx en Arla Protein-DRIK matcher en Arla Protein-BUDDING,
     som ellers ville dele nok fælles ord ("arla", "protein", "choko") til at
     score højt på navnelighed alene."""
-    return cand_forms <= base_forms
+    return not (cand_forms & ~base_forms)
 
 
-# Indeks i _variant_flags-tuplen der skal vurderes SYMMETRISK - se
-# _variants_compatible. Alkoholfri er den eneste: (øko, laktosefri, sukkerfri,
-# glutenfri, alkoholfri) -> indeks 4.
-_SYMMETRIC_VARIANT_DIMS = frozenset({4})
+# Bits i _variant_flags-masken der skal vurderes SYMMETRISK - se
+# _variants_compatible. Alkoholfri er den eneste.
+_SYMMETRIC_VARIANT_MASK = _VARIANT_ALCOHOL_FREE
 
 
-def _variants_compatible(rema_variants: tuple, cand_variants: tuple) -> bool:
+def _variants_compatible(rema_variants: int, cand_variants: int) -> bool:
     """Variant-gate (øko, laktosefri, sukkerfri, glutenfri, alkoholfri).
 
     For de fire første er gaten bevidst ENSIDIG: Rema-produktets beskrivelse
@@ -653,16 +861,358 @@ def _variants_compatible(rema_variants: tuple, cand_variants: tuple) -> bool:
     fordi kandidaten ikke påstod noget - fundet ved A/B-måling 10-08-2026.
     Alkoholfri og almindelig er to forskellige varer, der står side om side på
     hylden, og et manglende ord i det korte navn gør dem ikke ens."""
-    for dim, (rema_flag, cand_flag) in enumerate(zip(rema_variants, cand_variants)):
-        if dim in _SYMMETRIC_VARIANT_DIMS:
-            if bool(rema_flag) != bool(cand_flag):
+    if (rema_variants ^ cand_variants) & _SYMMETRIC_VARIANT_MASK:
+        return False
+    return not (cand_variants & ~rema_variants & ~_SYMMETRIC_VARIANT_MASK)
+
+
+# Under denne kandidatmængde koster NumPy-opsætningen mere end Python-gates'ene
+_PREGATE_MIN_CANDIDATES = 48
+
+
+def _build_gate_columns(products: list) -> dict | None:
+    """Kolonner til de navne- og foto-uafhængige gates i _find_generic_match.
+
+    Kun gates der ALDRIG lempes af billedet: kød, alkoholfri, vægt, stk og
+    pris. Variant/smag/form lempes ved nær-identisk foto og procent er et
+    sæt - de bliver i Python-løkken. Manglende værdier: vægt NaN, stk -1.
+    """
+    if _np is None or not products:
+        return None
+    weight = _np.array(
+        [_np.nan if p.get('_weight_g') is None else float(p['_weight_g']) for p in products],
+        dtype=_np.float64)
+    return {
+        'weight': weight,
+        'no_weight': _np.isnan(weight),
+        'price': _np.array([float(p.get('price', 0)) for p in products], dtype=_np.float64),
+        'stk': _np.array(
+            [-1 if p.get('_stk_count') is None else int(p['_stk_count']) for p in products],
+            dtype=_np.int64),
+        'meats': _np.array([p['_meats'] for p in products], dtype=_np.int64),
+        'variants': _np.array([p['_variants'] for p in products], dtype=_np.int64),
+    }
+
+
+def _pregate_candidates(candidate_indices: set, cols: dict, rema_meats: int, rema_variants: int,
+                        rema_weight_g, rema_stk_count, rema_price):
+    """Kandidat-indeks der overlever kød-, alkoholfri-, vægt-, stk- og pris-gaten.
+
+    Præcis samme betingelser som de tilsvarende gates i _find_generic_match,
+    blot for hele kandidatmængden på én gang. Gates'ene er rene filtre uden
+    indbyrdes afhængighed, så rækkefølgen er ligegyldig; overleverne
+    returneres i kandidatsættets iterationsrækkefølge, så uafgjort-vinderen
+    er uændret.
+    """
+    # cols findes kun når _build_gate_columns havde numpy.
+    assert _np is not None
+    idx = _np.fromiter(candidate_indices, dtype=_np.int64, count=len(candidate_indices))
+    meats = cols['meats'][idx]
+    keep = (meats == 0) | (meats == rema_meats) if rema_meats else _np.ones(len(idx), dtype=bool)
+    keep &= ((cols['variants'][idx] ^ rema_variants) & _VARIANT_ALCOHOL_FREE) == 0
+    if rema_weight_g is not None:
+        w = cols['weight'][idx]
+        w_max = _np.maximum(w, rema_weight_g)
+        tol = _np.maximum(_np.minimum(_WEIGHT_TOLERANCE_G, 0.25 * w_max), _WEIGHT_TOLERANCE_REL * w_max)
+        with _np.errstate(invalid='ignore'):
+            keep &= cols['no_weight'][idx] | (_np.abs(w - rema_weight_g) <= tol)
+    if rema_stk_count is not None:
+        stk = cols['stk'][idx]
+        keep &= (stk < 0) | (stk == rema_stk_count)
+    if rema_price and rema_price > 0:
+        rp = float(rema_price)
+        price = cols['price'][idx]
+        keep &= ~((price > 5.0 * rp) | ((price > 0) & (price * 5.0 < rp)))
+    return idx[keep].tolist()
+
+
+
+# De navne-uafhængige gates i _find_generic_match (gate 3-11 i docstringen).
+# Alle er rene filtre på (Rema-side, kandidat, nær-identisk foto) uden
+# indbyrdes afhængighed - de kommuterer, så rækkefølgen ændrer kun
+# arbejdsmængden, aldrig overleverne. Tuplen er den dokumenterede
+# standardrækkefølge; _GateProfile vælger en målt, billigere rækkefølge pr.
+# butik.
+_INDEPENDENT_GATES = ('percent', 'meat', 'alcohol', 'variant', 'flavor', 'form', 'weight', 'stk', 'price')
+
+
+def _independent_gates(rema_pcts, rema_meats, rema_variants, rema_flavors, rema_forms,
+                       rema_weight_g, rema_stk_count, rema_price) -> dict:
+    """{gate-navn: gate(p, near_identical_photo) -> True hvis kandidaten består}.
+
+    Closures over Rema-siden, bygget én gang pr. _find_generic_match-kald,
+    så løkken kan køre dem i en vilkårlig (målt) rækkefølge.
+    """
+    def percent(p, near):
+        # Procent-konflikt (fedt-%, alkohol-%, kakao-%). Bevidst UDEN
+        # foto-lempelse: alkoholfri og almindelig øl deler næsten identisk
+        # emballage (Tuborg Classic 4,6% ↔ 0,0%), så et godt billedmatch er
+        # netop ikke bevis her.
+        return _percents_match(rema_pcts, p['_pcts'])
+
+    def meat(p, near):
+        # Kødtype (okse ≠ gris ≠ kylling ...). Også bevidst UDEN
+        # foto-lempelse: hakket-kød-varianter deler næsten identisk
+        # emballage på tværs af kødtyper.
+        return _meats_match(rema_meats, p['_meats'])
+
+    def alcohol(p, near):
+        # Variant-linjer: et næsten identisk foto lemper øko/laktosefri/
+        # sukkerfri/glutenfri (variant nedenfor) - men ALDRIG alkohol:
+        # alkoholfri og almindelig deler netop emballage (README § Product
+        # matching), så billedet er intet bevis dér.
+        return not ((rema_variants ^ p['_variants']) & _VARIANT_ALCOHOL_FREE)
+
+    def variant(p, near):
+        return near or _variants_compatible(rema_variants, p['_variants'])
+
+    def flavor(p, near):
+        # Smagsvariant (jordbær ≠ pære/banan, naturel ≠ jordbær osv.)
+        return near or _flavors_match(rema_flavors, p['_flavors'])
+
+    def form(p, near):
+        # Produktform (drik ≠ budding ≠ mousse osv.)
+        return near or _forms_match(rema_forms, p['_forms'])
+
+    def weight(p, near):
+        # Gate B: vægt. Ligesom B2/C før navnescoren, da ingen af dem
+        # afhænger af den (matchmotor-revisionen 2026-08-16, fund M4).
+        return weights_compatible(rema_weight_g, p.get('_weight_g'))
+
+    def stk(p, near):
+        # Gate B2: stk-antal - afvis hvis begge kendes og er forskellige
+        return rema_stk_count is None or p.get('_stk_count') is None or rema_stk_count == p.get('_stk_count')
+
+    def price(p, near):
+        # Gate C: pris-sanity - tosidet. En kandidat >5× dyrere ELLER >5×
+        # billigere er ikke samme vare (fx Rema 6-pak øl 48 kr mod Menys
+        # enkeltdåse 7,95 kr - Dagrofa-varer mangler ofte vægt, så
+        # vægt-gaten fanger det ikke).
+        if not (rema_price and rema_price > 0):
+            return True
+        try:
+            p_price = float(p.get('price', 0))
+            if p_price > 5.0 * float(rema_price):
                 return False
-        elif cand_flag and not rema_flag:
-            return False
-    return True
+            if p_price > 0 and p_price * 5.0 < float(rema_price):
+                return False
+        except (TypeError, ValueError):
+            pass
+        return True
+
+    return {'percent': percent, 'meat': meat, 'alcohol': alcohol, 'variant': variant,
+            'flavor': flavor, 'form': form, 'weight': weight, 'stk': stk, 'price': price}
+
+
+def _timer_overhead_ns() -> int:
+    """Mindste målte perf_counter_ns-par - trækkes fra gate-tiderne."""
+    best = None
+    for _ in range(200):
+        t0 = time.perf_counter_ns()
+        dt = time.perf_counter_ns() - t0
+        best = dt if best is None or dt < best else best
+    return best or 0
+
+
+_TIMER_OVERHEAD_NS = _timer_overhead_ns()
+
+
+class _GateProfile:
+    """Målt afvisningsrate og pris for de uafhængige gates i én butik.
+
+    Hvert SAMPLE_EVERY'te _find_generic_match-kald mod butikken kører ALLE
+    gates på alle kandidater med tidtagning (i stedet for at stoppe ved
+    første afvisning), så raterne er ubetingede og ikke farvet af den
+    aktuelle rækkefølge. Efter hvert REORDER_EVERY'te sample sorteres
+    gates'ene efter pris/afvisningsrate stigende - den klassiske optimale
+    rækkefølge for uafhængige filtre. Fx afviser vægt-gaten næsten aldrig
+    mod vægtløse Dagrofa-rækker og ryger dér bagud.
+
+    counts: {gate: [evalueringer, afvisninger, ns]} - persisteres mellem
+    kørsler (se _load_gate_profiles), så næste kørsel starter fra sidste
+    kørsels rækkefølge.
+    """
+
+    SAMPLE_EVERY = 16
+    REORDER_EVERY = 32
+
+    def __init__(self, counts: dict | None = None):
+        self.counts = {g: [0.0, 0.0, 0.0] for g in _INDEPENDENT_GATES}
+        for g, c in (counts or {}).items():
+            if g in self.counts and len(c) == 3:
+                self.counts[g] = [float(v) for v in c]
+        self.calls = 0
+        self.samples = 0
+        self.order = self._ranked()
+
+    def should_sample(self) -> bool:
+        self.calls += 1
+        return self.calls % self.SAMPLE_EVERY == 0
+
+    def _ranked(self) -> tuple:
+        def rank(g):
+            evals, rejects, ns = self.counts[g]
+            if not evals:
+                return (1, _INDEPENDENT_GATES.index(g))  # umålt: standardrækkefølgen
+            if not rejects:
+                return (2, _INDEPENDENT_GATES.index(g))  # afviser aldrig: bagerst
+            cost = max(ns / evals - _TIMER_OVERHEAD_NS, 1.0)
+            return (0, cost / (rejects / evals))
+        return tuple(sorted(_INDEPENDENT_GATES, key=rank))
+
+    def sample(self, gates: dict, p: dict, near: bool) -> str | None:
+        """Kør alle gates med tidtagning; navnet på første afvisende i self.order (None = består)."""
+        first = None
+        for g in self.order:
+            t0 = time.perf_counter_ns()
+            ok = gates[g](p, near)
+            c = self.counts[g]
+            c[2] += time.perf_counter_ns() - t0
+            c[0] += 1
+            if not ok:
+                c[1] += 1
+                if first is None:
+                    first = g
+        return first
+
+    def finish_sample(self) -> None:
+        self.samples += 1
+        if self.samples % self.REORDER_EVERY == 0:
+            self.order = self._ranked()
+
+
+
+# Gate-profilerne persisteres mellem kørsler (samme mappe som matching-
+# tilstanden). Gamle tællinger halveres ved indlæsning, så rækkefølgen følger
+# med når butikkernes data ændrer sig. UPDATER_ADAPTIVE_GATES=0 låser
+# standardrækkefølgen (fx ved fejlsøgning af en enkelt gate).
+_GATE_PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'updater_gate_profile.json')
+_GATE_PROFILE_VERSION = 1
+_gate_profiles: dict = {}  # store_key -> _GateProfile for den igangværende kørsel
+
+
+def _adaptive_gates_enabled() -> bool:
+    return os.getenv('UPDATER_ADAPTIVE_GATES', '1') != '0'
+
+
+def _load_gate_profiles() -> dict:
+    if not _adaptive_gates_enabled():
+        return {}
+    stored: dict = {}
+    try:
+        with open(_GATE_PROFILE_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == _GATE_PROFILE_VERSION:
+            stored = data.get('stores') or {}
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Kunne ikke læse gate-profil (%s) - starter fra standardrækkefølgen", e)
+    return {
+        key: _GateProfile({g: [v * 0.5 for v in c]
+                           for g, c in (stored.get(key, {}).get('counts') or {}).items()})
+        for key in DB_STORE_KEYS
+    }
 
 
-def _find_generic_match(rema_title, rema_description, products, token_idx, hash_list, rema_brand='', rema_weight_g=None, threshold=0.60, rema_image_hash='', rema_price=0.0, rema_ean='', rema_stk_count=None, ean_index=None, rema_category='', claimed_ids=None):
+def _save_gate_profiles() -> None:
+    if not _gate_profiles:
+        return
+    data = {
+        'version': _GATE_PROFILE_VERSION,
+        'stores': {key: {'order': list(p._ranked()), 'counts': p.counts}
+                   for key, p in _gate_profiles.items()},
+    }
+    tmp = _GATE_PROFILE_FILE + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(_GATE_PROFILE_FILE), exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, _GATE_PROFILE_FILE)
+    except Exception as e:
+        logger.warning("Kunne ikke gemme gate-profil: %s", e)
+
+
+_DAIRY_TYPES = ('mini', 'let', 'skummet', 'sod', 'piske', 'kærne', 'kær')
+
+
+def _scored_gate(p, name_score, brand_score, dist, near_identical_photo,
+                 rema_title_norm, rema_type, base_is_pl, rema_stk_count,
+                 rema_dairy, rema_first_token) -> str | None:
+    """Navnet på den første navne-afhængige gate i _find_generic_match der
+    afviser kandidaten p, eller None hvis den må scores.
+
+    brand_score er kun defineret (og kun læst) når navnescoren er over
+    gulvet og ikke begge sider er egne mærker."""
+    if name_score < _MIN_NAME_SCORE:
+        return 'name_floor'
+
+    # Gate: Product type - butikkernes kategorier er støjede (samme marmelade
+    # ligger under "Kolonial" hos Rema og "Frost" hos Salling), så mismatch
+    # afviser kun når navnescoren ikke er høj nok til at bære matchet alene.
+    if not types_compatible(rema_type, p['_type']) and name_score < 0.80:
+        return 'type'
+
+    # Gate A: Brand-pairing
+    p_is_pl = p['_is_pl']
+    both_pl = base_is_pl and p_is_pl
+    if base_is_pl != p_is_pl and name_score < 0.70:
+        return 'brand_pairing'
+    # Egne mærker på tværs af kæder (Rema ↔ Salling/First Price/…) er
+    # "samme brand-klasse" selvom brandteksten ikke ligner - bruges nedenfor
+    # i stedet for pHash, fordi PL-emballager aldrig er nær-identiske.
+    brands_align = both_pl or brand_score >= 0.75
+
+    # Gate D: Dairy variant + first-token checks
+    if rema_title_norm:
+        if rema_dairy:
+            p_dairy = next((d for d in _DAIRY_TYPES if d in p['_norm_name']), None)
+            # Tillad at overskrive, hvis billedet er næsten identisk
+            # (gælder nationale mærker - PL-pakker ligner ikke hinanden).
+            if p_dairy and rema_dairy != p_dairy and (both_pl or dist is None or dist > 5):
+                return 'dairy'
+
+        if rema_first_token and rema_first_token not in p['_norm_name']:
+            if both_pl:
+                # PL ↔ PL: ingen pHash-genvej. name_score dækker allerede
+                # Rema-titel + beskrivelse - kræv solid tekstlighed.
+                if name_score < 0.60:
+                    return 'first_token'
+            else:
+                # Nationale mærker: slæk første-token hvis billederne matcher.
+                # dist <= 12 kræver samme reelle brand (BUKO "Rejeost" ↔ Buko
+                # "Smøreost m. rejer" er ok) - uden brand-belæg kræves dist <= 8,
+                # da svag billedlighed alene bar urelaterede navne over tærsklen
+                # (PL-boost 0.30 + billede matchede fx lagkagebunde mod kylling).
+                if dist is None or dist > 12 or (dist > 8 and not brands_align):
+                    return 'first_token'
+
+    # Gate: vægt- og EAN-løs kandidat (typisk Dagrofa/Løvbjerg) - hverken
+    # vægt-, stk- eller EAN-retro-gates kan validere matchet, så navnet må
+    # bære det næsten alene: kræv markant højere navnescore. Lempes kun
+    # ved nær-identisk produktfoto (nationale mærker) eller når stk-antal
+    # findes på begge sider (så har stk-gaten allerede valideret
+    # pakkestørrelsen). Frugt & grønt er undtaget: løsvarer er vægtløse i
+    # ALLE butikker, og de korte navne ("BANANER" ↔ "Økologiske bananer")
+    # scorer lavt uden at være tvivlsomme.
+    if (name_score < 0.75 and not near_identical_photo
+            and not p.get('_weight_g') and not p.get('ean')
+            and (rema_stk_count is None or p.get('_stk_count') is None)
+            and not (rema_type == CAT_FRUGT_GROENT and p['_type'] == CAT_FRUGT_GROENT)):
+        return 'weightless'
+
+    # Minimum name gate: boosts alone must not trigger a match.
+    # Nationale mærker: brand-betinget billed-lempelse. PL ↔ PL: ingen
+    # billed-genvej - emballagerne ligner ikke hinanden på tværs af kæder.
+    if name_score < 0.50:
+        # En meget lille tekst-score (< 0.30) afvises stadig, trods godt billede.
+        if (both_pl or dist is None or dist > 12 or (dist > 8 and not brands_align)
+                or name_score < _MIN_NAME_SCORE):
+            return 'min_name'
+    return None
+
+
+def _find_generic_match(rema_title, rema_description, products, token_idx, hash_list, rema_brand='', rema_weight_g=None, threshold=0.60, rema_image_hash='', rema_price=0.0, rema_ean='', rema_stk_count=None, ean_index=None, rema_category='', claimed_ids=None, scored_out=None, gate_columns=None, gate_stats=None, gate_profile=None):
     """Token-indexed fuzzy match used by all store comparisons.
 
     Product stages (EAN status - see README «Product matching»):
@@ -688,6 +1238,10 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
     2. Claimed: candidates already matched by an earlier Rema product in
        this run are skipped (claimed_ids), so two distinct Rema SKUs can't
        both claim the same comparison-store listing.
+    3-11 are the name-independent gates. They commute, so with a
+    gate_profile they run in that store's measured cost-optimal order
+    (_GateProfile) - the numbering below is the default order, used when
+    no profile is given. The survivors are the same in any order.
     3. Percent (fedt-/alkohol-/kakao-%): symmetric when both sides state a
        percentage (see _percents_match). Never relaxed by photo - alcohol-
        free and regular beer share near-identical packaging.
@@ -730,6 +1284,26 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
         private-label pairs, which lack a reliable photo signal).
     17. Final composite score (name + brand boost + image boost) must reach
         `threshold` (default 0.60).
+
+    scored_out (kun den parallelle annotering, se _annotate_store_shard):
+    når sat, springes claimed-gaten over, og hver kandidat der når
+    `threshold` tilføjes som (index, score) i kandidat-rækkefølge i stedet
+    for at vælge den bedste - så kan valget blandt de endnu ikke claimede
+    genskabes præcist senere (_pick_unclaimed_match).
+
+    gate_columns (_build_gate_columns for `products`): når sat og
+    kandidatmængden er stor, afvises kandidater der falder for gate 4, 5,
+    9, 10 eller 11 vektoriseret FØR løkken (_pregate_candidates) - samme
+    resultat, løkken ser blot kun overleverne.
+
+    gate_stats (Counter, kun med kørselsrapporten slået til): tæller
+    'candidates' ind i gate-kæden og afvisninger pr. gate-navn. Hver afvist
+    kandidat giver ét gate-navn, og de tælles samlet til sidst - None koster
+    kun et is-None-tjek pr. afvisning.
+
+    gate_profile (_GateProfile for butikken): bestemmer rækkefølgen af gate
+    3-11 og måler dem på hvert SAMPLE_EVERY'te kald. Ændrer kun
+    arbejdsmængden - aldrig hvilke kandidater der overlever.
     """
     # Stage 1: EAN lookup only - never fall through to fuzzy when EAN is set but unmatched.
     # Rema has no EAN; comparison stores use EAN cross-fill in fetch_and_parse_xml.
@@ -757,15 +1331,15 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
     # (fx brand "ARLA, SMAG AF CHOKOLADE KARAMEL" på en vare med titel "PROTEIN
     # TO GO") - uden brand her fejlvurderede smags-gaten Rema-siden som "ingen
     # smag", og afviste dermed korrekte matches mod butikker med fyldigere navne.
-    rema_flavors = get_product_flavors(f"{rema_title} {rema_description} {rema_brand}")
-    rema_forms = get_product_form(f"{rema_title} {rema_description} {rema_brand}")
+    rema_flavors = _flag_mask(get_product_flavors(f"{rema_title} {rema_description} {rema_brand}"), _FLAVOR_BITS)
+    rema_forms = _flag_mask(get_product_form(f"{rema_title} {rema_description} {rema_brand}"), _FORM_BITS)
     # Brandfeltet SKAL med, præcis som på kandidatsiden (se '_pcts' ovenfor).
     # Rema lægger ofte procenten dér og kun dér ("ALKOHOLFRI 0,0%",
     # "CARLSBERG 0,0%"), så uden brand var rema_pcts tom, procent-gaten
     # inaktiv og kryds-medlems-arbitragen blind - netop den gate README siger
     # aldrig må lempes, fordi alkoholfri og almindelig øl deler emballage.
     rema_pcts = get_product_percents(f"{rema_title} {rema_description} {rema_brand}")
-    rema_meats = get_meat_types(f"{rema_title} {rema_description}")
+    rema_meats = _flag_mask(get_meat_types(f"{rema_title} {rema_description}"), _MEAT_BITS)
 
     r_hash_int = phash_hex_to_int(rema_image_hash)
 
@@ -793,7 +1367,28 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
     if not candidate_indices:
         return None
 
+    if gate_stats is not None:
+        gate_stats['candidates'] += len(candidate_indices)
+    if gate_columns is not None and len(candidate_indices) >= _PREGATE_MIN_CANDIDATES:
+        n_before = len(candidate_indices)
+        candidate_indices = _pregate_candidates(
+            candidate_indices, gate_columns, rema_meats, rema_variants,
+            rema_weight_g, rema_stk_count, rema_price)
+        if gate_stats is not None:
+            gate_stats['pregate'] += n_before - len(candidate_indices)
+
+    gates = _independent_gates(rema_pcts, rema_meats, rema_variants, rema_flavors, rema_forms,
+                               rema_weight_g, rema_stk_count, rema_price)
+    sampling = gate_profile is not None and gate_profile.should_sample()
+    ordered_gates = [(name, gates[name])
+                     for name in (gate_profile.order if gate_profile is not None else _INDEPENDENT_GATES)]
+
     best, best_score = None, 0.0
+    survivors = []  # (produkt, pHash-afstand, nær-identisk foto) efter de navne-uafhængige gates
+    survivor_idx = []
+    # Afvisninger til gate_stats: ét gate-navn pr. afvist kandidat, talt
+    # samlet (Counter.update) når kandidaterne er gennemgået.
+    rejections: list[str] = []
 
     for i in candidate_indices:
         p = products[i]
@@ -801,6 +1396,8 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
         # Gate: allerede matchet til en tidligere Rema-vare i dette scrape -
         # forhindrer at to forskellige Rema-varer stjæler samme butiksvare.
         if claimed_ids is not None and id(p) in claimed_ids:
+            if gate_stats is not None:
+                rejections.append('claimed')
             continue
 
         dist = None
@@ -819,150 +1416,71 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
         # og dermed en langt større pHash-afstand.
         near_identical_photo = dist is not None and dist <= 4
 
-        # Gate: Procent-konflikt (fedt-%, alkohol-%, kakao-%). Bevidst UDEN
-        # foto-lempelse: alkoholfri og almindelig øl deler næsten identisk
-        # emballage (Tuborg Classic 4,6% ↔ 0,0%), så et godt billedmatch er
-        # netop ikke bevis her.
-        if not _percents_match(rema_pcts, p['_pcts']):
-            continue
-
-        # Gate: Kødtype (okse ≠ gris ≠ kylling ...). Også bevidst UDEN
-        # foto-lempelse: hakket-kød-varianter deler næsten identisk
-        # emballage på tværs af kødtyper.
-        if not _meats_match(rema_meats, p['_meats']):
-            continue
-
-        # Gate: Variant-linjer (øko, lacto/laktosefri, sukkerfri, glutenfri).
-        # Et næsten identisk foto lemper de fire første - men ALDRIG alkohol:
-        # alkoholfri og almindelig deler netop emballage (README § Product
-        # matching), så billedet er intet bevis dér.
-        if bool(rema_variants[4]) != bool(p['_variants'][4]):
-            continue
-        if not near_identical_photo and not _variants_compatible(rema_variants, p['_variants']):
-            continue
-
-        # Gate: Smagsvariant (jordbær ≠ pære/banan, naturel ≠ jordbær osv.)
-        if not near_identical_photo and not _flavors_match(rema_flavors, p['_flavors']):
-            continue
-
-        # Gate: Produktform (drik ≠ budding ≠ mousse osv.)
-        if not near_identical_photo and not _forms_match(rema_forms, p['_forms']):
-            continue
-
-        # Gate B/B2/C flyttet hertil, FØR den dyre navne-score beregnes
-        # nedenfor: ingen af de tre afhænger af name_score (i modsætning
-        # til Type-gaten og Gate A, som forbliver efter), så de billige,
-        # uafhængige afvisninger bør ske først - samme princip filen
-        # allerede anvender eksplicit i fase 2/2b. Ændrer intet i
-        # resultatet, kun arbejdsmængden. Se matchmotor-revisionen
-        # 2026-08-16, fund M4.
-        # Gate B: Weight
-        if not weights_compatible(rema_weight_g, p.get('_weight_g')):
-            continue
-
-        # Gate B2: Stk-count - skip if both have a known stk count that differs
-        if rema_stk_count is not None and p.get('_stk_count') is not None and rema_stk_count != p.get('_stk_count'):
-            continue
-
-        # Gate C: Price sanity - tosidet. En kandidat >5× dyrere ELLER >5× billigere
-        # er ikke samme vare (fx Rema 6-pak øl 48 kr mod Menys enkeltdåse 7,95 kr -
-        # Dagrofa-varer mangler ofte vægt, så vægt-gaten fanger det ikke).
-        if rema_price and rema_price > 0:
-            try:
-                p_price = float(p.get('price', 0))
-                if p_price > 5.0 * float(rema_price):
-                    continue
-                if p_price > 0 and p_price * 5.0 < float(rema_price):
-                    continue
-            except (TypeError, ValueError):
-                pass
-
-        # 1. Name similarity - bedste af titel og beskrivelse. Rema-titlen er ofte
-        # generisk (fx "PROTEIN DRIK"), mens smag/variant kun står i beskrivelsen
-        # ("Arla protein drik vanilje laktosefri") - kun titlen giver falske afvisninger.
-        name_score = max(fuzzy_score(rn, p['_norm_name']) for rn in rema_norms)
-
-        # Gate: Product type - butikkernes kategorier er støjede (samme marmelade
-        # ligger under "Kolonial" hos Rema og "Frost" hos Salling), så mismatch
-        # afviser kun når navnescoren ikke er høj nok til at bære matchet alene.
-        if not types_compatible(rema_type, p['_type']) and name_score < 0.80:
-            continue
-
-        # Gate A: Brand-pairing
-        p_is_pl = p['_is_pl']
-        both_pl = base_is_pl and p_is_pl
-        if base_is_pl != p_is_pl and name_score < 0.70:
+        # Gate 3-11 (procent, kød, alkohol, variant, smag, form, vægt, stk,
+        # pris) - se _independent_gates for de enkelte begrundelser. De
+        # kommuterer, så de køres i butikkens målte rækkefølge; hvert
+        # SAMPLE_EVERY'te kald kører dem alle med tidtagning til profilen.
+        if sampling and gate_profile is not None:
+            rejected = gate_profile.sample(gates, p, near_identical_photo)
+        else:
+            for rejected, gate in ordered_gates:
+                if not gate(p, near_identical_photo):
+                    break
+            else:
+                rejected = None
+        if rejected is not None:
+            if gate_stats is not None:
+                rejections.append(rejected)
             continue
-        # Egne mærker på tværs af kæder (Rema ↔ Salling/First Price/…) er
-        # "samme brand-klasse" selvom brandteksten ikke ligner - bruges nedenfor
-        # i stedet for pHash, fordi PL-emballager aldrig er nær-identiske.
-        brands_align = both_pl or (
-            fuzzy_score(norm_rema_brand, normalize_name(p.get('brand', ''))) >= 0.75
-        )
 
-        # Gate D: Dairy variant + first-token checks
-        if rema_title_norm:
-            dairy_types = ['mini', 'let', 'skummet', 'sod', 'piske', 'kærne', 'kær']
-            rema_dairy = next((d for d in dairy_types if d in rema_title_norm), None)
-            p_dairy    = next((d for d in dairy_types if d in p['_norm_name']), None)
-            if rema_dairy and p_dairy and rema_dairy != p_dairy:
-                # Tillad at overskrive, hvis billedet er næsten identisk
-                # (gælder nationale mærker - PL-pakker ligner ikke hinanden).
-                if both_pl or dist is None or dist > 5:
-                    continue
+        survivors.append((p, dist, near_identical_photo))
+        survivor_idx.append(i)
 
-            title_tokens_ordered = [t for t in rema_title_norm.split() if len(t) >= 4]
-            if title_tokens_ordered and title_tokens_ordered[0] not in p['_norm_name']:
-                if both_pl:
-                    # PL ↔ PL: ingen pHash-genvej. name_score dækker allerede
-                    # Rema-titel + beskrivelse - kræv solid tekstlighed.
-                    if name_score < 0.60:
-                        continue
-                else:
-                    # Nationale mærker: slæk første-token hvis billederne matcher.
-                    # dist <= 12 kræver samme reelle brand (BUKO "Rejeost" ↔ Buko
-                    # "Smøreost m. rejer" er ok) - uden brand-belæg kræves dist <= 8,
-                    # da svag billedlighed alene bar urelaterede navne over tærsklen
-                    # (PL-boost 0.30 + billede matchede fx lagkagebunde mod kylling).
-                    if dist is None or dist > 12:
-                        continue
-                    if dist > 8 and not brands_align:
-                        continue
+    if sampling and gate_profile is not None:
+        gate_profile.finish_sample()
+    if not survivors:
+        if gate_stats is not None:
+            gate_stats.update(rejections)
+        return None
 
-        # Gate: vægt- og EAN-løs kandidat (typisk Dagrofa/Løvbjerg) - hverken
-        # vægt-, stk- eller EAN-retro-gates kan validere matchet, så navnet må
-        # bære det næsten alene: kræv markant højere navnescore. Lempes kun
-        # ved nær-identisk produktfoto (nationale mærker) eller når stk-antal
-        # findes på begge sider (så har stk-gaten allerede valideret
-        # pakkestørrelsen). Frugt & grønt er undtaget: løsvarer er vægtløse i
-        # ALLE butikker, og de korte navne ("BANANER" ↔ "Økologiske bananer")
-        # scorer lavt uden at være tvivlsomme.
-        if (name_score < 0.75 and not near_identical_photo
-                and not p.get('_weight_g') and not p.get('ean')
-                and (rema_stk_count is None or p.get('_stk_count') is None)
-                and not (rema_type == CAT_FRUGT_GROENT and p['_type'] == CAT_FRUGT_GROENT)):
+    # 1. Name similarity - bedste af titel og beskrivelse. Rema-titlen er ofte
+    # generisk (fx "PROTEIN DRIK"), mens smag/variant kun står i beskrivelsen
+    # ("Arla protein drik vanilje laktosefri") - kun titlen giver falske afvisninger.
+    # Scores samlet for alle gate-overlevere i ét fuzzy_scores-kald frem for
+    # par for par. Cutoff 0.30: alle veje nedenfor afviser en navnescore
+    # under 0.30 (minimum-gaten), så en afkortet score ændrer intet.
+    name_scores = fuzzy_scores(rema_norms, [p['_norm_name'] for p, _, _ in survivors],
+                               score_cutoff=_MIN_NAME_SCORE)
+    # Brand-ligheden bruges både af brands_align (Gate D / minimum-gaten) og
+    # brand_sim (boost) - før beregnet to gange pr. kandidat, nu én gang og
+    # kun for par der kan nå frem til dem (ikke PL↔PL, navnescore >= 0.30).
+    brand_pos = [k for k, (p, _, _) in enumerate(survivors)
+                 if name_scores[k] >= _MIN_NAME_SCORE and not (base_is_pl and p['_is_pl'])]
+    brand_scores = dict(zip(brand_pos, fuzzy_scores(
+        (norm_rema_brand,), [survivors[k][0]['_norm_brand'] for k in brand_pos])))
+
+    # Rema-sidens del af Gate D afhænger ikke af kandidaten.
+    rema_dairy = next((d for d in _DAIRY_TYPES if d in rema_title_norm), None)
+    title_tokens_ordered = [t for t in rema_title_norm.split() if len(t) >= 4]
+    rema_first_token = title_tokens_ordered[0] if title_tokens_ordered else None
+
+    for k, (p, dist, near_identical_photo) in enumerate(survivors):
+        name_score = name_scores[k]
+        rejected = _scored_gate(
+            p, name_score, brand_scores.get(k, 0.0), dist, near_identical_photo,
+            rema_title_norm, rema_type, base_is_pl, rema_stk_count, rema_dairy, rema_first_token)
+        if rejected is not None:
+            if gate_stats is not None:
+                rejections.append(rejected)
             continue
-
-        # Minimum name gate: boosts alone must not trigger a match.
-        # Nationale mærker: brand-betinget billed-lempelse. PL ↔ PL: ingen
-        # billed-genvej - emballagerne ligner ikke hinanden på tværs af kæder.
-        if name_score < 0.50:
-            if both_pl:
-                continue
-            if dist is None or dist > 12:
-                continue
-            if dist > 8 and not brands_align:
-                continue
-            if name_score < 0.30:
-                # Men en meget lille tekst-score afvises stadig, trods godt billede
-                continue
+        both_pl = base_is_pl and p['_is_pl']
 
         # 2. Brand similarity boost (up to +0.30)
         # Begge sider normaliseres. Før mødte et normaliseret Rema-brand et
         # RÅT kandidat-brand, så 'arla' vs 'Arla' gav 0,75 i stedet for 1,0 -
         # boostet blev 0,225 frem for 0,30, og par lige omkring tærsklen faldt
         # igennem uden grund. Værre for æ/ø/å ('Änglamark').
-        brand_sim   = 1.0 if both_pl else fuzzy_score(norm_rema_brand, normalize_name(p.get('brand', '')))
+        brand_sim   = 1.0 if both_pl else brand_scores[k]
         brand_boost = 0.30 * brand_sim
 
         # 3. Image perceptual hash boost
@@ -980,13 +1498,165 @@ def _find_generic_match(rema_title, rema_description, products, token_idx, hash_
                 image_boost = 0.20 * (15 - dist) / 7.0
 
         score = name_score + brand_boost + image_boost
+        if gate_stats is not None and score < threshold:
+            rejections.append('threshold')
+        if scored_out is not None:
+            if score >= threshold:
+                scored_out.append((survivor_idx[k], score))
+            continue
         if score > best_score:
             best_score = score
             best = p
 
+    if gate_stats is not None:
+        gate_stats.update(rejections)
     return best if best_score >= threshold else None
 
 
+def _pick_unclaimed_match(scored: list, products: list, claimed_ids: set) -> tuple:
+    """Bedste endnu ikke claimede kandidat fra en scored_out-liste.
+
+    Præcis samme valg som slutningen af _find_generic_match: claimed-gaten
+    er det eneste, der afhænger af tidligere Rema-varers matches, og den
+    udelukker kun kandidater - scoren for de øvrige er uændret. Listen har
+    kun kandidater >= threshold, i samme rækkefølge som den serielle løkke,
+    så strengt '>' giver samme vinder ved lighed.
+
+    Returnerer (match, tied): tied=True når en anden ledig kandidat har
+    præcis samme score - så afhænger vinderen af kandidatsættets iterations-
+    rækkefølge (dvs. produkternes indeks), hvilket den inkrementelle tilstand
+    skal vide.
+    """
+    best, best_score, tied = None, 0.0, False
+    for i, score in scored:
+        p = products[i]
+        if id(p) in claimed_ids:
+            continue
+        if score > best_score:
+            best_score = score
+            best = p
+            tied = False
+        elif score == best_score:
+            tied = True
+    return best, tied
+
+
+# Parallel Rema-annotering (UPDATER_MATCH_WORKERS > 1): _find_generic_match
+# sharded pr. butik over en fork-baseret procespulje. Butiksdata sættes her
+# FØR poolen startes, så workerne arver dem via fork i stedet for at få
+# ~13 butikkers produktlister picklet over.
+_shard_store_data: dict = {}
+
+
+def _match_worker_count() -> int:
+    """Antal processer til Rema-annoteringen; 1 (standard) = seriel."""
+    try:
+        return max(1, int(os.getenv('UPDATER_MATCH_WORKERS', '1')))
+    except ValueError:
+        return 1
+
+
+def _annotate_store_shard(args):
+    """Worker: scor alle Rema-varer mod én butik uden claimed-gaten.
+
+    Returnerer (store_key, [scored_out-liste pr. Rema-vare], stats,
+    gate-profilens tællinger - se nedenfor). Varer
+    med EAN (stage-1-genvejen) får None - de slås op serielt i
+    hovedprocessen. stats er None, medmindre kørselsrapporten er slået til
+    (arvet via fork) - så er det workerens tider og tællere til
+    _RunReport.merge_worker, da de ellers dør med processen. Af samme grund
+    sendes butikkens _GateProfile-tællinger tilbage til hovedprocessen.
+    """
+    key, rema_inputs = args
+    products_list, token_idx, hash_list, ean_index = _shard_store_data[key]
+    results = []
+    profile = _gate_profiles.get(key)
+    gate_stats: Counter | None = None
+    fuzzy_counts: Counter = Counter()
+    if _run_report is not None:
+        gate_stats = Counter()
+        _app_support.fuzzy_call_counts = fuzzy_counts
+    norm_start = normalize_name.cache_info()
+    t_wall, t_cpu = time.perf_counter(), time.process_time()
+    for inp in rema_inputs:
+        if inp['rema_ean'] and inp['rema_ean'] not in ('', 'nan', 'None'):
+            results.append(None)
+            continue
+        scored: list = []
+        _find_generic_match(
+            inp['title'], inp['description'], products_list, token_idx, hash_list,
+            rema_brand=inp['brand'],
+            rema_weight_g=inp['weight_g'],
+            rema_image_hash=inp['image_hash'],
+            rema_price=inp['price'],
+            rema_ean=inp['rema_ean'],
+            rema_stk_count=inp['stk_count'],
+            ean_index=ean_index,
+            rema_category=inp['category'],
+            scored_out=scored,
+            gate_columns=_store_gate_columns.get(key),
+            gate_stats=gate_stats,
+            gate_profile=profile,
+        )
+        results.append(scored)
+    stats = None
+    if gate_stats is not None:
+        norm_end = normalize_name.cache_info()
+        stats = {
+            'wall': time.perf_counter() - t_wall, 'cpu': time.process_time() - t_cpu,
+            'gates': dict(gate_stats), 'fuzzy': dict(fuzzy_counts),
+            'norm_hits': norm_end.hits - norm_start.hits,
+            'norm_misses': norm_end.misses - norm_start.misses,
+        }
+    return key, results, stats, (profile.counts if profile is not None else None)
+
+
+def _parallel_rema_scores(rema_products: list, store_data: dict, workers: int):
+    """{store_key: [scored_out pr. Rema-vare]} beregnet i en procespulje.
+
+    Returnerer None (= kør serielt) hvis fork ikke er tilgængelig, eller
+    poolen fejler - den serielle sti er altid den autoritative reference.
+    """
+    import multiprocessing
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except ValueError:
+        logger.warning("Parallel annotering: fork ikke tilgængelig - kører serielt")
+        return None
+    rema_inputs = [
+        {
+            'title': str(product['/product/title']),
+            'description': str(product['/product/description']),
+            'brand': str(product.get('/product/brand', '')),
+            'weight_g': product.get('/product/weight_g'),
+            'image_hash': product.get('/product/image_hash', ''),
+            'price': float(product['/product/price']),
+            'rema_ean': product.get('/product/ean', ''),
+            'stk_count': product.get('/product/stk_count'),
+            'category': product.get('/product/product_type', ''),
+        }
+        for product in rema_products
+    ]
+    _shard_store_data.clear()
+    _shard_store_data.update(store_data)
+    try:
+        with ctx.Pool(processes=min(workers, len(DB_STORE_KEYS))) as pool:
+            scores = {}
+            for key, results, stats, gate_counts in pool.imap_unordered(
+                    _annotate_store_shard, [(key, rema_inputs) for key in DB_STORE_KEYS]):
+                scores[key] = results
+                if gate_counts is not None and key in _gate_profiles:
+                    _gate_profiles[key] = _GateProfile(gate_counts)
+                if stats is not None and _run_report is not None:
+                    _run_report.merge_worker(key, stats)
+            return scores
+    except Exception as e:
+        logger.error("Parallel annotering fejlede (%s) - kører serielt", e)
+        return None
+    finally:
+        _shard_store_data.clear()
+
+
 
 
 
@@ -1338,95 +2008,113 @@ def _fill_missing_rema_hashes(raw_products: list, rema_hashes: dict) -> dict:
     return rema_hashes
 
 
-def _fetch_rema_products_only():
-    """Hent og parse Rema 1000 XML - uden sammenligning med andre butikker."""
-    rema_products = []
-    logger.info("Fetching XML data from: %s", XML_URL)
-    try:
-        rema_hashes = _load_rema_hashes()
+def _fetch_rema_xml_items() -> list:
+    """Hent Rema 1000 XML-feedet og returnér de rå <product>-elementer.
 
-        xml_text = None
-        for attempt in range(3):
-            try:
-                response = requests.get(
-                    XML_URL,
-                    timeout=(10, 120),
-                    headers=DEFAULT_HTTP_HEADERS,
-                    stream=True,
-                )
-                response.raise_for_status()
-                xml_text = response.content.decode(response.encoding or 'utf-8', errors='replace')
-                logger.info(f"Response status: {response.status_code}")
-                break
-            except requests.exceptions.Timeout:
-                logger.info(f"  Timeout på forsøg {attempt + 1}/3 - prøver igen...")
-            except requests.exceptions.RequestException as e:
-                logger.info(f"  Netværksfejl på forsøg {attempt + 1}/3: {e}")
-        if xml_text is None:
-            raise RuntimeError("Kunne ikke hente Rema XML efter 3 forsøg")
-
-        xml_dict = xmltodict.parse(xml_text)
-        if not validate_xml_structure(xml_dict):
-            logger.info("XML validation failed")
-            return []
+    Rejser RuntimeError ved netværksfejl; tom liste hvis strukturen ikke
+    validerer. Adskilt fra parsingen, så scripts/bench-match-engine.py kan
+    fryse de rå elementer til disk og genafspille dem offline.
+    """
+    logger.info("Fetching XML data from: %s", XML_URL)
+    xml_text = None
+    for attempt in range(3):
+        try:
+            response = requests.get(
+                XML_URL,
+                timeout=(10, 120),
+                headers=DEFAULT_HTTP_HEADERS,
+                stream=True,
+            )
+            response.raise_for_status()
+            xml_text = response.content.decode(response.encoding or 'utf-8', errors='replace')
+            logger.info(f"Response status: {response.status_code}")
+            break
+        except requests.exceptions.Timeout:
+            logger.info(f"  Timeout på forsøg {attempt + 1}/3 - prøver igen...")
+        except requests.exceptions.RequestException as e:
+            logger.info(f"  Netværksfejl på forsøg {attempt + 1}/3: {e}")
+    if xml_text is None:
+        raise RuntimeError("Kunne ikke hente Rema XML efter 3 forsøg")
+
+    xml_dict = xmltodict.parse(xml_text)
+    if not validate_xml_structure(xml_dict):
+        logger.info("XML validation failed")
+        return []
 
-        raw_products = xml_dict['products']['product']
-        if isinstance(raw_products, dict):
-            raw_products = [raw_products]
-        rema_hashes = _fill_missing_rema_hashes(raw_products, rema_hashes)
+    raw_products = xml_dict['products']['product']
+    if isinstance(raw_products, dict):
+        raw_products = [raw_products]
+    return raw_products
 
-        for i, product in enumerate(raw_products):
-            try:
-                price = format_price(product.get('price', '0 DKK'))
-                sale_price = format_price(product.get('sale_price', '')) or None
-                if price <= 0:
-                    continue
 
-                mapped_type = unify_category(
-                    product.get('product_type', ''),
-                    product.get('title', ''),
-                    product.get('brand', ''),
-                )
-                if mapped_type is None:
-                    continue  # ikke-mad eller tobak - frasorteres centralt i unify_category
-                if is_age_restricted(
-                    product.get('title', ''),
-                    product.get('brand', ''),
-                    product.get('product_type', ''),
-                    product.get('id', ''),
-                ):
-                    continue
+def _parse_rema_items(raw_products: list, rema_hashes: dict) -> list:
+    """Map rå Rema XML-elementer til updaterens '/product/...'-dicts."""
+    rema_products = []
+    for i, product in enumerate(raw_products):
+        try:
+            price = format_price(product.get('price', '0 DKK'))
+            sale_price = format_price(product.get('sale_price', '')) or None
+            if price <= 0:
+                continue
 
-                unit_measure = product.get('unit_pricing_measure', '')
-                weight_g = parse_weight_to_grams(unit_measure)
-                price_per_kg = None
-                if weight_g and weight_g > 0:
-                    effective_price = sale_price if sale_price is not None else price
-                    price_per_kg = (effective_price / (weight_g / 1000.0))
-
-                rema_products.append({
-                    '/product/id': product.get('id', ''),
-                    '/product/ean': product.get('ean', ''),
-                    '/product/title': product.get('title', ''),
-                    '/product/price': price,
-                    '/product/sale_price': sale_price,
-                    '/product/description': product.get('description', ''),
-                    '/product/brand': product.get('brand', ''),
-                    '/product/imageLink': product.get('imageLink', ''),
-                    '/product/product_type': mapped_type,
-                    '/product/sale_price_effective_date': product.get('sale_price_effective_date', ''),
-                    '/product/store': 'Rema 1000',
-                    '/product/unit_pricing_measure': unit_measure,
-                    '/product/weight_g': weight_g,
-                    '/product/stk_count': _stk_count_of(unit_measure, product.get('title', '')),
-                    '/product/price_per_kg': price_per_kg,
-                    '/product/image_hash': rema_hashes.get(str(product.get('id', '')), ''),
-                })
-            except Exception as e:
-                logger.error(f"Error processing Rema 1000 product {i}: {str(e)}")
+            mapped_type = unify_category(
+                product.get('product_type', ''),
+                product.get('title', ''),
+                product.get('brand', ''),
+            )
+            if mapped_type is None:
+                continue  # ikke-mad eller tobak - frasorteres centralt i unify_category
+            if is_age_restricted(
+                product.get('title', ''),
+                product.get('brand', ''),
+                product.get('product_type', ''),
+                product.get('id', ''),
+            ):
                 continue
 
-        logger.info(f"Total Rema 1000 products parsed: {len(rema_products)}")
+            unit_measure = product.get('unit_pricing_measure', '')
+            weight_g = parse_weight_to_grams(unit_measure)
+            price_per_kg = None
+            if weight_g and weight_g > 0:
+                effective_price = sale_price if sale_price is not None else price
+                price_per_kg = (effective_price / (weight_g / 1000.0))
+
+            rema_products.append({
+                '/product/id': product.get('id', ''),
+                '/product/ean': product.get('ean', ''),
+                '/product/title': product.get('title', ''),
+                '/product/price': price,
+                '/product/sale_price': sale_price,
+                '/product/description': product.get('description', ''),
+                '/product/brand': product.get('brand', ''),
+                '/product/imageLink': product.get('imageLink', ''),
+                '/product/product_type': mapped_type,
+                '/product/sale_price_effective_date': product.get('sale_price_effective_date', ''),
+                '/product/store': 'Rema 1000',
+                '/product/unit_pricing_measure': unit_measure,
+                '/product/weight_g': weight_g,
+                '/product/stk_count': _stk_count_of(unit_measure, product.get('title', '')),
+                '/product/price_per_kg': price_per_kg,
+                '/product/image_hash': rema_hashes.get(str(product.get('id', '')), ''),
+            })
+        except Exception as e:
+            logger.error(f"Error processing Rema 1000 product {i}: {str(e)}")
+            continue
+
+    logger.info(f"Total Rema 1000 products parsed: {len(rema_products)}")
+    return rema_products
+
+
+def _fetch_rema_products_only():
+    """Hent og parse Rema 1000 XML - uden sammenligning med andre butikker."""
+    rema_products = []
+    try:
+        rema_hashes = _load_rema_hashes()
+        raw_products = _fetch_rema_xml_items()
+        if not raw_products:
+            return []
+        rema_hashes = _fill_missing_rema_hashes(raw_products, rema_hashes)
+        rema_products = _parse_rema_items(raw_products, rema_hashes)
     except Exception as e:
         logger.error(f"Error fetching Rema 1000 data: {str(e)}")
         traceback.print_exc()
@@ -1539,17 +2227,16 @@ _LOCAL_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'da
 
 
 def _save_local_cache(products, search_index):
-    """Gem produkt-cache som lokal JSON-fil (fallback til udvikling)."""
+    """Gem produkt-cache som lokalt snapshot (fallback til udvikling, og
+    genbrugt af seed-d1.py/recipe_pricing.py i samme job).
+
+    Binært snapshot (app_support.write_product_snapshot) ved siden af den
+    gamle JSON-sti, ikke JSON: læserne afkoder kun de varer de bruger, og
+    marshal er markant hurtigere at læse end json.load af ~30 MB."""
     try:
-        os.makedirs(os.path.dirname(_LOCAL_CACHE_FILE), exist_ok=True)
-        payload = json.dumps(
-            {"products": products, "search_index": search_index},
-            default=lambda o: list(o) if isinstance(o, (set, frozenset)) else str(o),
-            ensure_ascii=False,
-        )
-        with open(_LOCAL_CACHE_FILE, 'w', encoding='utf-8') as f:
-            f.write(payload)
-        logger.info(f"Lokal cache gemt: {len(products)} produkter → {_LOCAL_CACHE_FILE}")
+        path = snapshot_path_for(_LOCAL_CACHE_FILE)
+        write_product_snapshot(path, products, search_index)
+        logger.info(f"Lokal cache gemt: {len(products)} produkter → {path}")
         return True
     except Exception as e:
         logger.error(f"Fejl ved gemning af lokal cache: {e}")
@@ -2141,26 +2828,536 @@ def annotate_lowest_prices(products: list) -> None:
     logger.info("Annoterede %d produkter med 30-dages laveste pris", annotated)
 
 
-def fetch_and_parse_xml():
-    """Fetch and parse data from both XML and Excel sources"""
+# ---------------------------------------------------------------------------
+# Inkrementel matching (UPDATER_INCREMENTAL=1 / --incremental)
+# ---------------------------------------------------------------------------
+# De fleste produkter- og Rema-rækker er uændrede fra nat til nat, men hver
+# kørsel matchede alt forfra. Matching-beslutningerne (rå _find_generic_match-
+# resultat pr. Rema-vare og butik, og rå bedste kandidat pr. fase-2-base og
+# målbutik) gemmes derfor sammen med et fingeraftryk pr. kilderække, og næste
+# kørsel genbruger en beslutning når hverken basen, partneren eller noget
+# "beskidt" produkt (nyt/ændret fingeraftryk, eller frigivet fordi dets
+# tidligere ejer nu valgte anderledes) i målbutikken kan have ændret den.
+# Alt efter scoringen - retro-validering, cross-fill, konflikt-oprydning,
+# fase 1, fase 2b, solokort og dedup - køres stadig fuldt på hver kørsel.
+# --full-rebuild ignorerer den gemte tilstand; --verify-incremental kører
+# begge veje og sammenligner outputtet. Natkørslen (cache-updater.yml) kører
+# --incremental med tilstanden gemt i actions/cache, fuldt ved push af kode,
+# og verificerer hver søndag.
+_MATCH_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'updater_match_state.json')
+_MATCH_STATE_VERSION = 1
+
+# Tilstanden fra seneste fetch_and_parse_xml - gemmes først af run_updater,
+# når kørslen har passeret dæknings-/størrelsesværnene.
+_last_match_state: dict | None = None
+
+# Vægur-tid (sekunder) pr. fase i seneste fetch_and_parse_xml, i pipeline-
+# rækkefølge: load, rema, phase1, phase2, phase2b, solokort, dedup. Et
+# perf_counter-kald pr. fasegrænse - læses af scripts/bench-match-engine.py.
+_last_phase_timings: dict = {}
+
+
+# Kørselsrapport (UPDATER_RUN_REPORT=1 eller --run-report): hvor i den
+# natlige kørsel går tiden, og hvilke gates afviser hvad? Skrives som JSON
+# ved siden af data/app_cache_local.json. Slået fra er _run_report None, og
+# hot-path-koden betaler kun et None-tjek på afvisningsgrenene.
+_RUN_REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'updater_run_report.json')
+_run_report: '_RunReport | None' = None
+
+
+def _run_report_enabled() -> bool:
+    return os.getenv('UPDATER_RUN_REPORT', '0') == '1'
+
+
+class _RunReport:
+    """Tællere og tider for én fetch_and_parse_xml-kørsel.
+
+    phases: vægur-/CPU-tid pr. fase (samme faser som _last_phase_timings).
+    stores: indlæsnings- og Rema-annoteringstid pr. butik.
+    gates:  {fase: {butik: Counter}} - 'candidates' er kandidater ind i
+            gate-kæden, de øvrige nøgler antal afvisninger pr. gate. I fase
+            2/2b er butikken MÅL-butikken (dér sidder datakvaliteten, fx
+            vægtløse Dagrofa-rækker).
+    fuzzy:  parvise fuzzy_score-kald og cdist-kald/-par (app_support).
+    normalize_name: lru_cache-hits/-misses i løbet af kørslen.
+
+    Parallel annotering (UPDATER_MATCH_WORKERS) forker processer, som hver
+    tæller i deres egen kopi - workerne sender deres tal tilbage med scorerne
+    og merges ind via merge_worker().
+    """
+
+    def __init__(self):
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.phases: dict = {}
+        self.stores: dict = {}
+        self.gates: dict = {}
+        self.fuzzy = Counter()
+        self.norm_hits = 0
+        self.norm_misses = 0
+        self._norm_start = normalize_name.cache_info()
+
+    def gate_counter(self, phase: str, store_key: str) -> Counter:
+        return self.gates.setdefault(phase, {}).setdefault(store_key, Counter())
+
+    def add_store_time(self, store_key: str, what: str, wall: float, cpu: float) -> None:
+        entry = self.stores.setdefault(store_key, {})
+        entry[f'{what}_wall_s'] = entry.get(f'{what}_wall_s', 0.0) + wall
+        entry[f'{what}_cpu_s'] = entry.get(f'{what}_cpu_s', 0.0) + cpu
+
+    def merge_worker(self, store_key: str, stats: dict) -> None:
+        self.add_store_time(store_key, 'rema', stats['wall'], stats['cpu'])
+        self.gate_counter('rema', store_key).update(stats['gates'])
+        self.fuzzy.update(stats['fuzzy'])
+        self.norm_hits += stats['norm_hits']
+        self.norm_misses += stats['norm_misses']
+
+    def to_dict(self, n_products: int) -> dict:
+        info = normalize_name.cache_info()
+        hits = self.norm_hits + info.hits - self._norm_start.hits
+        misses = self.norm_misses + info.misses - self._norm_start.misses
+        return {
+            'started': self.started,
+            'products': n_products,
+            'match_workers': _match_worker_count(),
+            'phases': {k: {kk: round(vv, 4) for kk, vv in v.items()} for k, v in self.phases.items()},
+            'stores': {k: {kk: round(vv, 4) if isinstance(vv, float) else vv for kk, vv in v.items()}
+                       for k, v in self.stores.items()},
+            'gates': {phase: {k: dict(c.most_common()) for k, c in per_store.items()}
+                      for phase, per_store in self.gates.items()},
+            'gate_order': {k: list(p.order) for k, p in _gate_profiles.items()},
+            'fuzzy': dict(self.fuzzy),
+            'normalize_name': {
+                'hits': hits, 'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            },
+        }
+
+
+def _write_run_report(report: dict) -> None:
+    tmp = _RUN_REPORT_FILE + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(_RUN_REPORT_FILE), exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, _RUN_REPORT_FILE)
+        logger.info("Kørselsrapport gemt → %s", _RUN_REPORT_FILE)
+    except Exception as e:
+        logger.warning("Kunne ikke gemme kørselsrapport: %s", e)
+
+def _score_rema_product(product: dict, key: str, store_entry: tuple,
+                        report: '_RunReport | None') -> list:
+    """Seriel scoring af én Rema-vare mod én butik uden claimed-gaten
+    (scored_out-listen til _pick_unclaimed_match).
+
+    Med kørselsrapporten slået til tælles gate-afvisningerne og tiden pr.
+    butik her, så fetch_and_parse_xml ikke selv skal holde styr på det.
+    """
+    products_list, token_idx, hash_list, ean_index = store_entry
+    gate_stats = report.gate_counter('rema', key) if report is not None else None
+    t_wall, t_cpu = time.perf_counter(), time.process_time()
+    scored: list = []
+    _find_generic_match(
+        str(product['/product/title']),
+        str(product['/product/description']),
+        products_list,
+        token_idx,
+        hash_list,
+        rema_brand=str(product.get('/product/brand', '')),
+        rema_weight_g=product.get('/product/weight_g'),
+        rema_image_hash=product.get('/product/image_hash', ''),
+        rema_price=float(product['/product/price']),
+        rema_ean=product.get('/product/ean', ''),
+        rema_stk_count=product.get('/product/stk_count'),
+        ean_index=ean_index,
+        rema_category=product.get('/product/product_type', ''),
+        scored_out=scored,
+        gate_columns=_store_gate_columns.get(key),
+        gate_stats=gate_stats,
+        gate_profile=_gate_profiles.get(key),
+    )
+    if report is not None:
+        report.add_store_time(key, 'rema', time.perf_counter() - t_wall,
+                              time.process_time() - t_cpu)
+    return scored
+
+
+# Rå felter som gates'ene (direkte eller via _type/_pcts/_variants/...) læser
+_COMPARISON_FP_FIELDS = ('name', 'brand', 'weight', 'price', 'ean', '_image_hash', 'Kategori')
+_REMA_FP_FIELDS = (
+    '/product/id', '/product/title', '/product/description', '/product/brand',
+    '/product/weight_g', '/product/price', '/product/image_hash',
+    '/product/product_type', '/product/ean', '/product/stk_count',
+)
+
+
+def _fingerprint(values) -> str:
+    raw = '\x1f'.join(str(v) for v in values)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _comparison_fingerprint(p: dict) -> str:
+    return _fingerprint(p.get(k, '') for k in _COMPARISON_FP_FIELDS)
+
+
+def _rema_fingerprint(product: dict) -> str:
+    return _fingerprint(product.get(k, '') for k in _REMA_FP_FIELDS)
+
+
+def _reordered(prev, cur: list) -> set:
+    """Fingeraftryk i både prev og cur hvis indbyrdes rækkefølge er ændret.
+
+    Det minimale sæt: alt uden for en længste fælles delfølge (fundet som en
+    længste voksende følge af de fælles elementers gamle positioner). Indsatte
+    og fjernede elementer flytter ingen andre. Et fingeraftryk der optræder
+    flere gange i en af listerne kan ikke placeres og tælles som flyttet."""
+    prev_counts, cur_counts = Counter(prev), Counter(cur)
+    dupes = {fp for fp, n in (prev_counts | cur_counts).items() if n > 1}
+    rank = {fp: i for i, fp in enumerate(prev) if fp not in dupes}
+    common = [fp for fp in cur if fp in rank and cur_counts[fp] == 1]
+    tails: list[int] = []      # tails[k] = mindste slut-rang for en følge af længde k+1
+    tail_at: list[int] = []    # indeks i common for tails[k]
+    back = [-1] * len(common)
+    for i, fp in enumerate(common):
+        k = bisect.bisect_left(tails, rank[fp])
+        if k == len(tails):
+            tails.append(rank[fp])
+            tail_at.append(i)
+        else:
+            tails[k] = rank[fp]
+            tail_at[k] = i
+        back[i] = tail_at[k - 1] if k else -1
+    keep = set()
+    i = tail_at[-1] if tail_at else -1
+    while i >= 0:
+        keep.add(common[i])
+        i = back[i]
+    moved = {fp for fp in common if fp not in keep}
+    moved.update(fp for fp in dupes if prev_counts[fp] and cur_counts[fp])
+    return moved
+
+
+def _incremental_enabled() -> bool:
+    return os.getenv('UPDATER_INCREMENTAL', '0') == '1'
+
+
+def _load_match_state() -> dict:
+    """Forrige kørsels matching-tilstand, eller {} hvis ingen/ugyldig."""
+    try:
+        with open(_MATCH_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("Kunne ikke læse matching-tilstand (%s) - fuld genopbygning", e)
+        return {}
+    if state.get('version') != _MATCH_STATE_VERSION:
+        logger.info("Matching-tilstand har anden version - fuld genopbygning")
+        return {}
+    return state
+
+
+def _save_match_state(state: dict | None) -> None:
+    if not state:
+        return
+    try:
+        os.makedirs(os.path.dirname(_MATCH_STATE_FILE), exist_ok=True)
+        tmp = _MATCH_STATE_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp, _MATCH_STATE_FILE)
+        logger.info("Matching-tilstand gemt → %s", _MATCH_STATE_FILE)
+    except Exception as e:
+        logger.error("Fejl ved gemning af matching-tilstand: %s", e)
+
+
+class _IncrementalMatchState:
+    """Genbrug af forrige kørsels matching-beslutninger + optagelse af nye.
+
+    Optager altid (så en fuld kørsel efterlader tilstand til næste nat);
+    genbruger kun når `reuse` er sat og der findes en gyldig tidligere
+    tilstand. Produkter identificeres på tværs af kørsler ved deres
+    fingeraftryk - et fingeraftryk der optræder flere gange i samme butik
+    kan ikke identificeres entydigt og behandles som beskidt.
+    """
+
+    def __init__(self, previous: dict, store_data: dict, rema_fps: list, reuse: bool):
+        self.prev = previous if reuse else {}
+        self.reuse = bool(self.prev)
+        self.by_fp = {key: {} for key in DB_STORE_KEYS}
+        self.fp_of: dict = {}
+        self.dirty_tokens = {key: set() for key in DB_STORE_KEYS}
+        self.dirty_hashes = {key: [] for key in DB_STORE_KEYS}
+        self.available: set = set()
+        self._reused_keys: list = []  # butikker genbrugt for den aktuelle Rema-vare
+        self.hits = 0
+        self.misses = 0
+        self.new = {
+            'version': _MATCH_STATE_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'store_fps': {},
+            'rema_order': rema_fps,
+            'rema_raw': {},
+            'rema_final': {},
+            'rema_ties': {},
+            'pre2_unavailable': {},
+            'phase2_order': [],
+            'phase2_raw': {},
+            'phase2_final': {},
+        }
+        self.layout_stable: dict = {}
+        prev_store_fps = self.prev.get('store_fps', {})
+        for key in DB_STORE_KEYS:
+            counts: dict = {}
+            products = store_data[key][0]
+            order = []
+            for p in products:
+                fp = _comparison_fingerprint(p)
+                self.fp_of[id(p)] = fp
+                counts[fp] = counts.get(fp, 0) + 1
+                order.append(fp)
+            # Rækkefølgen (ikke kun mængden): kandidatsæt er sæt af indeks,
+            # så en indsat/fjernet række forskyder iterationsrækkefølgen.
+            self.new['store_fps'][key] = order
+            prev_order = prev_store_fps.get(key, [])
+            known = set(prev_order)
+            # Stabil = samme længde, og hver ændret position er en ren
+            # in-place-ændring (ny værdi ukendt før, gammel værdi væk nu).
+            self.layout_stable[key] = len(prev_order) == len(order) and all(
+                a == b or (a not in counts and b not in known)
+                for a, b in zip(prev_order, order))
+            for p in products:
+                fp = self.fp_of[id(p)]
+                if counts[fp] == 1:
+                    self.by_fp[key][fp] = p
+                if self.reuse and (counts[fp] > 1 or fp not in known):
+                    self._mark_dirty(key, p)
+        if self.reuse:
+            # Claims (og dermed "ingen match pga. allerede claimet") afhænger
+            # af Rema-rækkefølgen. Er de fælles varers indbyrdes rækkefølge
+            # ændret, holder genbruget ikke - match alt forfra.
+            cur = set(rema_fps)
+            prev_order = self.prev.get('rema_order', [])
+            prev_set = set(prev_order)
+            if [f for f in rema_fps if f in prev_set] != [f for f in prev_order if f in cur]:
+                logger.info("Inkrementel: Rema-rækkefølgen er ændret - fuld genopbygning")
+                self.prev = {}
+                self.reuse = False
+            else:
+                # Forsvundne/ændrede Rema-varers partnere er frigivet
+                for r_fp, final in self.prev.get('rema_final', {}).items():
+                    if r_fp not in cur:
+                        self._free(final)
+
+    def _mark_dirty(self, key: str, p: dict) -> None:
+        self.dirty_tokens[key].update(t for t in p.get('_norm_name', '').split() if len(t) >= 3)
+        if p.get('_hash_int') is not None:
+            self.dirty_hashes[key].append(p['_hash_int'])
+
+    def _free(self, final: dict) -> None:
+        for key, fp in final.items():
+            p = self.by_fp.get(key, {}).get(fp)
+            if p is not None:
+                self._mark_dirty(key, p)
+
+    def _fp_or_marker(self, key: str, p: dict) -> str:
+        """Partnerens fingeraftryk - '' hvis det ikke er entydigt (= genberegn)."""
+        fp = self.fp_of.get(id(p), '')
+        return fp if self.by_fp[key].get(fp) is p else ''
+
+    # -- Rema-annotering ----------------------------------------------------
+    def rema_lookup(self, r_fp: str, tokens: set, r_hash, key: str, claimed: set):
+        """(True, match|None) hvis forrige beslutning kan genbruges."""
+        if not self.reuse:
+            return False, None
+        prev = self.prev.get('rema_raw', {}).get(r_fp)
+        if prev is None or tokens & self.dirty_tokens[key]:
+            return self._miss()
+        if r_hash is not None and any(
+                (r_hash ^ h).bit_count() <= _HASH_CANDIDATE_MAX_DIST for h in self.dirty_hashes[key]):
+            return self._miss()
+        if key in self.prev.get('rema_ties', {}).get(r_fp, ()) and not self.layout_stable[key]:
+            return self._miss()
+        fp = prev.get(key)
+        if fp is None:
+            self.hits += 1
+            self._reused_keys.append(key)
+            return True, None
+        p = self.by_fp[key].get(fp)
+        if p is None or id(p) in claimed:
+            return self._miss()
+        self.hits += 1
+        self._reused_keys.append(key)
+        return True, p
+
+    def _miss(self):
+        self.misses += 1
+        return False, None
+
+    def record_rema(self, r_fp: str, raw: dict, final: dict, tied_keys: list) -> None:
+        """raw/final: {store_key: produkt} før hhv. efter retro-validering.
+
+        tied_keys: butikker hvor vinderen var uafgjort - den kan skifte når
+        butikkens produkt-indeks forskydes, så den genbruges kun når
+        butikkens rækkefølge er stabil (se layout_stable)."""
+        self.new['rema_raw'][r_fp] = {k: self._fp_or_marker(k, p) for k, p in raw.items()}
+        # Genbrugte beslutninger arver forrige kørsels uafgjort-markering
+        prev_ties = self.prev.get('rema_ties', {}).get(r_fp, ())
+        tied_keys = list(tied_keys) + [k for k in self._reused_keys if k in prev_ties]
+        self._reused_keys = []
+        if tied_keys:
+            self.new['rema_ties'][r_fp] = tied_keys
+        final_fps = {k: self._fp_or_marker(k, p) for k, p in final.items()}
+        self.new['rema_final'][r_fp] = final_fps
+        prev_final = self.prev.get('rema_final', {}).get(r_fp)
+        if prev_final:
+            self._free({k: fp for k, fp in prev_final.items() if final_fps.get(k) != fp})
+
+    # -- Fase 2 -------------------------------------------------------------
+    def start_phase2(self, unmatched: dict, store_data: dict) -> None:
+        self.available = {id(p) for key in DB_STORE_KEYS for p in unmatched[key]}
+        for key in DB_STORE_KEYS:
+            self.new['pre2_unavailable'][key] = sorted(
+                self.fp_of[id(p)] for p in store_data[key][0] if id(p) not in self.available)
+        if not self.reuse:
+            return
+        bases = [self.fp_of[id(p)] for key in DB_STORE_KEYS for p in unmatched[key]]
+        cur = set(bases)
+        # Fase 2 er grådig i base-rækkefølgen: en base ser kun de varer som
+        # tidligere baser ikke har taget. Indsatte og fjernede baser dækkes af
+        # ledighedstjekket i phase2_lookup og af _free nedenfor. En base der
+        # har skiftet plads i forhold til de andre, kan derimod have taget
+        # varer fra (eller givet varer til) baser den nu står på den anden
+        # side af: dens egen beslutning beregnes forfra, og dens gamle
+        # partnere frigives, så baser med overlappende tokens også gør.
+        moved = _reordered(self.prev.get('phase2_order', []), bases)
+        if moved:
+            logger.info("Inkrementel: %d fase-2-baser har skiftet plads - de matches forfra", len(moved))
+            prev_raw = dict(self.prev.get('phase2_raw', {}))
+            prev_final = dict(self.prev.get('phase2_final', {}))
+            for base_fp in moved:
+                prev_raw.pop(base_fp, None)
+                final = prev_final.pop(base_fp, None)
+                if final:
+                    self._free(final)
+            self.prev = dict(self.prev, phase2_raw=prev_raw, phase2_final=prev_final)
+        # Varer der var optaget (Rema-match/fase 1) sidst, men nu er ledige
+        for key in DB_STORE_KEYS:
+            was_taken = set(self.prev.get('pre2_unavailable', {}).get(key, ()))
+            for p in unmatched[key]:
+                if self.fp_of[id(p)] in was_taken:
+                    self._mark_dirty(key, p)
+        for base_fp, final in self.prev.get('phase2_final', {}).items():
+            if base_fp not in cur:
+                self._free(final)
+
+    def phase2_base(self, base_p: dict) -> str:
+        base_fp = self.fp_of[id(base_p)]
+        self.new['phase2_order'].append(base_fp)
+        return base_fp
+
+    def phase2_skipped(self, base_p: dict) -> None:
+        """Basen er opslugt af en tidligere klynge - dens gamle partnere er fri."""
+        prev_final = self.prev.get('phase2_final', {}).get(self.fp_of[id(base_p)])
+        if prev_final:
+            self._free(prev_final)
+
+    def phase2_lookup(self, base_fp: str, base_tokens: set, target_key: str):
+        """(True, (match|None, score)) hvis forrige bedste kandidat kan genbruges."""
+        if not self.reuse:
+            return False, None
+        prev = self.prev.get('phase2_raw', {}).get(base_fp)
+        if prev is None or base_tokens & self.dirty_tokens[target_key]:
+            return self._miss()
+        entry = prev.get(target_key)
+        if entry is None:
+            self.hits += 1
+            return True, (None, 0.0)
+        p = self.by_fp[target_key].get(entry[0])
+        if p is None or id(p) not in self.available:
+            return self._miss()
+        self.hits += 1
+        return True, (p, entry[1])
+
+    def record_phase2(self, base_key: str, base_fp: str, raw: dict, cluster: dict) -> None:
+        """raw: {target_key: (produkt, score)} før konflikt-oprydning."""
+        self.new['phase2_raw'][base_fp] = {
+            k: [self._fp_or_marker(k, p), score] for k, (p, score) in raw.items()}
+        final_fps = {k: self._fp_or_marker(k, p) for k, p in cluster.items() if k != base_key}
+        if len(cluster) > 1:
+            self.new['phase2_final'][base_fp] = final_fps
+            for p in cluster.values():
+                self.available.discard(id(p))
+        else:
+            final_fps = {}
+        prev_final = self.prev.get('phase2_final', {}).get(base_fp)
+        if prev_final:
+            self._free({k: fp for k, fp in prev_final.items() if final_fps.get(k) != fp})
+
+
+def fetch_and_parse_xml(incremental: bool | None = None, rema_products: list | None = None):
+    """Fetch and parse data from both XML and Excel sources
+
+    incremental: genbrug forrige kørsels matching-beslutninger hvor kilden
+    er uændret (None = UPDATER_INCREMENTAL). rema_products: allerede hentede
+    Rema-varer (bruges af verify_incremental, så begge kørsler ser samme feed).
+    """
+    global _last_match_state, _last_phase_timings, _run_report
+    timings: dict = {}
+    lap = [time.perf_counter(), time.process_time()]
+    report = _run_report = _RunReport() if _run_report_enabled() else None
+    if report is not None:
+        _app_support.fuzzy_call_counts = report.fuzzy
+
+    def _lap(phase: str) -> None:
+        now, cpu = time.perf_counter(), time.process_time()
+        timings[phase] = now - lap[0]
+        if report is not None:
+            report.phases[phase] = {'wall_s': now - lap[0], 'cpu_s': cpu - lap[1]}
+        lap[0], lap[1] = now, cpu
+
     try:
         logger.info("\n=== Starting data fetch and parse ===")
 
-        rema_products = _fetch_rema_products_only()
+        if rema_products is None:
+            rema_products = _fetch_rema_products_only()
         if not rema_products:
             return []
+        if incremental is None:
+            incremental = _incremental_enabled()
         
         # Annotate each Rema product with comparison data from all secondary stores.
         # Rema has no EAN → _find_generic_match acts as a stage-3 fuzzy initiator.
         logger.info("\nAnnotating Rema products with comparison data")
+        lap[0], lap[1] = time.perf_counter(), time.process_time()
         store_data   = load_all_comparison_data()
+        _lap('load')
         # store_data = {'bilka': (products, token_idx), 'mk': (...), ...}
 
         final_products = []
         matched_ids  = {key: set() for key in DB_STORE_KEYS}
         match_counts = {key: 0     for key in DB_STORE_KEYS}
 
-        for product in rema_products:
+        _gate_profiles.clear()
+        _gate_profiles.update(_load_gate_profiles())
+
+        rema_fps = [_rema_fingerprint(product) for product in rema_products]
+        inc = _IncrementalMatchState(
+            _load_match_state() if incremental else {}, store_data, rema_fps, incremental)
+
+        # Scoring pr. butik er uafhængig af de andre butikker - kun claimed-
+        # gaten afhænger af tidligere Rema-varers ENDELIGE matches (efter
+        # retro-validering og cross-fill nedenfor, som går på tværs af
+        # butikker). Workerne scorer derfor alt uden claimed-gaten, og selve
+        # valget sker stadig serielt herunder i Rema-rækkefølge, så outputtet
+        # er identisk med den serielle kørsel.
+        shard_scores = None
+        match_workers = _match_worker_count()
+        if match_workers > 1 and not inc.reuse:
+            shard_scores = _parallel_rema_scores(rema_products, store_data, match_workers)
+            if shard_scores is not None:
+                logger.info("Rema-annotering scoret parallelt med %d processer", match_workers)
+
+        for rema_pos, product in enumerate(rema_products):
             rema_effective = (
                 float(product['/product/sale_price'])
                 if product['/product/sale_price'] is not None
@@ -2170,23 +3367,47 @@ def fetch_and_parse_xml():
 
             # Match against every secondary store
             matches = {}
+            tied_keys: list = []
+            r_fp = rema_fps[rema_pos]
+            r_tokens = r_hash = None
+            if inc.reuse and not str(product.get('/product/ean') or '').strip():
+                r_tokens = {
+                    t for t in (normalize_name(str(product['/product/title'])) + ' '
+                                + normalize_name(str(product['/product/description']))).split()
+                    if len(t) >= 3
+                }
+                r_hash = phash_hex_to_int(product.get('/product/image_hash', ''))
             for key in DB_STORE_KEYS:
                 products_list, token_idx, hash_list, ean_index = store_data[key]
+                if r_tokens is not None:
+                    reused, m = inc.rema_lookup(r_fp, r_tokens, r_hash, key, matched_ids[key])
+                    if reused:
+                        if m:
+                            matches[key] = m
+                        continue
+                scored = shard_scores[key][rema_pos] if shard_scores is not None else None
+                rema_ean = product.get('/product/ean', '')
+                if scored is None and not (rema_ean and rema_ean not in ('', 'nan', 'None')):
+                    # Scor uden claimed-gaten og vælg bagefter - samme valg
+                    # som claimed_ids-stien, men afslører om vinderen var
+                    # uafgjort (se _pick_unclaimed_match).
+                    scored = _score_rema_product(product, key, store_data[key], report)
+                if scored is not None:
+                    m, tied = _pick_unclaimed_match(scored, products_list, matched_ids[key])
+                    if m:
+                        matches[key] = m
+                    if tied:
+                        tied_keys.append(key)
+                    continue
+                # Stage-1-EAN-genvejen (claimed-gaten gælder ikke dér)
                 m = _find_generic_match(
                     str(product['/product/title']),
                     str(product['/product/description']),
                     products_list,
                     token_idx,
                     hash_list,
-                    rema_brand=str(product.get('/product/brand', '')),
-                    rema_weight_g=product.get('/product/weight_g'),
-                    rema_image_hash=product.get('/product/image_hash', ''),
-                    rema_price=float(product['/product/price']),
-                    rema_ean=product.get('/product/ean', ''),
-                    rema_stk_count=product.get('/product/stk_count'),
+                    rema_ean=rema_ean,
                     ean_index=ean_index,
-                    rema_category=product.get('/product/product_type', ''),
-                    claimed_ids=matched_ids[key],
                 )
                 if m:
                     matches[key] = m
@@ -2206,6 +3427,7 @@ def fetch_and_parse_xml():
             # EAN'et forkert - ellers spredes fejlen videre til alle butikker
             # via EAN cross-fill nedenfor, uanset at deres egne kandidatnavne
             # (med korrekt '%') ville være blevet afvist enkeltvis.
+            raw_matches = dict(matches)
             rema_w = product.get('/product/weight_g')
             rema_pcts = get_product_percents(f"{product['/product/title']} {product['/product/description']}")
             # Samme felter som _find_generic_match bruger på Rema-siden (brandet
@@ -2274,6 +3496,8 @@ def fetch_and_parse_xml():
                                 and _variants_compatible(rema_variants, hit.get('_variants', _NO_VARIANT_FLAGS))):
                             matches[key] = hit
 
+            inc.record_rema(r_fp, raw_matches, matches, tied_keys)
+
             # Store matches and track IDs
             product['/product/store_matches'] = {}
             for key, match in matches.items():
@@ -2309,6 +3533,8 @@ def fetch_and_parse_xml():
 
             final_products.append(product)
 
+        _lap('rema')
+
         # Collect unmatched products from every secondary store
         unmatched = {
             key: [p for p in store_data[key][0] if id(p) not in matched_ids[key]]
@@ -2393,6 +3619,8 @@ def fetch_and_parse_xml():
             for key, p in group.items():
                 stage1_components[key].append((p, display_item))
 
+        _lap('phase1')
+
         # ===================================================================
         # Phase 2 - Stage 3 initiates fuzzy matching (stages 1–2 are passive targets)
         # Stage-1 products already removed from unmatched; stage-2 EAN solokort remain.
@@ -2401,14 +3629,17 @@ def fetch_and_parse_xml():
         for key in DB_STORE_KEYS:
             for p in unmatched[key]:
                 p['_cross_match_tokens'] = set(t for t in p.get('_norm_name', '').split() if len(t) >= 3)
+        inc.start_phase2(unmatched, store_data)
 
         for base_key in DB_STORE_KEYS:
             for base_p in unmatched[base_key][:]:
                 if base_p not in unmatched[base_key]:
+                    inc.phase2_skipped(base_p)
                     continue
                 # Only stage 3 may initiate fuzzy - stages 1 and 2 never do
                 if str(base_p.get('ean') or '').strip() not in ('', 'nan', 'None'):
                     continue
+                base_fp = inc.phase2_base(base_p)
 
                 base_title = str(base_p.get('name', ''))
                 base_weight = base_p.get('_weight_g')
@@ -2435,6 +3666,7 @@ def fetch_and_parse_xml():
 
                 cluster = {base_key: base_p}
                 cluster_scores: dict = {}  # target_key -> name_score, til konflikt-oprydning nedenfor
+                raw_cluster: dict = {}  # target_key -> (match, score) før oprydning (inkrementel tilstand)
 
                 # ALLE andre butikker, ikke kun de efterfølgende. Kun stage 3
                 # initierer fuzzy, så trekant-iterationen var ikke symmetrisk:
@@ -2457,6 +3689,15 @@ def fetch_and_parse_xml():
                     best_match = None
                     best_score = 0.0
 
+                    reused, prev_best = inc.phase2_lookup(base_fp, base_tokens, target_key)
+                    if reused and prev_best is not None:
+                        best_match, best_score = prev_best
+                        target_list = ()
+
+                    gs = report.gate_counter('phase2', target_key) if report is not None else None
+                    if gs is not None:
+                        gs['candidates'] += len(target_list)
+                    gated = []
                     for target_p in target_list:
                         # Stage 2 (EAN, no cross-store match) is a passive target here.
                         # De to BILLIGE filtre først. De stod tidligere efter
@@ -2467,85 +3708,39 @@ def fetch_and_parse_xml():
                         # ændrer intet i resultatet, kun arbejdsmængden. Det
                         # betaler for den symmetriske iteration ovenfor, som
                         # fordobler antallet af par.
-                        target_name_norm = target_p.get('_norm_name', '')
-                        if _cross_store_length_prefilter(len(base_title_norm), len(target_name_norm)):
-                            continue
-                        target_tokens = target_p.get('_cross_match_tokens', set())
-                        if not base_tokens.intersection(target_tokens):
-                            continue
-
-                        # Fuzzy gates: weight (unit), quantity (stk), name score, type.
-                        if not weights_compatible(base_weight, target_p.get('_weight_g')):
-                            continue
-                        if base_stk is not None and target_p.get('_stk_count') is not None and base_stk != target_p.get('_stk_count'):
-                            continue
-                        if base_variants != target_p['_variants']:
-                            continue
-                        # Procent-gate (fedt-/alkohol-%): kun aktiv når begge
-                        # sider angiver procenter, jf. _percents_match
-                        if not _percents_match(base_pcts, target_p['_pcts']):
-                            continue
-                        # Symmetrisk smags-gate: begge sider er korte butiksnavne
-                        # (ingen rig beskrivelse som hos Rema), så en smag nævnt
-                        # af kun én side er en reel forskel ("Cherry blommetomater"
-                        # ≠ "Blommetomater") uanset hvem der initierer.
-                        if base_flavors != target_p['_flavors']:
-                            continue
-                        # Symmetrisk form-gate, samme begrundelse som smag lige
-                        # ovenfor. Brugte tidligere den asymmetriske
-                        # cand<=base-_forms_match (samme retningsbestemte helper
-                        # som Rema-sporet), hvilket lod resultatet afhænge af
-                        # hvilken side der blev behandlet som "base" - fx et
-                        # formløst "Alpro Dessert Hindbær" kunne absorbere en
-                        # "Cultura Drikkeyogh Hindbær" (drik ≠ dessert) hvis
-                        # rækkefølgen faldt den vej. Se matchmotor-revisionen
-                        # 2026-08-16, fund H3.
-                        if base_forms != target_p['_forms']:
-                            continue
-                        # Kødtype-gate (jf. _find_generic_match)
-                        if not _meats_match(base_p['_meats'], target_p['_meats']):
+                        if _cross_store_length_prefilter(len(base_title_norm), len(target_p.get('_norm_name', ''))):
+                            rejected = 'length'
+                        elif not base_tokens.intersection(target_p.get('_cross_match_tokens', set())):
+                            rejected = 'token'
+                        else:
+                            rejected = _cross_pair_gate(base_p, base_weight, base_stk, base_variants,
+                                                        base_pcts, base_flavors, base_forms, target_p)
+                        if rejected is not None:
+                            if gs is not None:
+                                gs[rejected] += 1
                             continue
 
                         # Klynge-konsistens tjekkes IKKE her længere - se
                         # konflikt-oprydningen efter target_key-løkken
                         # nedenfor for begrundelsen (fund H8).
-
-                        name_score = fuzzy_score(base_title_norm, target_name_norm)
-
-                        # Type-gate med eskalering: butikskategorier er støjede,
-                        # så mismatch kræver blot næsten-identisk navn (jf.
-                        # _find_generic_match).
-                        if not types_compatible(base_type, target_p['_type']) and name_score < 0.80:
-                            continue
-
+                        gated.append(target_p)
+
+                    # Navnescoren for alle gate-overlevere i ét kald (jf.
+                    # _find_generic_match). Cutoff = navnegulvet: alt under
+                    # afvises alligevel nedenfor, og rækkefølgen bevares, så
+                    # strengt-større-tie-breaket vælger samme vinder.
+                    gated_scores = fuzzy_scores(
+                        (base_title_norm,), [t.get('_norm_name', '') for t in gated],
+                        score_cutoff=_CROSS_STORE_NAME_FLOOR)
+                    for target_p, name_score in zip(gated, gated_scores):
                         target_is_pl = is_private_label(target_p.get('brand',''), target_p.get('name',''))
-                        if base_is_pl != target_is_pl and name_score < 0.70:
+                        rejected = _cross_scored_gate(base_p, base_weight, base_stk, base_type,
+                                                      base_is_pl, target_p, target_is_pl, name_score)
+                        if rejected is not None:
+                            if gs is not None:
+                                gs[rejected] += 1
                             continue
 
-                        if name_score < _CROSS_STORE_NAME_FLOOR:
-                            continue
-
-                        # Vægtløst par (typisk Dagrofa): mangler bare én side
-                        # vægt, kan vægt-gaten intet validere, og navnet bærer
-                        # matchet alene - kræv markant højere navnescore,
-                        # medmindre stk-antal findes på begge sider (så har
-                        # stk-gaten valideret pakkestørrelsen). Frugt & grønt
-                        # er undtaget: løsvarer er vægtløse overalt, og korte
-                        # navne scorer lavt uden at være tvivlsomme.
-                        if (name_score < 0.75
-                                and (not base_weight or not target_p.get('_weight_g'))
-                                and (base_stk is None or target_p.get('_stk_count') is None)
-                                and not (base_type == CAT_FRUGT_GROENT and target_p['_type'] == CAT_FRUGT_GROENT)):
-                            continue
-
-                        # Pris-sanity: samme vare koster ikke 5× mere i en anden butik
-                        try:
-                            if float(target_p['price']) > 5.0 * float(base_p['price']) or \
-                               float(target_p['price']) * 5.0 < float(base_p['price']):
-                                continue
-                        except (TypeError, ValueError, KeyError):
-                            pass
-
                         if name_score > best_score:
                             best_score = name_score
                             best_match = target_p
@@ -2553,6 +3748,7 @@ def fetch_and_parse_xml():
                     if best_match:
                         cluster[target_key] = best_match
                         cluster_scores[target_key] = best_score
+                        raw_cluster[target_key] = (best_match, best_score)
 
                 # Konflikt-oprydning: hvert medlem er kun valideret mod
                 # base_p ovenfor, ikke mod hinanden, så klyngen kan indeholde
@@ -2586,6 +3782,7 @@ def fetch_and_parse_xml():
                         break
                     del cluster[loser_key]
                     del cluster_scores[loser_key]
+                inc.record_phase2(base_key, base_fp, raw_cluster, cluster)
 
                 if len(cluster) > 1:
                     for k, p in cluster.items():
@@ -2613,6 +3810,8 @@ def fetch_and_parse_xml():
 
                         final_products.append(display_item)
 
+        _lap('phase2')
+
         # ===================================================================
         # Phase 2b - Stage 3 initiates fuzzy against stage-1 EAN groups (passive targets)
         # ===================================================================
@@ -2630,6 +3829,16 @@ def fetch_and_parse_xml():
                     _p['_cross_match_tokens'] = set(
                         t for t in _p.get('_norm_name', '').split() if len(t) >= 3
                     )
+        # Kandidat-generering: i stedet for at lade hver base gennemløbe ALLE
+        # stage-1-medlemmer i alle andre butikker (O(baser × medlemmer), de
+        # 9,3 mio. par ovenfor - langt de fleste afvist af token-snittet)
+        # slår basen kun op i et token -> positioner-indeks pr. målbutik og
+        # besøger de medlemmer der deler et ord og kan klare længde-grænsen.
+        stage1_token_index = {
+            _key: _build_cross_token_index(stage1_components[_key])
+            for _key in DB_STORE_KEYS
+        }
+        _phase2b_pairs = 0
 
         for base_key in DB_STORE_KEYS:
             for base_p in unmatched[base_key][:]:
@@ -2667,77 +3876,55 @@ def fetch_and_parse_xml():
                 for target_key in DB_STORE_KEYS:
                     if target_key == base_key:
                         continue
-                    for target_p, display_item in stage1_components[target_key]:
+                    target_members = stage1_components[target_key]
+                    gs = report.gate_counter('phase2b', target_key) if report is not None else None
+                    gated = []
+                    # Længde-forfilteret (jf. fase 2, fund H7 - delt via
+                    # _cross_store_length_prefilter så begge faser bruger samme
+                    # matematisk sikre grænse) og token-snittet er de billigste
+                    # OG mest afvisende gates - de fleste par deler intet ord.
+                    # Begge afgøres nu af indekset i stedet for pr. par.
+                    candidates = _cross_token_candidates(
+                        stage1_token_index[target_key], base_tokens, len(base_title_norm))
+                    if gs is not None:
+                        gs['candidates'] += len(candidates)
+                    for _idx in candidates:
+                        target_p, display_item = target_members[_idx]
                         if base_key in display_item['/product/store_matches']:
-                            continue  # base_key allerede repræsenteret i denne gruppe
-
-                        # Længde-forfilter (jf. fase 2, fund H7 - manglede her
-                        # tidligere, nu delt via _cross_store_length_prefilter
-                        # så begge faser bruger samme matematisk sikre grænse).
-                        target_name_norm = target_p.get('_norm_name', '')
-                        if _cross_store_length_prefilter(len(base_title_norm), len(target_name_norm)):
-                            continue
-                        # Token-snittet er den billigste OG mest afvisende gate
-                        # (de fleste par deler intet ord) - flyttet forrest,
-                        # som i fase 2, i stedet for at ligge efter seks andre
-                        # gates. Bruger det precomputede felt fra pre-passet
-                        # ovenfor i stedet for at genberegne pr. par.
-                        if not base_tokens.intersection(target_p['_cross_match_tokens']):
-                            continue
-
-                        if not weights_compatible(base_weight, target_p.get('_weight_g')):
-                            continue
-                        if base_stk is not None and target_p.get('_stk_count') is not None and base_stk != target_p.get('_stk_count'):
-                            continue
-                        if base_variants != target_p['_variants']:
-                            continue
-                        # Procent-gate (jf. fase 2)
-                        if not _percents_match(base_pcts, target_p['_pcts']):
-                            continue
-                        # Symmetrisk smags-gate - samme begrundelse som i fase 2
-                        if base_flavors != target_p['_flavors']:
-                            continue
-                        # Symmetrisk form-gate (jf. fase 2, fund H3)
-                        if base_forms != target_p['_forms']:
-                            continue
-                        # Kødtype-gate (jf. fase 2)
-                        if not _meats_match(base_p['_meats'], target_p['_meats']):
+                            # base_key allerede repræsenteret i denne gruppe
+                            rejected = 'represented'
+                        else:
+                            _phase2b_pairs += 1
+                            rejected = _cross_pair_gate(base_p, base_weight, base_stk, base_variants,
+                                                        base_pcts, base_flavors, base_forms, target_p)
+                        if rejected is not None:
+                            if gs is not None:
+                                gs[rejected] += 1
                             continue
+                        gated.append((target_p, display_item))
 
-                        name_score = fuzzy_score(base_title_norm, target_name_norm)
-                        # Type-gate med eskalering (jf. fase 2)
-                        if not types_compatible(base_type, target_p['_type']) and name_score < 0.80:
-                            continue
+                    # Samlet navnescore pr. mål-butik (jf. fase 2)
+                    gated_scores = fuzzy_scores(
+                        (base_title_norm,), [t.get('_norm_name', '') for t, _ in gated],
+                        score_cutoff=_CROSS_STORE_NAME_FLOOR)
+                    for (target_p, display_item), name_score in zip(gated, gated_scores):
                         # _is_pl er precomputed på alle produkter ved indlæsning
                         # (samme sted som _type/_variants/_pcts) - target_p['_is_pl']
                         # var der hele tiden, men blev genberegnet her pr. par.
-                        if base_is_pl != target_p['_is_pl'] and name_score < 0.70:
-                            continue
-                        if name_score < _CROSS_STORE_NAME_FLOOR:
-                            continue
-
-                        # Vægtløst par: kræv højere navnescore (jf. fase 2)
-                        if (name_score < 0.75
-                                and (not base_weight or not target_p.get('_weight_g'))
-                                and (base_stk is None or target_p.get('_stk_count') is None)
-                                and not (base_type == CAT_FRUGT_GROENT and target_p['_type'] == CAT_FRUGT_GROENT)):
-                            continue
-
-                        # Pris-sanity (jf. fase 2)
-                        try:
-                            if float(target_p['price']) > 5.0 * float(base_p['price']) or \
-                               float(target_p['price']) * 5.0 < float(base_p['price']):
-                                continue
-                        except (TypeError, ValueError, KeyError):
-                            pass
-
+                        rejected = _cross_scored_gate(base_p, base_weight, base_stk, base_type,
+                                                      base_is_pl, target_p, target_p['_is_pl'], name_score)
                         # Gruppe-validering: gates ovenfor tjekker kun target_p
                         # (repræsentanten) - et vægtløst medlem må ikke være
                         # bagdør ind i en gruppe, hvis øvrige medlemmer
                         # modsiger basen på vægt/stk/procent.
-                        if not _group_compatible(base_weight, base_stk, base_pcts,
-                                                 display_item['/product/store_matches'].values(),
-                                                 base_variants, base_p['_meats']):
+                        if rejected is None and not _group_compatible(
+                                base_weight, base_stk, base_pcts,
+                                display_item['/product/store_matches'].values(),
+                                base_variants, base_p['_meats']):
+                            rejected = 'group'
+                        if rejected is not None:
+                            if gs is not None:
+                                gs[rejected] += 1
                             continue
 
                         if name_score > best_score:
@@ -2751,6 +3938,8 @@ def fetch_and_parse_xml():
                         best_display_item['/product/cheapest_at'] = base_key
                         best_display_item['/product/cheaper_at'] = base_key
                         _apply_cheapest_display(best_display_item, base_key, base_p)
+        logger.info("Fase 2b: %d (base, stage-1-target)-par vurderet efter token-indeks", _phase2b_pairs)
+        _lap('phase2b')
 
         # ===================================================================
         # Solokort - stage 2 (EAN, unmatched) + unmatched stage 3 (no EAN)
@@ -2761,7 +3950,7 @@ def fetch_and_parse_xml():
 
         # Fjern interne precompute-felter fra store_matches, så de ikke fylder
         # i app_cache/D1 (sets kan desuden ikke serialiseres pænt til JSON).
-        _transient_keys = ('_type', '_flavors', '_forms', '_variants', '_is_pl', '_pcts', '_meats', '_cross_match_tokens')
+        _transient_keys = ('_type', '_flavors', '_forms', '_variants', '_is_pl', '_pcts', '_meats', '_cross_match_tokens', '_norm_brand')
         for _p in final_products:
             for _m in (_p.get('/product/store_matches') or {}).values():
                 if isinstance(_m, dict):
@@ -2774,6 +3963,7 @@ def fetch_and_parse_xml():
             f"({len(rema_products)} Rema + {len(final_products) - len(rema_products)} unmatched comparison cards), "
             f"{counts_str}"
         )
+        _lap('solokort')
         # Deduplicer final_products på billedeURL - samme billede = samme produkt.
         # Salling-kæderne (Netto/Føtex/Bilka) deler samme feed, så samme vare kan
         # optræde som flere kort med identisk billede. Vi beholder ét kort (så varen
@@ -2798,13 +3988,24 @@ def fetch_and_parse_xml():
                 deduped.append(_p)
         logger.info(f"Dedupliceret: {len(final_products)} -> {len(deduped)} produkter (fjernede {len(final_products)-len(deduped)} dubletter)")
         final_products = deduped
-
+        _lap('dedup')
+        _last_phase_timings = timings
+        if report is not None:
+            _write_run_report(report.to_dict(len(final_products)))
+
+        if inc.reuse:
+            logger.info("Inkrementel: %d beslutninger genbrugt, %d genberegnet",
+                        inc.hits, inc.misses)
+        _last_match_state = inc.new
         return final_products
         
     except Exception as e:
         logger.error(f"Error in fetch_and_parse_xml: {str(e)}")
         traceback.print_exc()
         return []
+    finally:
+        _run_report = None
+        _app_support.fuzzy_call_counts = None
 
 
 def _notify_website_refresh():
@@ -2851,15 +4052,20 @@ def run_rema_updater():
             products.append(item)
 
     annotate_lowest_prices(products)
-    search_index = {k: list(v) for k, v in build_search_index(products, normalize_name, flavor_fn=get_search_flavor_keywords).items()}
+    annotate_search_features(products)
+    search_index = encode_search_index(
+        build_search_index(products, normalize_name, flavor_fn=get_search_flavor_keywords), len(products))
     if _save_app_cache(products, search_index):
         record_prices_batch(collect_store_prices(products))
         _notify_website_refresh()
 
 
-def run_updater():
+def run_updater(incremental: bool | None = None):
     logger.info("Starter opdatering af produkt-cache...")
-    fresh = fetch_and_parse_xml()
+    fresh = fetch_and_parse_xml(incremental=incremental)
+    # Gate-profilen er ren måling (påvirker aldrig outputtet) og gemmes
+    # derfor uanset værnene nedenfor.
+    _save_gate_profiles()
     if not fresh:
         return
     # JSON-serialisering: sæt → liste for alle mængder (fx matched_variants)
@@ -2901,7 +4107,12 @@ def run_updater():
         return
 
     annotate_lowest_prices(fresh)
-    search_index = {k: list(v) for k, v in build_search_index(fresh, normalize_name, flavor_fn=get_search_flavor_keywords).items()}
+    annotate_search_features(fresh)
+    search_index = encode_search_index(
+        build_search_index(fresh, normalize_name, flavor_fn=get_search_flavor_keywords), len(fresh))
+    # Matching-tilstanden gemmes først her, efter værnene ovenfor - en
+    # kørsel der ikke måtte gemmes, må heller ikke blive næste nats grundlag.
+    _save_match_state(_last_match_state)
     if _save_app_cache(fresh, search_index):
         record_prices_batch(collect_store_prices(fresh))
         prune_cart_events()
@@ -2910,15 +4121,56 @@ def run_updater():
     elif not db_available():
         logger.info("Supabase ikke tilgængelig - lokal cache gemt som fallback")
 
+def _product_diff_ids(a: list, b: list) -> list:
+    """Produkt-id'er hvis serialiserede kort adskiller sig mellem a og b."""
+    def _by_id(products):
+        return {
+            str(p.get('/product/id')): json.dumps(p, sort_keys=True, default=str, ensure_ascii=False)
+            for p in products
+        }
+    ja, jb = _by_id(a), _by_id(b)
+    return sorted(pid for pid in ja.keys() | jb.keys() if ja.get(pid) != jb.get(pid))
+
+
+def verify_incremental() -> bool:
+    """Kør inkrementelt og fuldt på samme data og sammenlign outputtet.
+
+    Gemmer intet (hverken cache eller matching-tilstand). True = identisk.
+    """
+    import copy
+    state = _load_match_state()
+    if not state:
+        logger.error("Ingen matching-tilstand i %s - kør en fuld kørsel først", _MATCH_STATE_FILE)
+        return False
+    rema = _fetch_rema_products_only()
+    if not rema:
+        return False
+    # Matchingen muterer de cachede butiksvarer (og fjerner precompute-felter
+    # til sidst), så hver kørsel skal have sin egen indlæsning.
+    _store_caches.clear()
+    incremental = fetch_and_parse_xml(incremental=True, rema_products=copy.deepcopy(rema))
+    _store_caches.clear()
+    full = fetch_and_parse_xml(incremental=False, rema_products=copy.deepcopy(rema))
+    diff = _product_diff_ids(incremental, full)
+    if diff:
+        logger.error("Inkrementel kørsel afviger fra fuld på %d produkter (fx %s)",
+                     len(diff), diff[:20])
+        return False
+    logger.info("Inkrementel kørsel identisk med fuld (%d produkter)", len(full))
+    return True
+
+
 def push_local_cache_to_supabase():
-    """Læs app_cache_local.json og push direkte til Supabase uden at scrape."""
-    if not os.path.exists(_LOCAL_CACHE_FILE):
-        logger.error(f"Lokal cache-fil ikke fundet: {_LOCAL_CACHE_FILE}")
+    """Læs den lokale cache (snapshot eller JSON) og push direkte til
+    Supabase uden at scrape."""
+    path = local_app_cache_file(_LOCAL_CACHE_FILE)
+    if not path:
+        logger.error(f"Lokal cache-fil ikke fundet: {snapshot_path_for(_LOCAL_CACHE_FILE)}")
         return False
     try:
-        with open(_LOCAL_CACHE_FILE, 'r', encoding='utf-8') as f:
-            payload = json.load(f)
-        products = payload.get('products', [])
+        payload = read_local_app_cache(path)
+        # Alt uploades alligevel - afkod én gang til en almindelig liste.
+        products = list(payload.get('products', []))
         search_index = payload.get('search_index', {})
         logger.info(f"Pusher {len(products)} produkter fra lokal cache til Supabase...")
         success = _save_app_cache(products, search_index)
@@ -2936,9 +4188,17 @@ def push_local_cache_to_supabase():
 
 if __name__ == '__main__':
     import sys
+    if '--run-report' in sys.argv:
+        os.environ['UPDATER_RUN_REPORT'] = '1'
     if '--rema-only' in sys.argv:
         run_rema_updater()
     elif '--push-local' in sys.argv:
         push_local_cache_to_supabase()
+    elif '--verify-incremental' in sys.argv:
+        sys.exit(0 if verify_incremental() else 1)
+    elif '--full-rebuild' in sys.argv:
+        run_updater(incremental=False)
+    elif '--incremental' in sys.argv:
+        run_updater(incremental=True)
     else:
         run_updater()